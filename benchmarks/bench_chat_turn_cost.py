@@ -0,0 +1,122 @@
+"""
+Per-turn cost of the chat loop as a conversation grows.
+
+Drives a small graph with the same state shape as the assistant (``messages``
+merged by ``add_messages``) and a stub model node, so only the chat loop and the
+checkpointer are measured. ``--mode full`` replays what main.py used to do and
+sends the whole displayed history every turn; ``--mode delta`` sends only the
+new HumanMessage and rebuilds the displayed history from the checkpoint.
+
+Reports the average milliseconds per turn and the messages sent into the graph
+around each milestone. In delta mode the input stays at one message; what still
+grows is serializing the checkpoint, which holds the whole thread.
+
+Usage:
+    python -m benchmarks.bench_chat_turn_cost --turns 200
+    python -m benchmarks.bench_chat_turn_cost --mode full --checkpointer sqlite
+"""
+import argparse
+import os
+import tempfile
+import time
+import uuid
+from typing import Annotated, Any, Dict, List
+
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, START, StateGraph
+from langgraph.graph.message import add_messages
+from typing_extensions import TypedDict
+
+from virtual_sales_agent.checkpointer import CompactingCheckpointSaver, _SQLiteBackend
+
+MILESTONES = (10, 50, 100, 200, 500, 1000)
+
+
+class ChatState(TypedDict):
+    messages: Annotated[List[AnyMessage], add_messages]
+
+
+def stub_model(state: ChatState) -> Dict[str, Any]:
+    """Reply at once with a fixed-size answer, like a model with zero latency."""
+    return {"messages": [AIMessage(content="Dạ, em đã ghi nhận yêu cầu của anh/chị. " * 4)]}
+
+
+def build_graph(checkpointer: Any):
+    builder = StateGraph(ChatState)
+    builder.add_node("assistant", stub_model)
+    builder.add_edge(START, "assistant")
+    builder.add_edge("assistant", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def make_checkpointer(kind: str, workdir: str) -> Any:
+    if kind == "sqlite":
+        return CompactingCheckpointSaver(_SQLiteBackend(os.path.join(workdir, "bench_checkpoints.sqlite")))
+    return MemorySaver()
+
+
+def run(turns: int, mode: str, checkpointer: str) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory() as workdir:
+        graph = build_graph(make_checkpointer(checkpointer, workdir))
+        config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+        shown: List[AnyMessage] = []
+        timings: List[float] = []
+        sent: List[int] = []
+
+        for turn in range(1, turns + 1):
+            human_message = HumanMessage(content=f"Câu hỏi số {turn}: còn áo sơ mi size M không?", id=str(uuid.uuid4()))
+            started = time.perf_counter()
+            if mode == "full":
+                # The old loop: append locally, send everything, append the last reply
+                shown.append(human_message)
+                inputs = list(shown)
+                events = list(graph.stream({"messages": inputs}, config, stream_mode="values"))
+                shown.append(events[-1]["messages"][-1])
+            else:
+                inputs = [human_message]
+                shown.append(human_message)
+                list(graph.stream({"messages": inputs}, config, stream_mode="values"))
+                # sync_chat_history: append what the checkpoint has and the chat does not
+                shown_ids = {message.id for message in shown}
+                for message in graph.get_state(config).values["messages"]:
+                    if message.id not in shown_ids:
+                        shown.append(message)
+            timings.append(time.perf_counter() - started)
+            sent.append(len(inputs))
+
+        state_messages = len(graph.get_state(config).values["messages"])
+
+    result: Dict[str, Any] = {
+        "mode": mode,
+        "checkpointer": checkpointer,
+        "turns": turns,
+        "state_messages": state_messages,
+        "displayed_messages": len(shown),
+    }
+    for milestone in MILESTONES:
+        if milestone > turns:
+            break
+        # Average over the ten turns ending at the milestone to smooth out noise
+        window = timings[max(0, milestone - 10):milestone]
+        result[f"turn_{milestone}_ms"] = round(1000 * sum(window) / len(window), 2)
+        result[f"turn_{milestone}_sent"] = sent[milestone - 1]
+    first, last = timings[:10], timings[-10:]
+    result["growth_last_vs_first"] = round((sum(last) / len(last)) / (sum(first) / len(first)), 2)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure per-turn chat cost as a conversation grows")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--mode", choices=["delta", "full"], default="delta")
+    parser.add_argument("--checkpointer", choices=["memory", "sqlite"], default="memory")
+    args = parser.parse_args()
+
+    result = run(args.turns, args.mode, args.checkpointer)
+    for key, value in result.items():
+        print(f"{key:>22}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Flash-sale benchmark: many threads ordering the same SKU at once.
+
+Creates a throwaway customer and product, lets ``--threads`` workers place
+single-item orders against it until stock runs out, then reports throughput,
+retries, rejections and whether more units were sold than were in stock.
+Everything it created is deleted afterwards.
+
+Usage:
+    python -m benchmarks.bench_inventory_contention --threads 32 --stock 200
+    python -m benchmarks.bench_inventory_contention --mode naive   # legacy read-then-update
+"""
+import argparse
+import dataclasses
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict
+
+from setupDatabase.postgresql_config import DEFAULT_POSTGRESQL_CONFIG
+from setupDatabase.postgresql_manager import PostgreSQLManager
+from virtual_sales_agent.order_service import write_order
+
+logger = logging.getLogger(__name__)
+
+
+def naive_write_order(cursor, customer_id: int, product_id: int, quantity: int) -> None:
+    """The pre-batching create_order: check stock with a plain SELECT, then decrement."""
+    cursor.execute("SELECT price, quantity FROM products WHERE product_id = %s", (product_id,))
+    product = cursor.fetchone()
+    if product["quantity"] < quantity:
+        raise ValueError("out of stock")
+    cursor.execute(
+        "INSERT INTO orders (customer_id, order_date, status) VALUES (%s, %s, %s) RETURNING order_id",
+        (customer_id, datetime.now(), "Pending"),
+    )
+    order_id = cursor.fetchone()["order_id"]
+    cursor.execute(
+        "INSERT INTO orders_details (order_id, product_id, quantity, unit_price) VALUES (%s, %s, %s, %s)",
+        (order_id, product_id, quantity, product["price"]),
+    )
+    cursor.execute("UPDATE products SET quantity = quantity - %s WHERE product_id = %s", (quantity, product_id))
+
+
+def setup_fixtures(db_manager: PostgreSQLManager, stock: int) -> Dict[str, int]:
+    tag = uuid.uuid4().hex[:8]
+    with db_manager.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO customers (username, password, email) VALUES (%s, %s, %s) RETURNING customer_id",
+                (f"bench_{tag}", "bench", f"bench_{tag}@example.invalid"),
+            )
+            customer_id = cur.fetchone()[0]
+            cur.execute("SELECT id_category FROM categories ORDER BY id_category LIMIT 1")
+            category_id = cur.fetchone()[0]
+            cur.execute(
+                """INSERT INTO products (product_name, id_category, description, price, quantity)
+                   VALUES (%s, %s, %s, %s, %s) RETURNING product_id""",
+                (f"Bench SKU {tag}", category_id, "inventory contention benchmark", 1000, stock),
+            )
+            product_id = cur.fetchone()[0]
+    return {"customer_id": customer_id, "product_id": product_id}
+
+
+def cleanup_fixtures(db_manager: PostgreSQLManager, fixtures: Dict[str, int]) -> int:
+    """Delete everything the benchmark created and return the product's final stock."""
+    with db_manager.get_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT quantity FROM products WHERE product_id = %s", (fixtures["product_id"],))
+            final_stock = cur.fetchone()[0]
+            cur.execute(
+                "DELETE FROM orders_details WHERE order_id IN (SELECT order_id FROM orders WHERE customer_id = %s)",
+                (fixtures["customer_id"],),
+            )
+            cur.execute("DELETE FROM orders WHERE customer_id = %s", (fixtures["customer_id"],))
+            cur.execute("DELETE FROM products WHERE product_id = %s", (fixtures["product_id"],))
+            cur.execute("DELETE FROM customers WHERE customer_id = %s", (fixtures["customer_id"],))
+    return final_stock
+
+
+def run(threads: int, stock: int, quantity: int, mode: str) -> Dict[str, Any]:
+    db_manager = PostgreSQLManager(dataclasses.replace(DEFAULT_POSTGRESQL_CONFIG, pool_max_size=threads))
+    fixtures = setup_fixtures(db_manager, stock)
+    customer_id, product_id = fixtures["customer_id"], fixtures["product_id"]
+
+    counters = {"sold": 0, "rejected": 0, "errors": 0, "attempts": 0}
+    lock = threading.Lock()
+    start_gate = threading.Event()
+
+    def count(key: str, amount: int = 1) -> None:
+        with lock:
+            counters[key] += amount
+
+    def attempt(cursor):
+        count("attempts")
+        if mode == "naive":
+            naive_write_order(cursor, customer_id, product_id, quantity)
+        else:
+            write_order(cursor, customer_id, [{"product_id": product_id, "quantity": quantity}])
+
+    def worker() -> None:
+        start_gate.wait()
+        # Keep ordering until this worker sees the SKU sold out
+        while True:
+            try:
+                db_manager.run_transaction(attempt)
+                count("sold", quantity)
+            except ValueError:
+                count("rejected")
+                return
+            except Exception as e:
+                logger.debug(f"Order failed: {e}")
+                count("errors")
+                return
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    started = time.perf_counter()
+    start_gate.set()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    final_stock = cleanup_fixtures(db_manager, fixtures)
+    orders = counters["sold"] // quantity
+    return {
+        "mode": mode,
+        "threads": threads,
+        "initial_stock": stock,
+        "units_sold": counters["sold"],
+        "final_stock": final_stock,
+        "oversold_units": max(0, counters["sold"] - stock),
+        "stock_consistent": stock - final_stock == counters["sold"],
+        "orders": orders,
+        "rejected_out_of_stock": counters["rejected"],
+        "errors": counters["errors"],
+        "retries": counters["attempts"] - orders - counters["rejected"] - counters["errors"],
+        "elapsed_s": round(elapsed, 3),
+        "orders_per_s": round(orders / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Hammer one SKU with concurrent orders")
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--stock", type=int, default=200)
+    parser.add_argument("--quantity", type=int, default=1, help="units per order")
+    parser.add_argument("--mode", choices=["atomic", "naive"], default="atomic")
+    args = parser.parse_args()
+
+    result = run(args.threads, args.stock, args.quantity, args.mode)
+    for key, value in result.items():
+        print(f"{key:>22}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,12 @@
 import logging
 from setupDatabase.postgresql_manager import PostgreSQLManager
 
+# Shares the pooled connections used by the tools and UI
+db_manager = PostgreSQLManager()
+
 def test_database_connection():
     """Test database connection and verify tables."""
     logging.info("Testing database connection...")
-    db_manager = PostgreSQLManager()
     
     try:
         with db_manager.get_connection() as conn:
@@ -34,7 +36,6 @@ def test_database_connection():
 def list_recent_orders(limit=5):
     """List recent orders from the database for debugging."""
     logging.info(f"Listing {limit} most recent orders...")
-    db_manager = PostgreSQLManager()
     
     try:
         with db_manager.get_connection() as conn:
@@ -63,7 +64,6 @@ def list_recent_orders(limit=5):
 def verify_customer_session(customer_id):
     """Verify if a customer exists in the database."""
     logging.info(f"Verifying customer ID: {customer_id}")
-    db_manager = PostgreSQLManager()
     
     try:
         with db_manager.get_connection() as conn:
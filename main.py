@@ -4,7 +4,6 @@ import logging  # Add missing logging import
 
 import streamlit as st
 from langchain_core.messages import AIMessage, HumanMessage
-from langchain_core.messages.tool import ToolMessage
 from virtual_sales_agent.tools import (
     login_customer,
     register_customer,
@@ -14,14 +13,20 @@ from virtual_sales_agent.tools import (
 import tempfile
 import os
 
-from virtual_sales_agent.graph import graph
 from virtual_sales_agent.ui import (
     create_order_ui,
     update_order_ui,
     cancel_order_ui,
     customer_profile_form,
     send_tool_response,
-    process_events
+    approval_tool_call,
+    process_events,
+    is_message_shown,
+    sync_chat_history,
+    stream_chat_turn,
+    render_message_cards,
+    render_product_cards,
+    IMAGE_RESULTS_MESSAGE_NAME,
 )
 
 def set_page_config():
@@ -160,9 +165,11 @@ def setup_sidebar():
 
         st.markdown("---")
         if st.button("🔄 Bắt đầu cuộc trò chuyện mới", use_container_width=True):
-            # Chỉ xóa messages trong session, không xóa lịch sử database
-            if "messages" in st.session_state:
-                del st.session_state["messages"]
+            # Cuộc trò chuyện mới dùng thread mới; checkpoint và lịch sử database của thread cũ vẫn giữ nguyên
+            st.session_state.thread_id = str(uuid.uuid4())
+            st.session_state.config["configurable"]["thread_id"] = st.session_state.thread_id
+            st.session_state.messages = []
+            st.session_state.pending_approval = None
             st.rerun()
 
         if st.button("🔍 Xem sơ đồ làm việc", use_container_width=True):
@@ -197,26 +204,24 @@ def display_chat_history():
         role = "user" if isinstance(message, HumanMessage) else "assistant"
         with st.chat_message(role):
             st.write(message.content)
+            render_message_cards(message)
             
 def process_events(event):
     """Process events from the graph and extract messages."""
-    seen_ids = set()
-
     try:
         if isinstance(event, dict) and "messages" in event:
             messages = event["messages"]
             last_message = messages[-1] if messages else None
 
             if isinstance(last_message, AIMessage):
-                if last_message.id not in seen_ids and last_message.content:
-                    seen_ids.add(last_message.id)
+                if last_message.content and not is_message_shown(last_message):
                     st.session_state.messages.append(last_message)
                     with st.chat_message("assistant"):
                         st.write(last_message.content)
 
                 if hasattr(last_message, "tool_calls") and last_message.tool_calls:
-                    # Ensure tool_calls[0] is a dict and has required fields
-                    tool_call = last_message.tool_calls[0]
+                    # Ensure the call to approve is a dict and has required fields
+                    tool_call = approval_tool_call(last_message)
                     if isinstance(tool_call, dict):
                         # Initialize args as empty dict if missing
                         if "args" not in tool_call or tool_call["args"] is None:
@@ -230,28 +235,6 @@ def process_events(event):
 
     return None
 
-def send_tool_response(tool_call_id, content, config):
-    """Send a response for a tool call"""
-    try:
-        if isinstance(content, dict):
-            content = json.dumps(content)
-            
-        result = graph.invoke(
-            {
-                "messages": [
-                    ToolMessage(
-                        tool_call_id=tool_call_id,
-                        content=content,
-                    )
-                ]
-            },
-            config,
-        )
-        return result
-    except Exception as e:
-        logging.error(f"Error sending tool response: {str(e)}")
-        raise e
-
 def handle_tool_approval(snapshot, event):
     """Handle tool approval process."""
     st.write("⚠️ Trợ lý muốn thực hiện một hành động. Bạn có đồng ý không?")
@@ -274,7 +257,8 @@ def handle_tool_approval(snapshot, event):
         and hasattr(last_message, "tool_calls")
         and last_message.tool_calls
     ):
-        tool_call = last_message.tool_calls[0]
+        # The sensitive call decides which approval screen to show, wherever it is in the batch
+        tool_call = approval_tool_call(last_message)
         # print(f"Tool call: {tool_call}")
         
         # Add better validation for tool calls
@@ -498,30 +482,31 @@ def display_chat_interface():
                                     user_msg += f" và từ khóa: {search_query.strip()}"
                                 
                                 messages = [
-                                    HumanMessage(content=user_msg),
-                                    AIMessage(content=json.dumps(tool_result["products"]))
+                                    HumanMessage(content=user_msg, id=str(uuid.uuid4())),
+                                    # Kết quả thô chỉ dành cho LLM, không hiển thị trong lịch sử chat
+                                    AIMessage(
+                                        content=json.dumps(tool_result["products"]),
+                                        name=IMAGE_RESULTS_MESSAGE_NAME,
+                                        id=str(uuid.uuid4()),
+                                    ),
                                 ]
                                 
                                 with st.chat_message("user"):
                                     st.write(user_msg)
                                 
-                                with st.spinner("Đang xử lý kết quả với AI..."):
-                                    events = list(
-                                        graph.stream(
-                                            {"messages": messages},
-                                            st.session_state.config,
-                                            stream_mode="values",
-                                        )
-                                    )
-                                    last_event = events[-1]
-                                    if isinstance(last_event, dict) and "messages" in last_event:
-                                        ai_msg = last_event["messages"][-1]
-                                        with st.chat_message("assistant"):
+                                _, streamed_ids = stream_chat_turn({"messages": messages}, st.session_state.config)
+                                added = sync_chat_history(st.session_state.config)
+                                replies = [message for message in added if isinstance(message, AIMessage)]
+                                if replies:
+                                    # Cards come from the search result, the reply only introduces them
+                                    st.session_state.setdefault("product_cards", {})[replies[-1].id] = tool_result["products"]
+                                for ai_msg in replies:
+                                    with st.chat_message("assistant"):
+                                        if ai_msg.id not in streamed_ids:
                                             st.write(ai_msg.content)
-                                        st.session_state.messages.append(HumanMessage(content=user_msg))
-                                        st.session_state.messages.append(ai_msg)
-                                    else:
-                                        st.write(tool_result["products"])
+                                        render_message_cards(ai_msg)
+                                if not replies:
+                                    render_product_cards(tool_result["products"])
                             else:
                                 st.error(tool_result.get("message", "Lỗi không xác định"))
         
@@ -541,8 +526,8 @@ def display_chat_interface():
     prompt = st.chat_input("Bạn muốn mua gì hôm nay? / What would you like to order today?")
 
     if prompt and prompt.strip():
-        # Add user message to state
-        human_message = HumanMessage(content=prompt.strip())
+        # Add user message to state; the explicit id lets sync_chat_history recognise it in the checkpoint
+        human_message = HumanMessage(content=prompt.strip(), id=str(uuid.uuid4()))
         st.session_state.messages.append(human_message)
         
         # Display user message
@@ -550,48 +535,54 @@ def display_chat_interface():
             st.write(prompt.strip())
         
         # Process with graph
-        with st.spinner("Đang xử lý..."):
-            try:
-                # Stream response from agent
-                events = list(
-                    graph.stream(
-                        {"messages": st.session_state.messages},
-                        st.session_state.config,
-                        stream_mode="values",
-                    )
-                )
-                
-                # Get latest snapshot
-                snapshot = events[-1] if events else None
+        try:
+            # Stream response from agent token by token. Only the new message is sent: the
+            # checkpointer already holds the rest of the thread, so a turn costs the same at message 5 or 500
+            snapshot, streamed_ids = stream_chat_turn({"messages": [human_message]}, st.session_state.config)
+            events = [snapshot] if snapshot else []
+
+            # Rebuild the displayed history from the checkpoint; show replies that were not streamed
+            # (order_preparation answers without the LLM)
+            for message in sync_chat_history(st.session_state.config):
+                if isinstance(message, AIMessage) and message.id not in streamed_ids:
+                    with st.chat_message("assistant"):
+                        st.write(message.content)
+                        render_message_cards(message)
+                elif isinstance(message, AIMessage) and message.id in st.session_state.get("product_cards", {}):
+                    with st.chat_message("assistant"):
+                        render_message_cards(message)
+            
+            # Check if we need to handle a tool approval
+            if snapshot and "messages" in snapshot:
+                last_message = snapshot["messages"][-1]
                 
-                # Check if we need to handle a tool approval
-                if snapshot and "messages" in snapshot:
-                    last_message = snapshot["messages"][-1]
-                    
-                    # Check if we need to handle pending approval for sensitive tools
-                    if (
-                        isinstance(last_message, AIMessage) 
-                        and hasattr(last_message, "tool_calls") 
-                        and last_message.tool_calls
-                        and isinstance(last_message.tool_calls[0], dict)
-                        and last_message.tool_calls[0].get("name") in ["create_order", "update_order", "cancel_order", "delete_order", "update_customer_info"]
-                    ):
-                        # Store pending approval in session state
+                # Check if we need to handle pending approval for sensitive tools
+                if (
+                    isinstance(last_message, AIMessage) 
+                    and hasattr(last_message, "tool_calls") 
+                    and last_message.tool_calls
+                    and any(
+                        isinstance(tool_call, dict)
+                        and tool_call.get("name") in ["create_order", "update_order", "cancel_order", "delete_order", "update_customer_info"]
+                        for tool_call in last_message.tool_calls
+                    )
+                ):
+                    # Store pending approval in session state
+                    st.session_state.pending_approval = (snapshot, events)
+                    st.rerun()
+                else:
+                    # For regular messages or safe tools, process events
+                    tool_call = process_events(snapshot)
+                    if tool_call:
+                        # Handle any returned tool calls
                         st.session_state.pending_approval = (snapshot, events)
                         st.rerun()
-                    else:
-                        # For regular messages or safe tools, process events
-                        tool_call = process_events(snapshot)
-                        if tool_call:
-                            # Handle any returned tool calls
-                            st.session_state.pending_approval = (snapshot, events)
-                            st.rerun()
-            except Exception as e:
-                logging.error(f"Error processing chat: {str(e)}")
-                st.error(f"Đã xảy ra lỗi: {str(e)}")
-                # Still append the user's message even if there was an error
-                with st.chat_message("assistant"):
-                    st.write("Xin lỗi, đã xảy ra lỗi khi xử lý yêu cầu của bạn. Vui lòng thử lại.")
+        except Exception as e:
+            logging.error(f"Error processing chat: {str(e)}")
+            st.error(f"Đã xảy ra lỗi: {str(e)}")
+            # Still append the user's message even if there was an error
+            with st.chat_message("assistant"):
+                st.write("Xin lỗi, đã xảy ra lỗi khi xử lý yêu cầu của bạn. Vui lòng thử lại.")
     st.markdown('</div>', unsafe_allow_html=True)
 
 if __name__ == "__main__":
@@ -0,0 +1,287 @@
+import argparse
+import hashlib
+import logging
+import re
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from psycopg2.extras import RealDictCursor
+
+from .postgresql_manager import PostgreSQLManager
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+MIGRATION_FILE_PATTERN = re.compile(r"^(\d{4})_([a-z0-9_]+)\.sql$")
+
+# Representative statements for the tool hot paths; EXPLAINed before and after
+# pending migrations so the runner can report what the new indexes bought us.
+HOT_PATH_QUERIES: Dict[str, Tuple[str, Sequence[Any]]] = {
+    "search_products": (
+        """
+        SELECT p.*, c.category_name
+        FROM products p
+        JOIN categories c ON p.id_category = c.id_category
+        WHERE p.quantity > 0
+          AND (LOWER(p.product_name) LIKE %s OR LOWER(p.description) LIKE %s)
+        ORDER BY p.product_name
+        LIMIT 2
+        """,
+        ("%cờ vua%", "%cờ vua%"),
+    ),
+    "search_products_fts": (
+        """
+        SELECT p.*, c.category_name, ts_rank_cd(p.search_vector, q) AS rank
+        FROM products p
+        JOIN categories c ON p.id_category = c.id_category
+        CROSS JOIN to_tsquery('simple', %s) q
+        WHERE p.quantity > 0 AND p.search_vector @@ q
+        ORDER BY (vn_fold(p.product_name) = %s) DESC, rank DESC, p.product_name
+        LIMIT 2
+        """,
+        ("co:* | vua:*", "co vua"),
+    ),
+    "create_order_product_lookup": (
+        "SELECT product_id, price, quantity FROM products WHERE LOWER(product_name) = LOWER(%s)",
+        ("Cờ Vua Regal",),
+    ),
+    "check_order_status": (
+        """
+        SELECT order_id, order_date, status, item_count, total_amount
+        FROM orders
+        WHERE customer_id = %s AND (order_date, order_id) < (NOW(), 2147483647)
+        ORDER BY order_date DESC, order_id DESC
+        LIMIT 11
+        """,
+        (1,),
+    ),
+    "get_order_details": (
+        """
+        SELECT o.order_id, o.order_date, o.status, o.total_amount, COALESCE(l.lines, '[]'::json) AS lines
+        FROM orders o
+        LEFT JOIN LATERAL (
+            SELECT json_agg(json_build_object('product_name', p.product_name, 'quantity', od.quantity)) AS lines
+            FROM orders_details od
+            JOIN products p ON od.product_id = p.product_id
+            WHERE od.order_id = o.order_id
+        ) AS l ON TRUE
+        WHERE o.order_id = ANY(%s::int[]) AND o.customer_id = %s
+        """,
+        ([1, 2], 1),
+    ),
+}
+
+
+@dataclass
+class Migration:
+    """A numbered SQL migration file."""
+
+    version: int
+    name: str
+    path: Path
+
+    @property
+    def sql(self) -> str:
+        return self.path.read_text(encoding="utf-8")
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.path.read_bytes()).hexdigest()
+
+
+class MigrationRunner:
+    """
+    Applies numbered, idempotent migrations from ``setupDatabase/migrations``.
+
+    Applied versions are recorded in ``schema_migrations``; each migration runs
+    in its own transaction under an advisory lock so concurrent runners cannot
+    interleave. Migrations only add objects, they never drop tables or data.
+    """
+
+    def __init__(self, db_manager: Optional[PostgreSQLManager] = None, migrations_dir: Path = MIGRATIONS_DIR):
+        self.db_manager = db_manager or PostgreSQLManager()
+        self.migrations_dir = Path(migrations_dir)
+
+    def discover(self) -> List[Migration]:
+        """
+        Find migration files on disk.
+
+        Returns:
+            List[Migration]: Migrations sorted by version.
+        """
+        migrations = []
+        for path in self.migrations_dir.glob("*.sql"):
+            match = MIGRATION_FILE_PATTERN.match(path.name)
+            if not match:
+                logger.warning(f"Ignoring file with unexpected name in migrations: {path.name}")
+                continue
+            migrations.append(Migration(int(match.group(1)), match.group(2), path))
+
+        migrations.sort(key=lambda m: m.version)
+        versions = [m.version for m in migrations]
+        if len(versions) != len(set(versions)):
+            raise ValueError(f"Duplicate migration versions in {self.migrations_dir}")
+        return migrations
+
+    def _ensure_version_table(self, cursor) -> None:
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                checksum CHAR(64) NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+
+    def applied(self) -> Dict[int, str]:
+        """
+        Read applied migration versions.
+
+        Returns:
+            Dict[int, str]: Checksum of each applied version.
+        """
+        with self.db_manager.get_connection() as conn:
+            with conn.cursor() as cur:
+                self._ensure_version_table(cur)
+                cur.execute("SELECT version, checksum FROM schema_migrations")
+                return {version: checksum for version, checksum in cur.fetchall()}
+
+    def pending(self) -> List[Migration]:
+        """
+        Migrations on disk that have not been applied yet.
+
+        Returns:
+            List[Migration]: Pending migrations sorted by version.
+        """
+        applied = self.applied()
+        migrations = self.discover()
+        for migration in migrations:
+            if migration.version in applied and applied[migration.version] != migration.checksum:
+                logger.warning(
+                    f"Migration {migration.version:04d}_{migration.name} was edited after being applied"
+                )
+        return [m for m in migrations if m.version not in applied]
+
+    def explain_hot_paths(self) -> Dict[str, Dict[str, Any]]:
+        """
+        EXPLAIN every hot-path query.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Estimated total cost, plan node types and indexes used per query.
+        """
+        plans = {}
+        with self.db_manager.get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cur:
+                for name, (query, params) in HOT_PATH_QUERIES.items():
+                    try:
+                        cur.execute(f"EXPLAIN (FORMAT JSON) {query}", params)
+                        plan = cur.fetchone()["QUERY PLAN"][0]["Plan"]
+                        plans[name] = {
+                            "total_cost": plan["Total Cost"],
+                            "node_types": sorted(set(_collect(plan, "Node Type"))),
+                            "indexes": sorted(set(_collect(plan, "Index Name"))),
+                        }
+                    except Exception as e:
+                        conn.rollback()
+                        plans[name] = {"error": str(e)}
+            conn.rollback()
+        return plans
+
+    def migrate(self, target: Optional[int] = None, report: bool = True) -> Dict[str, Any]:
+        """
+        Apply pending migrations up to ``target``.
+
+        Args:
+            target (Optional[int]): Highest version to apply. Applies everything if None.
+            report (bool): EXPLAIN the hot-path queries before and after and log the difference.
+
+        Returns:
+            Dict[str, Any]: Applied versions and, when requested, the query-plan report.
+        """
+        pending = [m for m in self.pending() if target is None or m.version <= target]
+        if not pending:
+            logger.info("Database schema is up to date")
+            return {"applied": [], "plans": {}}
+
+        before = self.explain_hot_paths() if report else {}
+
+        applied = []
+        for migration in pending:
+            with self.db_manager.get_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_advisory_xact_lock(hashtext('schema_migrations'))")
+                    self._ensure_version_table(cur)
+                    cur.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (migration.version,))
+                    if cur.fetchone():
+                        continue
+
+                    logger.info(f"Applying migration {migration.version:04d}_{migration.name}")
+                    cur.execute(migration.sql)
+                    cur.execute(
+                        "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s)",
+                        (migration.version, migration.name, migration.checksum),
+                    )
+            applied.append(migration.version)
+
+        if not report:
+            return {"applied": applied, "plans": {}}
+
+        with self.db_manager.get_connection() as conn:
+            with conn.cursor() as cur:
+                # Fresh statistics so the planner actually considers the new indexes
+                cur.execute("ANALYZE products, categories, orders, orders_details")
+
+        after = self.explain_hot_paths()
+        plans = {}
+        for name in HOT_PATH_QUERIES:
+            plans[name] = {"before": before.get(name, {}), "after": after.get(name, {})}
+            cost_before = before.get(name, {}).get("total_cost")
+            cost_after = after.get(name, {}).get("total_cost")
+            if cost_before is None or cost_after is None:
+                logger.info(f"[plan] {name}: before={before.get(name)} after={after.get(name)}")
+                continue
+            change = (cost_before - cost_after) / cost_before * 100 if cost_before else 0.0
+            logger.info(
+                f"[plan] {name}: cost {cost_before:.2f} -> {cost_after:.2f} ({change:.1f}% reduction), "
+                f"indexes {after[name]['indexes'] or 'none'}"
+            )
+        return {"applied": applied, "plans": plans}
+
+
+def _collect(plan: Dict[str, Any], key: str) -> List[Any]:
+    """Collect ``key`` from a JSON plan node and all of its children."""
+    values = [plan[key]] if key in plan else []
+    for child in plan.get("Plans", []):
+        values.extend(_collect(child, key))
+    return values
+
+
+def main(argv: Optional[Sequence[str]] = None) -> bool:
+    """Command line entry point: ``python -m setupDatabase.migrate``."""
+    parser = argparse.ArgumentParser(description="Apply numbered schema migrations")
+    parser.add_argument("--target", type=int, default=None, help="highest migration version to apply")
+    parser.add_argument("--no-report", action="store_true", help="skip the before/after query-plan report")
+    parser.add_argument("--list", action="store_true", help="list pending migrations and exit")
+    args = parser.parse_args(argv)
+
+    runner = MigrationRunner()
+    if args.list:
+        for migration in runner.pending():
+            print(f"{migration.version:04d}_{migration.name}")
+        return True
+
+    try:
+        result = runner.migrate(target=args.target, report=not args.no_report)
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        return False
+    logger.info(f"Applied migrations: {result['applied'] or 'none'}")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
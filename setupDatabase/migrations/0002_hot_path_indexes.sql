@@ -0,0 +1,29 @@
+-- Secondary indexes for the queries issued by the tools in virtual_sales_agent/tools.py.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- create_order / update_order: WHERE LOWER(product_name) = LOWER(%s)
+CREATE INDEX IF NOT EXISTS idx_products_lower_name
+    ON products (LOWER(product_name));
+
+-- search_products: LOWER(product_name) / LOWER(description) LIKE '%...%' over in-stock rows
+CREATE INDEX IF NOT EXISTS idx_products_in_stock_name_trgm
+    ON products USING gin (LOWER(product_name) gin_trgm_ops)
+    WHERE quantity > 0;
+CREATE INDEX IF NOT EXISTS idx_products_in_stock_description_trgm
+    ON products USING gin (LOWER(description) gin_trgm_ops)
+    WHERE quantity > 0;
+
+-- search_products: category / price filters and catalog aggregates over in-stock rows
+CREATE INDEX IF NOT EXISTS idx_products_in_stock_category_price
+    ON products (id_category, price)
+    WHERE quantity > 0;
+
+-- Foreign keys: check_order_status, get_order_details and the stock restore paths
+CREATE INDEX IF NOT EXISTS idx_products_id_category
+    ON products (id_category);
+CREATE INDEX IF NOT EXISTS idx_orders_customer_id
+    ON orders (customer_id, order_date DESC);
+CREATE INDEX IF NOT EXISTS idx_orders_details_order_id
+    ON orders_details (order_id);
+CREATE INDEX IF NOT EXISTS idx_orders_details_product_id
+    ON orders_details (product_id);
@@ -0,0 +1,37 @@
+-- Full-text search for search_products: diacritic-folded tsvector kept up to date by a
+-- trigger and served by a GIN index.
+CREATE EXTENSION IF NOT EXISTS unaccent;
+
+-- unaccent() is only STABLE because its dictionary could change; pin the dictionary so the
+-- folding can be declared IMMUTABLE. The default unaccent rules also fold "đ" to "d".
+CREATE OR REPLACE FUNCTION vn_fold(text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    AS $$ SELECT lower(public.unaccent('public.unaccent'::regdictionary, $1)) $$;
+
+ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION products_search_vector_refresh() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', vn_fold(coalesce(NEW.product_name, ''))), 'A') ||
+        setweight(to_tsvector('simple', vn_fold(coalesce(NEW.description, ''))), 'B');
+    RETURN NEW;
+END
+$$;
+
+-- Only name/description changes recompute the vector; stock updates do not pay for it.
+DROP TRIGGER IF EXISTS trg_products_search_vector ON products;
+CREATE TRIGGER trg_products_search_vector
+    BEFORE INSERT OR UPDATE OF product_name, description ON products
+    FOR EACH ROW EXECUTE FUNCTION products_search_vector_refresh();
+
+UPDATE products
+SET search_vector =
+    setweight(to_tsvector('simple', vn_fold(coalesce(product_name, ''))), 'A') ||
+    setweight(to_tsvector('simple', vn_fold(coalesce(description, ''))), 'B')
+WHERE search_vector IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_products_search_vector
+    ON products USING gin (search_vector);
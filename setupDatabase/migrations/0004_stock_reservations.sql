@@ -0,0 +1,21 @@
+-- Stock held for a customer while an order waits for approval. Holding decrements
+-- products.quantity right away; the row remembers how much to give back when the hold
+-- expires or is released, and create_order consumes it when the order is placed.
+CREATE TABLE IF NOT EXISTS stock_reservations (
+    reservation_id SERIAL PRIMARY KEY,
+    product_id INTEGER NOT NULL,
+    customer_id INTEGER NOT NULL,
+    quantity INTEGER NOT NULL CHECK(quantity > 0),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    FOREIGN KEY (product_id) REFERENCES products (product_id),
+    FOREIGN KEY (customer_id) REFERENCES customers (customer_id)
+);
+
+-- Sweeper: WHERE expires_at <= NOW()
+CREATE INDEX IF NOT EXISTS idx_stock_reservations_expires_at
+    ON stock_reservations (expires_at);
+
+-- create_order / hold replacement: WHERE customer_id = %s AND product_id = ANY(...)
+CREATE INDEX IF NOT EXISTS idx_stock_reservations_customer_product
+    ON stock_reservations (customer_id, product_id);
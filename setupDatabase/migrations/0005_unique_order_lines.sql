@@ -0,0 +1,23 @@
+-- One orders_details row per (order, product), so update_order can upsert changed lines
+-- with ON CONFLICT instead of deleting and re-inserting the whole order.
+
+-- Older rows may repeat a product within an order: fold them into the first line
+WITH merged AS (
+    SELECT order_id, product_id, MIN(order_detail_id) AS keep_id, SUM(quantity) AS quantity
+    FROM orders_details
+    GROUP BY order_id, product_id
+    HAVING COUNT(*) > 1
+)
+UPDATE orders_details AS od
+SET quantity = m.quantity
+FROM merged m
+WHERE od.order_detail_id = m.keep_id;
+
+DELETE FROM orders_details AS od
+USING orders_details AS keep
+WHERE od.order_id = keep.order_id
+  AND od.product_id = keep.product_id
+  AND od.order_detail_id > keep.order_detail_id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_orders_details_order_product
+    ON orders_details (order_id, product_id);
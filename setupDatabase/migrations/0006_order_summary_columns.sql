@@ -0,0 +1,24 @@
+-- Order totals kept on the order row, so check_order_status and get_order_details
+-- read them instead of aggregating orders_details joined to products on every call.
+-- The order tools refresh these columns in the same transaction that changes the lines
+-- (see order_service.refresh_order_summary).
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS total_amount DECIMAL(14, 2) NOT NULL DEFAULT 0;
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS item_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS line_summary TEXT;
+
+WITH summary AS (
+    SELECT
+        od.order_id,
+        SUM(od.quantity * od.unit_price) AS total_amount,
+        COUNT(od.order_detail_id)::int AS item_count,
+        STRING_AGG(p.product_name || ' (x' || od.quantity || ')', ', ' ORDER BY od.product_id) AS line_summary
+    FROM orders_details od
+    JOIN products p ON od.product_id = p.product_id
+    GROUP BY od.order_id
+)
+UPDATE orders AS o
+SET total_amount = s.total_amount,
+    item_count = s.item_count,
+    line_summary = s.line_summary
+FROM summary s
+WHERE o.order_id = s.order_id;
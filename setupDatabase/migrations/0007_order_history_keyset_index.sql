@@ -0,0 +1,10 @@
+-- check_order_status pages a customer's orders newest first with a keyset cursor:
+--   WHERE customer_id = %s AND (order_date, order_id) < (%s, %s)
+--   ORDER BY order_date DESC, order_id DESC LIMIT n
+-- order_id breaks ties between orders placed in the same instant, so it has to be in the index
+-- for the scan to start at the cursor and stop after n rows.
+CREATE INDEX IF NOT EXISTS idx_orders_customer_date_id
+    ON orders (customer_id, order_date DESC, order_id DESC);
+
+-- Superseded by the index above (same leading columns)
+DROP INDEX IF EXISTS idx_orders_customer_id;
@@ -0,0 +1,14 @@
+-- Conversation log written in batches by virtual_sales_agent.history_writer.
+-- Previously created on demand by save_message_history, which probed
+-- information_schema on every assistant turn.
+CREATE TABLE IF NOT EXISTS conversation_history (
+    id SERIAL PRIMARY KEY,
+    customer_id VARCHAR(50),
+    user_message TEXT,
+    bot_response TEXT,
+    tool_calls JSON,
+    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_conversation_history_customer_time
+    ON conversation_history (customer_id, timestamp DESC);
@@ -0,0 +1,246 @@
+import asyncio
+import logging
+import random
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Sequence, TypeVar
+
+from psycopg import AsyncConnection, AsyncCursor, errors
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from .postgresql_config import DEFAULT_POSTGRESQL_CONFIG, PostgreSQLConfig
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Errors after which the whole transaction can simply be run again
+RETRYABLE_ERRORS = (errors.SerializationFailure, errors.DeadlockDetected)
+
+
+async def execute_values(
+    cursor: AsyncCursor,
+    query: str,
+    argslist: Sequence[Sequence[Any]],
+    template: Optional[str] = None,
+    page_size: int = 100,
+    fetch: bool = False,
+) -> List[Any]:
+    """
+    Async counterpart of ``psycopg2.extras.execute_values``.
+
+    Expands the single ``VALUES %s`` placeholder in ``query`` into one row
+    template per argument tuple, ``page_size`` rows per statement.
+
+    Args:
+        cursor (AsyncCursor): Cursor to execute on.
+        query (str): Statement containing exactly one ``%s`` for the values list.
+        argslist (Sequence[Sequence[Any]]): One parameter tuple per row.
+        template (Optional[str]): Row template, e.g. ``"(%s::int, %s::int)"``. Defaults to plain placeholders.
+        page_size (int): Maximum rows per statement.
+        fetch (bool): Collect and return the rows produced by ``RETURNING``.
+
+    Returns:
+        List[Any]: Returned rows when ``fetch`` is True, otherwise an empty list.
+    """
+    head, tail = query.split("%s", 1)
+    results: List[Any] = []
+    for start in range(0, len(argslist), page_size):
+        page = argslist[start:start + page_size]
+        row_template = template or "(" + ", ".join(["%s"] * len(page[0])) + ")"
+        params = [value for row in page for value in row]
+        await cursor.execute(head + ", ".join([row_template] * len(page)) + tail, params)
+        if fetch:
+            results.extend(await cursor.fetchall())
+    return results
+
+
+class AsyncPostgreSQLManager:
+    """
+    Asyncio-native data access next to PostgreSQLManager, built on psycopg 3.
+
+    Rows are returned as dictionaries, matching the RealDictCursor rows the
+    synchronous tools work with. The pool is opened lazily inside the running
+    event loop, so many chat sessions on one loop share the same connections.
+    """
+
+    def __init__(self, config: PostgreSQLConfig = DEFAULT_POSTGRESQL_CONFIG, max_lifetime: float = 3600.0):
+        self.config = config
+        self.max_lifetime = max_lifetime
+        self._pool: Optional[AsyncConnectionPool] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _conninfo(self) -> str:
+        return make_conninfo(
+            host=self.config.host,
+            port=self.config.port,
+            dbname=self.config.database,
+            user=self.config.user,
+            password=self.config.password,
+        )
+
+    async def get_pool(self) -> AsyncConnectionPool:
+        """
+        Return the pool bound to the running event loop, opening it on first use.
+
+        Returns:
+            AsyncConnectionPool: Open connection pool.
+        """
+        loop = asyncio.get_running_loop()
+        if self._pool is not None and self._loop is loop:
+            return self._pool
+
+        if self._lock is None or self._loop is not loop:
+            # Locks and pools cannot be shared across event loops (e.g. repeated asyncio.run)
+            if self._pool is not None:
+                await self._close_stale_pool(self._pool, self._loop)
+            self._lock = asyncio.Lock()
+            self._pool = None
+            self._loop = loop
+
+        async with self._lock:
+            if self._pool is None:
+                pool = AsyncConnectionPool(
+                    self._conninfo(),
+                    min_size=self.config.pool_min_size,
+                    max_size=self.config.pool_max_size,
+                    timeout=self.config.pool_timeout,
+                    max_lifetime=self.max_lifetime,
+                    check=AsyncConnectionPool.check_connection,
+                    kwargs={"row_factory": dict_row},
+                    open=False,
+                    name="virtual-sales-agent-async",
+                )
+                await pool.open()
+                self._pool = pool
+                logger.info(
+                    f"Opened async connection pool for {self.config.database} "
+                    f"(min={self.config.pool_min_size}, max={self.config.pool_max_size})"
+                )
+        return self._pool
+
+    async def _close_stale_pool(self, pool: AsyncConnectionPool, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        """
+        Close the pool of an event loop this manager no longer serves.
+
+        A pool can only be closed on its own loop. When that loop still runs in another
+        thread it is closed there; once the loop has ended its worker tasks are gone, so
+        the idle connections stay open until garbage collection and a warning is logged.
+        Awaiting ``close()`` before such a loop ends avoids that.
+        """
+        if loop is not None and loop.is_running():
+            try:
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(pool.close(), loop))
+                logger.info("Closed the async connection pool of a previous event loop")
+                return
+            except Exception as e:
+                logger.error(f"Error closing the async connection pool of a previous event loop: {e}")
+        logger.warning(
+            f"Replacing the async connection pool of an event loop that has ended without closing it "
+            f"({pool.get_stats()}); await close() before the loop ends"
+        )
+
+    @asynccontextmanager
+    async def get_connection(self) -> AsyncGenerator[AsyncConnection, None]:
+        """
+        Async context manager for pooled database connections.
+
+        The transaction is committed when the block exits normally and rolled back on error.
+
+        Yields:
+            psycopg.AsyncConnection: Database connection object.
+        """
+        pool = await self.get_pool()
+        async with pool.connection() as conn:
+            yield conn
+
+    async def run_transaction(
+        self,
+        callback: Callable[[AsyncCursor], Awaitable[T]],
+        max_retries: int = 3,
+        base_delay: float = 0.05,
+    ) -> T:
+        """
+        Run ``callback`` in a transaction, retrying it on serialization failures and deadlocks.
+
+        Args:
+            callback (Callable[[AsyncCursor], Awaitable[T]]): Transaction body.
+            max_retries (int): Retries after the first attempt.
+            base_delay (float): Delay in seconds before the first retry.
+
+        Returns:
+            T: Whatever the callback returned once the transaction committed.
+        """
+        attempt = 0
+        while True:
+            try:
+                async with self.get_connection() as conn:
+                    async with conn.transaction():
+                        async with conn.cursor() as cur:
+                            return await callback(cur)
+            except RETRYABLE_ERRORS as e:
+                if attempt >= max_retries:
+                    raise
+                delay = base_delay * (2 ** attempt) * random.uniform(0.5, 1.5)
+                attempt += 1
+                logger.warning(f"Transaction conflict ({e.sqlstate}), retry {attempt}/{max_retries} in {delay:.3f}s")
+                await asyncio.sleep(delay)
+
+    async def fetch_one(self, query: str, params: Optional[Sequence[Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Run a query and return its first row.
+
+        Args:
+            query (str): SQL query.
+            params (Optional[Sequence[Any]]): Query parameters.
+
+        Returns:
+            Optional[Dict[str, Any]]: First row, or None when the query returned nothing.
+        """
+        async with self.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params)
+                return await cur.fetchone()
+
+    async def fetch_all(self, query: str, params: Optional[Sequence[Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Run a query and return all rows.
+
+        Args:
+            query (str): SQL query.
+            params (Optional[Sequence[Any]]): Query parameters.
+
+        Returns:
+            List[Dict[str, Any]]: Result rows.
+        """
+        async with self.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params)
+                return await cur.fetchall()
+
+    async def execute(self, query: str, params: Optional[Sequence[Any]] = None) -> int:
+        """
+        Run a statement in its own transaction.
+
+        Args:
+            query (str): SQL statement.
+            params (Optional[Sequence[Any]]): Statement parameters.
+
+        Returns:
+            int: Number of affected rows.
+        """
+        async with self.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, params)
+                return cur.rowcount
+
+    async def close(self) -> None:
+        """Close the pool if it was opened; await it before the event loop that opened it ends."""
+        if self._pool is not None:
+            if self._loop is asyncio.get_running_loop():
+                await self._pool.close()
+            else:
+                await self._close_stale_pool(self._pool, self._loop)
+            self._pool = None
@@ -16,6 +16,11 @@ class PostgreSQLConfig:
     password: str
     schema_path: Optional[str] = None
     csv_path: Optional[str] = None
+    pool_min_size: int = 1
+    pool_max_size: int = 10
+    pool_timeout: float = 30.0  # seconds to wait for a free connection
+    pool_max_uses: int = 1000  # recycle a connection after this many checkouts
+    pool_health_check_interval: float = 30.0  # ping connections idle longer than this
     
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -35,5 +40,9 @@ DEFAULT_POSTGRESQL_CONFIG = PostgreSQLConfig(
     user=os.getenv("POSTGRES_USER", "minhnghia"),  # Changed from username to user
     password=os.getenv("POSTGRES_PASSWORD", "minhnghia"),
     schema_path="postgresql_schemas.sql",
-    csv_path="E:\\llm\\llm_engineering\\project2\\crawlData\\product_details.csv"
+    csv_path="E:\\llm\\llm_engineering\\project2\\crawlData\\product_details.csv",
+    pool_min_size=int(os.getenv("POSTGRES_POOL_MIN_SIZE", "1")),
+    pool_max_size=int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10")),
+    pool_timeout=float(os.getenv("POSTGRES_POOL_TIMEOUT", "30")),
+    pool_max_uses=int(os.getenv("POSTGRES_POOL_MAX_USES", "1000")),
 )
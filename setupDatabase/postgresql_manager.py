@@ -1,21 +1,36 @@
 import logging
 import psycopg2
+import psycopg2.errors
 import psycopg2.extras
 from psycopg2.extras import DictCursor, execute_values
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Generator, Optional, List, Dict, Any
+from typing import Any, Callable, Dict, Generator, List, Optional, TypeVar
 import pandas as pd
 import csv
+import random
 import re
+import threading
+import time
 
 from .postgresql_config import DEFAULT_POSTGRESQL_CONFIG, PostgreSQLConfig
+from .postgresql_pool import PostgreSQLConnectionPool
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
 )
 logger = logging.getLogger(__name__)
 
+# Pools are shared by every manager pointing at the same database, so modules that
+# build their own PostgreSQLManager() still draw from one bounded set of connections.
+_pools: Dict[tuple, PostgreSQLConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+T = TypeVar("T")
+
+# Errors after which the whole transaction can simply be run again
+RETRYABLE_ERRORS = (psycopg2.errors.SerializationFailure, psycopg2.errors.DeadlockDetected)
+
 
 class PostgreSQLManager:
     """Manages PostgreSQL database operations including setup, connection, and data insertion."""
@@ -23,6 +38,45 @@ class PostgreSQLManager:
     def __init__(self, config: PostgreSQLConfig = DEFAULT_POSTGRESQL_CONFIG):
         self.config = config
 
+    @property
+    def pool(self) -> PostgreSQLConnectionPool:
+        """
+        Connection pool for this configuration, created on first use.
+
+        Returns:
+            PostgreSQLConnectionPool: Pool shared by all managers with the same connection settings.
+        """
+        key = tuple(sorted(self.config.to_dict().items()))
+        pool = _pools.get(key)
+        if pool is not None:
+            return pool
+
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = PostgreSQLConnectionPool(
+                    self.config.to_dict(),
+                    min_size=self.config.pool_min_size,
+                    max_size=self.config.pool_max_size,
+                    timeout=self.config.pool_timeout,
+                    max_uses=self.config.pool_max_uses,
+                    health_check_interval=self.config.pool_health_check_interval,
+                )
+                _pools[key] = pool
+                logger.info(
+                    f"Created connection pool for {self.config.database} "
+                    f"(min={self.config.pool_min_size}, max={self.config.pool_max_size})"
+                )
+            return pool
+
+    def close_pool(self) -> None:
+        """Close the shared connection pool for this configuration."""
+        key = tuple(sorted(self.config.to_dict().items()))
+        with _pools_lock:
+            pool = _pools.pop(key, None)
+        if pool is not None:
+            pool.closeall()
+
     def create_database(self) -> bool:
         """
         Creates database and sets up the schema.
@@ -47,29 +101,62 @@ class PostgreSQLManager:
     @contextmanager
     def get_connection(self) -> Generator[psycopg2.extensions.connection, None, None]:
         """
-        Context manager for database connections.
+        Context manager for pooled database connections.
+
+        The transaction is committed when the block exits normally and rolled back
+        on error; the connection then goes back to the pool.
 
         Yields:
             psycopg2.connection: Database connection object.
         """
-        conn = None
+        pool = self.pool
+        conn = pool.getconn()
+        broken = False
         try:
-            conn = psycopg2.connect(
-                host=self.config.host,
-                port=self.config.port,
-                database=self.config.database,
-                user=self.config.user,
-                password=self.config.password
-            )
             yield conn
             conn.commit()
         except Exception as e:
-            if conn:
+            try:
                 conn.rollback()
+            except psycopg2.Error:
+                broken = True
             raise e
         finally:
-            if conn:
-                conn.close()
+            pool.putconn(conn, discard=broken or bool(conn.closed))
+
+    def run_transaction(
+        self,
+        callback: Callable[[psycopg2.extensions.cursor], T],
+        max_retries: int = 3,
+        base_delay: float = 0.05,
+    ) -> T:
+        """
+        Run ``callback`` in a transaction, retrying it on serialization failures and deadlocks.
+
+        The callback receives a RealDictCursor and must do all of its work through it, so
+        that a retry repeats the whole transaction. Backoff is exponential with jitter.
+
+        Args:
+            callback (Callable[[cursor], T]): Transaction body.
+            max_retries (int): Retries after the first attempt.
+            base_delay (float): Delay in seconds before the first retry.
+
+        Returns:
+            T: Whatever the callback returned once the transaction committed.
+        """
+        attempt = 0
+        while True:
+            try:
+                with self.get_connection() as conn:
+                    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                        return callback(cur)
+            except RETRYABLE_ERRORS as e:
+                if attempt >= max_retries:
+                    raise
+                delay = base_delay * (2 ** attempt) * random.uniform(0.5, 1.5)
+                attempt += 1
+                logger.warning(f"Transaction conflict ({e.pgcode}), retry {attempt}/{max_retries} in {delay:.3f}s")
+                time.sleep(delay)
 
     def execute_sql_file(self, file_path: str) -> bool:
         """
@@ -307,21 +394,3 @@ class PostgreSQLManager:
         except Exception as e:
             logger.error(f"Error getting product count: {e}")
             return 0
-
-    def get_connection(self):
-        """Get database connection using the configuration."""
-        try:
-            connection = psycopg2.connect(**self.config.to_dict())
-            # Use cursor_factory instead of row_factory
-            connection.cursor_factory = psycopg2.extras.RealDictCursor
-            return connection
-        except Exception as e:
-            raise ConnectionError(f"Failed to connect to database: {str(e)}")
-
-    def __enter__(self):
-        self.connection = self.get_connection()
-        return self.connection
-
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        if hasattr(self, 'connection'):
-            self.connection.close()
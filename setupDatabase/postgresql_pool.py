@@ -0,0 +1,195 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection could be checked out before the timeout expired."""
+
+
+class PostgreSQLConnectionPool:
+    """
+    Thread-safe, bounded pool of psycopg2 connections.
+
+    Connections are created lazily up to ``max_size``; callers block for at most
+    ``timeout`` seconds when every connection is checked out. A connection that
+    sat idle longer than ``health_check_interval`` is pinged before being handed
+    out, and every connection is recycled after ``max_uses`` checkouts.
+    """
+
+    def __init__(
+        self,
+        connect_kwargs: Dict[str, Any],
+        min_size: int = 1,
+        max_size: int = 10,
+        timeout: float = 30.0,
+        max_uses: int = 1000,
+        health_check_interval: float = 30.0,
+    ):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError(f"Invalid pool bounds: min_size={min_size}, max_size={max_size}")
+
+        self._connect_kwargs = dict(connect_kwargs)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_uses = max_uses
+        self.health_check_interval = health_check_interval
+
+        self._cond = threading.Condition()
+        self._idle: List[psycopg2.extensions.connection] = []
+        self._uses: Dict[int, int] = {}
+        self._idle_since: Dict[int, float] = {}
+        self._size = 0
+        self._closed = False
+
+        for _ in range(min_size):
+            with self._cond:
+                self._size += 1
+            conn = self._connect()
+            with self._cond:
+                self._idle.append(conn)
+                self._idle_since[id(conn)] = time.monotonic()
+
+    @property
+    def size(self) -> int:
+        """Number of open connections, idle or checked out."""
+        return self._size
+
+    @property
+    def idle(self) -> int:
+        """Number of connections currently waiting in the pool."""
+        return len(self._idle)
+
+    def _connect(self) -> psycopg2.extensions.connection:
+        """Open a new connection. The caller must already hold a slot in ``_size``."""
+        try:
+            conn = psycopg2.connect(**self._connect_kwargs)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        self._uses[id(conn)] = 0
+        return conn
+
+    def _discard(self, conn: psycopg2.extensions.connection) -> None:
+        """Close a connection and free its slot."""
+        self._uses.pop(id(conn), None)
+        self._idle_since.pop(id(conn), None)
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception as e:
+            logger.warning(f"Error closing pooled connection: {e}")
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def _is_healthy(self, conn: psycopg2.extensions.connection) -> bool:
+        """Check a connection that is about to be handed out."""
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            return False
+
+        idle_for = time.monotonic() - self._idle_since.get(id(conn), 0.0)
+        if idle_for < self.health_check_interval:
+            return True
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"Pooled connection failed health check: {e}")
+            return False
+
+    def getconn(self, timeout: Optional[float] = None) -> psycopg2.extensions.connection:
+        """
+        Check a connection out of the pool.
+
+        Args:
+            timeout (Optional[float]): Seconds to wait for a free connection. Uses the pool default if None.
+
+        Returns:
+            psycopg2.connection: A healthy connection with no open transaction.
+
+        Raises:
+            PoolTimeoutError: If no connection became available in time.
+        """
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+
+        while True:
+            conn = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise psycopg2.InterfaceError("Connection pool is closed")
+                    if self._idle:
+                        conn = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeoutError(
+                            f"No database connection available within {self.timeout}s "
+                            f"(pool size {self.max_size})"
+                        )
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                return self._connect()
+
+            if self._is_healthy(conn):
+                return conn
+            self._discard(conn)
+
+    def putconn(self, conn: psycopg2.extensions.connection, discard: bool = False) -> None:
+        """
+        Return a connection to the pool.
+
+        Args:
+            conn (psycopg2.connection): Connection previously obtained from ``getconn``.
+            discard (bool): Close the connection instead of keeping it.
+        """
+        uses = self._uses.get(id(conn), 0) + 1
+
+        if discard or self._closed or conn.closed or uses >= self.max_uses:
+            self._discard(conn)
+            return
+
+        try:
+            status = conn.get_transaction_status()
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                self._discard(conn)
+                return
+            if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except Exception as e:
+            logger.warning(f"Could not reset pooled connection: {e}")
+            self._discard(conn)
+            return
+
+        with self._cond:
+            self._uses[id(conn)] = uses
+            self._idle_since[id(conn)] = time.monotonic()
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def closeall(self) -> None:
+        """Close every idle connection and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
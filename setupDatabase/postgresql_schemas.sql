@@ -1,4 +1,9 @@
 -- PostgreSQL schema for project2
+-- Destructive reset for a fresh install. Existing databases are upgraded with
+-- the numbered files in migrations/ (python -m setupDatabase.migrate); setup_postgresql
+-- applies them right after this file, so the migration record goes with the tables.
+DROP TABLE IF EXISTS schema_migrations CASCADE;
+DROP TABLE IF EXISTS stock_reservations CASCADE;
 DROP TABLE IF EXISTS orders_details CASCADE;
 DROP TABLE IF EXISTS orders CASCADE;
 DROP TABLE IF EXISTS products CASCADE;
@@ -1,5 +1,8 @@
-from postgresql_manager import PostgreSQLManager, logger
-from postgresql_config import DEFAULT_POSTGRESQL_CONFIG
+import sys
+
+from .migrate import MigrationRunner
+from .postgresql_config import DEFAULT_POSTGRESQL_CONFIG
+from .postgresql_manager import PostgreSQLManager, logger
 
 
 def main():
@@ -16,6 +19,14 @@ def main():
 
     logger.info("Database and schema created successfully")
 
+    # The tools need the tables and columns added by migrations (stock_reservations, order summaries...)
+    try:
+        result = MigrationRunner(db_manager).migrate(report=False)
+    except Exception as e:
+        logger.error(f"Failed to apply migrations: {e}")
+        return False
+    logger.info(f"Applied migrations: {result['applied'] or 'none'}")
+
     # Import data from CSV
     if db_manager.config.csv_path:
         logger.info(f"Importing data from CSV: {db_manager.config.csv_path}")
@@ -38,4 +49,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(0 if main() else 1)
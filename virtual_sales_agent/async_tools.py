@@ -0,0 +1,649 @@
+"""
+Asyncio implementations of the tools in ``virtual_sales_agent.tools``.
+
+Each coroutine mirrors its synchronous tool and is attached to it by
+``register_async_tools()``, so ``ToolNode`` awaits it when the graph is driven
+with ``ainvoke``/``astream`` instead of blocking a worker thread on psycopg2.
+"""
+import asyncio
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+import json
+import logging
+
+import httpx
+from langchain_core.runnables import RunnableConfig
+
+from setupDatabase.postgresql_async_manager import AsyncPostgreSQLManager
+from virtual_sales_agent.catalog_index import catalog_index, catalog_stats
+from virtual_sales_agent.customer_cache import customer_profiles
+from virtual_sales_agent.order_service import aread_orders, arefresh_order_summary, aupdate_order_lines, awrite_order
+from virtual_sales_agent.tools import (
+    CATEGORY_COUNTS_SQL,
+    ORDER_DETAILS_MAX_ORDERS,
+    ORDER_STATUS_SQL,
+    PRICE_STATS_SQL,
+    PRODUCT_SEARCH_MODE,
+    build_order_history_query,
+    build_product_fts_query,
+    build_product_search_fallback_query,
+    build_product_search_query,
+    cancel_order,
+    chitchat,
+    check_order_status,
+    clamp_page_size,
+    create_order,
+    delete_order,
+    format_order_details,
+    format_order_history,
+    format_order_status,
+    format_orders_details,
+    format_search_result,
+    get_customer_info,
+    get_order_details,
+    login_customer,
+    register_customer,
+    sanitize_price,
+    save_message_history,
+    search_products,
+    search_products_by_image,
+    update_customer_info,
+    update_order,
+)
+
+async_db_manager = AsyncPostgreSQLManager()
+
+
+async def achitchat(message: Optional[str] = None) -> Dict[str, str]:
+    """Async variant of chitchat; the keyword matching is CPU-only."""
+    return chitchat.func(message)
+
+
+async def asearch_products(
+    query: Optional[str] = None,
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Async variant of search_products."""
+    if query:
+        logging.info(f"Searching for query: '{query}'")
+
+    products = None
+    if PRODUCT_SEARCH_MODE == "index":
+        # The first call may load the catalog from the database; keep it off the event loop
+        products = await asyncio.to_thread(catalog_index.search, query, category, min_price, max_price, 2)
+
+    stats = catalog_stats.get()
+    if products is not None and stats is not None:
+        return format_search_result(products, stats["categories"], stats["price_stats"], query)
+
+    async with async_db_manager.get_connection() as conn:
+        async with conn.cursor() as cursor:
+            if products is None:
+                fts_query = (
+                    build_product_fts_query(query, category, min_price, max_price)
+                    if PRODUCT_SEARCH_MODE != "like"
+                    else None
+                )
+                if fts_query:
+                    try:
+                        async with conn.transaction():
+                            await cursor.execute(*fts_query)
+                            products = await cursor.fetchall() or None
+                    except Exception as e:
+                        logging.warning(f"Full-text search unavailable, using LIKE ranking: {str(e)}")
+
+            if products is None:
+                sql_query, params = build_product_search_query(query, category, min_price, max_price)
+                try:
+                    async with conn.transaction():
+                        await cursor.execute(sql_query, params)
+                        products = await cursor.fetchall()
+                except Exception as e:
+                    logging.error(f"Database error: {str(e)}")
+                    sql_query_fallback, params_fallback = build_product_search_fallback_query(
+                        query, category, min_price, max_price
+                    )
+                    logging.info(f"Using fallback query: {sql_query_fallback}")
+                    await cursor.execute(sql_query_fallback, params_fallback)
+                    products = await cursor.fetchall()
+                logging.info(f"Found {len(products)} products")
+
+            if stats is None:
+                await cursor.execute(CATEGORY_COUNTS_SQL)
+                categories = await cursor.fetchall()
+                await cursor.execute(PRICE_STATS_SQL)
+                stats = catalog_stats.put(categories, await cursor.fetchone())
+
+    return format_search_result(products, stats["categories"], stats["price_stats"], query)
+
+
+async def acreate_order(
+    products: List[Dict[str, Any]], *, config: RunnableConfig
+) -> Dict[str, str]:
+    """Async variant of create_order."""
+    configuration = config.get("configurable", {})
+    customer_id = configuration.get("customer_id", None)
+
+    logging.info(f"Creating order with customer_id: {customer_id}")
+
+    if not customer_id:
+        logging.error("Customer ID not found in configuration")
+        return {"status": "error", "message": "Không tìm thấy ID khách hàng."}
+
+    try:
+        order = await async_db_manager.run_transaction(lambda cursor: awrite_order(cursor, customer_id, products))
+    except Exception as e:
+        logging.error(f"Error creating order: {str(e)}")
+        return {
+            "status": "error",
+            "message": f"Lỗi tạo đơn hàng: {str(e)}",
+            "customer_id": str(customer_id),
+        }
+
+    catalog_index.set_stock(order["stock_levels"])
+    return {
+        "order_id": str(order["order_id"]),
+        "status": "success",
+        "message": "Đơn hàng được tạo thành công",
+        "total_amount": float(order["total_amount"]),
+        "products": order["products"],
+        "customer_id": str(customer_id),
+    }
+
+
+async def acheck_order_status(
+    order_id: Union[str, None],
+    page_size: Optional[int] = None,
+    before: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    compact: bool = True,
+    *,
+    config: RunnableConfig
+) -> Dict[str, Any]:
+    """Async variant of check_order_status."""
+    configuration = config.get("configurable", {})
+    customer_id = configuration.get("customer_id", None)
+
+    if not customer_id:
+        return {"status": "error", "message": "Không tìm thấy ID khách hàng."}
+
+    if order_id:
+        order = await async_db_manager.fetch_one(ORDER_STATUS_SQL, (order_id, customer_id))
+        if not order:
+            return {
+                "status": "error",
+                "message": "Không tìm thấy đơn hàng",
+                "customer_id": str(customer_id),
+                "order_id": str(order_id),
+            }
+
+        return format_order_status(order, customer_id)
+
+    page_size = clamp_page_size(page_size)
+    try:
+        query, params = build_order_history_query(customer_id, page_size, before, status, date_from, date_to)
+    except ValueError as e:
+        return {"status": "error", "message": str(e), "customer_id": str(customer_id)}
+
+    orders = await async_db_manager.fetch_all(query, params)
+    return format_order_history(orders, customer_id, page_size, compact)
+
+
+async def aupdate_order(
+    order_id: int, updated_products: List[Dict[str, Any]], *, config: RunnableConfig
+) -> Dict[str, Any]:
+    """Async variant of update_order."""
+    configuration = config.get("configurable", {})
+    customer_id = configuration.get("customer_id", None)
+
+    if not customer_id:
+        return {"status": "error", "message": "Không tìm thấy ID khách hàng."}
+
+    async def _update(cursor) -> Dict[str, Any]:
+        order = await aupdate_order_lines(cursor, order_id, customer_id, updated_products)
+        await cursor.execute("UPDATE orders SET order_date = %s WHERE order_id = %s", (datetime.now(), order_id))
+        return order
+
+    try:
+        order = await async_db_manager.run_transaction(_update)
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Lỗi cập nhật đơn hàng: {str(e)}",
+            "customer_id": str(customer_id),
+        }
+
+    catalog_index.set_stock(order["stock_levels"])
+    return {
+        "order_id": str(order_id),
+        "status": "success",
+        "message": "Đơn hàng được cập nhật thành công",
+        "total_amount": float(order["total_amount"]),
+        "products": order["products"],
+        "customer_id": str(customer_id),
+    }
+
+async def adelete_order(
+    order_id: str, *, config: RunnableConfig
+) -> Dict[str, Union[str, bool]]:
+    """Async variant of delete_order."""
+    configuration = config.get("configurable", {})
+    customer_id = configuration.get("customer_id", None)
+
+    if not customer_id:
+        return {"status": "error", "message": "Không tìm thấy ID khách hàng."}
+
+    stock_levels = {}
+    async with async_db_manager.get_connection() as conn:
+        try:
+            async with conn.transaction():
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        "SELECT 1 FROM orders WHERE order_id = %s AND customer_id = %s",
+                        (order_id, customer_id),
+                    )
+                    if not await cursor.fetchone():
+                        return {
+                            "status": "error",
+                            "message": "Không tìm thấy đơn hàng hoặc đơn hàng không thuộc về khách hàng này.",
+                            "order_id": order_id,
+                            "customer_id": str(customer_id),
+                        }
+
+                    await cursor.execute(
+                        "SELECT product_id, quantity FROM orders_details WHERE order_id = %s",
+                        (order_id,),
+                    )
+                    for item in await cursor.fetchall():
+                        await cursor.execute(
+                            "UPDATE products SET quantity = quantity + %s WHERE product_id = %s RETURNING quantity",
+                            (item["quantity"], item["product_id"]),
+                        )
+                        stock_levels[item["product_id"]] = (await cursor.fetchone())["quantity"]
+
+                    await cursor.execute("DELETE FROM orders_details WHERE order_id = %s", (order_id,))
+                    await cursor.execute("DELETE FROM orders WHERE order_id = %s", (order_id,))
+
+            catalog_index.set_stock(stock_levels)
+            return {
+                "status": "success",
+                "message": f"Đơn hàng {order_id} đã được xóa thành công.",
+                "order_id": order_id,
+                "customer_id": str(customer_id),
+            }
+
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": f"Lỗi xóa đơn hàng: {str(e)}",
+                "order_id": order_id,
+                "customer_id": str(customer_id),
+            }
+
+
+async def aregister_customer(
+    username: str,
+    password: str,
+    email: str,
+    phone: str,
+    address: str,
+    *,
+    config: RunnableConfig
+) -> Dict[str, Any]:
+    """Async variant of register_customer."""
+    async with async_db_manager.get_connection() as conn:
+        try:
+            async with conn.transaction():
+                async with conn.cursor() as cursor:
+                    await cursor.execute("SELECT customer_id FROM customers WHERE email = %s", (email,))
+                    if await cursor.fetchone():
+                        raise ValueError("Email already registered.")
+
+                    await cursor.execute("SELECT customer_id FROM customers WHERE phone = %s", (phone,))
+                    if await cursor.fetchone():
+                        raise ValueError("Phone number already registered.")
+
+                    await cursor.execute(
+                        """
+                        INSERT INTO customers (username, password, email, phone, address)
+                        VALUES (%s, %s, %s, %s, %s)
+                        RETURNING customer_id
+                        """,
+                        (username, password, email, phone, address),
+                    )
+                    customer_id = (await cursor.fetchone())["customer_id"]
+
+            customer_profiles.put(customer_id, {"name": username, "phone": phone, "address": address, "email": email})
+            return {
+                "status": "success",
+                "message": "Customer registered successfully.",
+                "customer_id": str(customer_id),
+            }
+
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": str(e),
+            }
+
+
+async def alogin_customer(
+    email: str,
+    password: str,
+    *,
+    config: RunnableConfig
+) -> Dict[str, Any]:
+    """Async variant of login_customer."""
+    try:
+        customer = await async_db_manager.fetch_one(
+            "SELECT customer_id, username, password FROM customers WHERE email = %s",
+            (email,),
+        )
+
+        if not customer:
+            return {"status": "error", "message": "Customer not found."}
+
+        if password != customer["password"]:
+            return {"status": "error", "message": "Incorrect password."}
+
+        return {
+            "status": "success",
+            "message": "Login successful.",
+            "customer_id": str(customer["customer_id"]),
+            "username": customer["username"]
+        }
+
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": str(e)
+        }
+
+
+async def aupdate_customer_info(
+    full_name: Optional[str] = None,
+    address: Optional[str] = None,
+    phone: Optional[str] = None,
+    *,
+    config: RunnableConfig
+) -> Dict[str, Any]:
+    """Async variant of update_customer_info."""
+    configuration = config.get("configurable", {})
+    customer_id = configuration.get("customer_id", None)
+
+    if not customer_id:
+        return {"status": "error", "message": "Customer ID not found in config."}
+
+    fields = []
+    values = []
+
+    if full_name:
+        fields.append("username = %s")
+        values.append(full_name)
+    if address:
+        fields.append("address = %s")
+        values.append(address)
+    if phone:
+        fields.append("phone = %s")
+        values.append(phone)
+
+    if not fields:
+        return {"status": "error", "message": "No information provided to update."}
+
+    values.append(customer_id)
+
+    try:
+        await async_db_manager.execute(
+            f"UPDATE customers SET {', '.join(fields)} WHERE customer_id = %s",
+            tuple(values),
+        )
+        customer_profiles.update(customer_id, {"name": full_name, "address": address, "phone": phone})
+        return {
+            "status": "success",
+            "message": "Customer information updated successfully."
+        }
+
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": str(e)
+        }
+
+
+async def acancel_order(
+    order_id: str,
+    *,
+    config: RunnableConfig
+) -> Dict[str, Any]:
+    """Async variant of cancel_order."""
+    configuration = config.get("configurable", {})
+    customer_id = configuration.get("customer_id", None)
+
+    if not customer_id:
+        return {"status": "error", "message": "No customer ID configured."}
+
+    stock_levels = {}
+    async with async_db_manager.get_connection() as conn:
+        try:
+            async with conn.transaction():
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        """
+                        SELECT order_id, status FROM orders
+                        WHERE order_id = %s AND customer_id = %s
+                        """,
+                        (order_id, customer_id),
+                    )
+                    order = await cursor.fetchone()
+
+                    if not order:
+                        raise ValueError("Order not found or does not belong to this customer.")
+
+                    if order["status"].lower() != "pending":
+                        raise ValueError(f"Only pending orders can be cancelled. Current status: {order['status']}")
+
+                    await cursor.execute(
+                        "UPDATE orders SET status = %s WHERE order_id = %s",
+                        ("Cancelled", order_id),
+                    )
+                    await arefresh_order_summary(cursor, order_id)
+
+                    await cursor.execute(
+                        "SELECT product_id, quantity FROM orders_details WHERE order_id = %s",
+                        (order_id,),
+                    )
+                    for item in await cursor.fetchall():
+                        await cursor.execute(
+                            "UPDATE products SET quantity = quantity + %s WHERE product_id = %s RETURNING quantity",
+                            (item["quantity"], item["product_id"]),
+                        )
+                        stock_levels[item["product_id"]] = (await cursor.fetchone())["quantity"]
+
+            catalog_index.set_stock(stock_levels)
+            return {
+                "status": "success",
+                "message": "Order cancelled successfully.",
+                "order_id": str(order_id),
+                "customer_id": str(customer_id),
+            }
+
+        except Exception as e:
+            return {
+                "status": "error",
+                "message": str(e),
+                "order_id": str(order_id),
+                "customer_id": str(customer_id),
+            }
+
+
+async def aget_order_details(
+    order_id: Optional[str] = None,
+    order_ids: Optional[List[str]] = None,
+    *,
+    config: RunnableConfig
+) -> Dict[str, Any]:
+    """Async variant of get_order_details."""
+    configuration = config.get("configurable", {})
+    customer_id = configuration.get("customer_id", None)
+
+    if not customer_id:
+        return {"status": "error", "message": "No customer ID configured."}
+
+    requested = list(order_ids or [])[:ORDER_DETAILS_MAX_ORDERS] or [order_id]
+    try:
+        async with async_db_manager.get_connection() as conn:
+            async with conn.cursor() as cursor:
+                orders = await aread_orders(cursor, requested, customer_id)
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": str(e),
+            "order_id": order_id,
+        }
+
+    if order_ids:
+        return format_orders_details(requested, orders, customer_id)
+    if not orders:
+        return {
+            "status": "error",
+            "message": "Order not found.",
+            "order_id": order_id,
+        }
+    return format_order_details(orders[0], customer_id)
+
+
+async def aget_customer_info(customer_id: str) -> Dict[str, Any]:
+    """Async variant of get_customer_info."""
+    cached = customer_profiles.get(customer_id)
+    if cached is not None:
+        return cached
+
+    try:
+        customer = await async_db_manager.fetch_one(
+            """
+            SELECT username as name, phone, address, email
+            FROM customers
+            WHERE customer_id = %s
+            """,
+            (customer_id,),
+        )
+
+        if not customer:
+            return {"error": "Customer not found"}
+
+        return customer_profiles.put(customer_id, customer)
+
+    except Exception as e:
+        logging.error(f"Error getting customer info: {e}")
+        return {"error": f"Failed to retrieve customer information: {str(e)}"}
+
+
+async def asave_message_history(
+    user_message: str,
+    bot_response: str,
+    tool_calls: Optional[List[Dict[str, Any]]] = None,
+    *,
+    config: RunnableConfig
+) -> Dict[str, Any]:
+    """Async variant of save_message_history; queuing never blocks, so it does not await anything."""
+    return save_message_history.func(user_message, bot_response, tool_calls, config=config)
+
+
+async def asearch_products_by_image(
+    image_path: str,
+    *,
+    config: dict = None
+) -> dict:
+    """Async variant of search_products_by_image using httpx."""
+    image_file = Path(image_path)
+    if not image_file.is_file():
+        logging.error(f"File not found: {image_path}")
+        return {"status": "error", "message": f"File not found: {image_path}", "products": []}
+    supported_formats = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+    if image_file.suffix.lower() not in supported_formats:
+        logging.warning(f"Unsupported file format: {image_path}")
+        return {"status": "error", "message": f"Unsupported file format: {image_file.suffix}", "products": []}
+
+    api_url = "https://8267-34-169-57-82.ngrok-free.app/search"
+    default_config = {
+        "timeout": 10,
+        "headers": {
+            'Accept': 'application/json; charset=utf-8',
+            'Accept-Encoding': 'utf-8'
+        }
+    }
+    if config:
+        default_config.update(config)
+
+    try:
+        async with httpx.AsyncClient(timeout=default_config["timeout"]) as client:
+            response = await client.post(
+                api_url,
+                files={'image': (image_file.name, image_file.read_bytes())},
+                headers=default_config["headers"],
+            )
+
+        if response.status_code != 200:
+            logging.error(f"API request failed with status {response.status_code}: {response.text[:500]}")
+            return {
+                "status": "error",
+                "message": f"API request failed with status {response.status_code}",
+                "products": []
+            }
+
+        raw_results = response.json()
+        processed_products: List[Dict] = []
+        for product in raw_results:
+            try:
+                processed_products.append({
+                    "product_name": str(product.get("product_name", "Sản phẩm không tên")),
+                    "category": str(product.get("category", "unknown")),
+                    "description": str(product.get("description", "")),
+                    "price": sanitize_price(product.get("price", "0")),
+                    "link_url": str(product.get("link_url", "")),
+                    "image_url": str(product.get("image_url", "")),
+                })
+            except Exception as e:
+                logging.warning(f"Error processing product {product.get('name', 'unknown')}: {str(e)}")
+
+        return {
+            "status": "success",
+            "message": f"Found {len(processed_products)} products",
+            "products": processed_products
+        }
+
+    except httpx.HTTPError as e:
+        logging.error(f"API request error: {str(e)}")
+        return {"status": "error", "message": f"API request failed: {str(e)}", "products": []}
+    except json.JSONDecodeError as e:
+        logging.error(f"JSON decode error: {str(e)}")
+        return {"status": "error", "message": "Error decoding API response", "products": []}
+
+
+ASYNC_TOOL_IMPLEMENTATIONS = [
+    (chitchat, achitchat),
+    (search_products, asearch_products),
+    (create_order, acreate_order),
+    (check_order_status, acheck_order_status),
+    (update_order, aupdate_order),
+    (delete_order, adelete_order),
+    (register_customer, aregister_customer),
+    (login_customer, alogin_customer),
+    (update_customer_info, aupdate_customer_info),
+    (cancel_order, acancel_order),
+    (get_order_details, aget_order_details),
+    (get_customer_info, aget_customer_info),
+    (save_message_history, asave_message_history),
+    (search_products_by_image, asearch_products_by_image),
+]
+
+
+def register_async_tools() -> None:
+    """Attach the coroutines above to their tools so ``tool.ainvoke`` runs them natively."""
+    for tool_obj, coroutine in ASYNC_TOOL_IMPLEMENTATIONS:
+        tool_obj.coroutine = coroutine
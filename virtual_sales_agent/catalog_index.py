@@ -0,0 +1,358 @@
+"""
+In-process inverted index over the product catalog.
+
+The catalog is small enough to keep in memory, so ``search_products`` can answer
+filters, ranking and ``LIMIT`` without a database round trip. The index is
+loaded once from ``PostgreSQLManager.get_all_products``, kept current by the
+order tools reporting new stock levels after they commit, and fully reloaded
+after ``max_age`` seconds to pick up changes made by other processes. Product
+rows are only written by the CSV import, which runs in its own process, so
+name, price and description changes arrive with that reload.
+"""
+import bisect
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from setupDatabase.postgresql_manager import PostgreSQLManager
+from virtual_sales_agent.utils import fold_diacritics
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Same relative weights Postgres gives 'A' (name) and 'B' (description) in ts_rank_cd
+NAME_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.4
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Split text into diacritic-folded, lowercase words."""
+    return TOKEN_PATTERN.findall(fold_diacritics(text or ""))
+
+
+class CatalogIndex:
+    """
+    Folded-token posting lists plus per-product category, price and stock arrays.
+
+    Every product occupies a slot; posting lists map a token to the slots whose
+    name or description contains it. A sorted vocabulary makes prefix lookups a
+    bisect. All reads and writes go through one re-entrant lock.
+    """
+
+    def __init__(self, loader: Optional[Callable[[], List[Dict[str, Any]]]] = None, max_age: float = 300.0):
+        self._loader = loader or PostgreSQLManager().get_all_products
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._loaded_at: Optional[float] = None
+        self._retry_at = 0.0
+        self._version = 0
+        self._stats: Optional[Tuple[int, Dict[str, Any]]] = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self._rows: List[Dict[str, Any]] = []
+        self._slots: Dict[int, int] = {}
+        self._folded_names: List[str] = []
+        self._folded_descriptions: List[str] = []
+        self._prices: List[float] = []
+        self._in_stock: Set[int] = set()
+        self._name_postings: Dict[str, Set[int]] = {}
+        self._description_postings: Dict[str, Set[int]] = {}
+        self._category_postings: Dict[str, Set[int]] = {}
+        self._vocabulary: List[str] = []
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    @property
+    def version(self) -> int:
+        """Counter bumped on every change, for caches derived from the catalog."""
+        return self._version
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def load(self, products: Iterable[Dict[str, Any]]) -> None:
+        """
+        Replace the index contents.
+
+        Args:
+            products (Iterable[Dict[str, Any]]): Product rows joined with their category_name.
+        """
+        with self._lock:
+            self._reset()
+            for product in products:
+                self._add(dict(product))
+            self._vocabulary = sorted(set(self._name_postings) | set(self._description_postings))
+            self._loaded_at = time.monotonic()
+            self._version += 1
+        logger.info(f"Catalog index loaded {len(self._rows)} products, {len(self._vocabulary)} tokens")
+
+    def ensure_loaded(self) -> bool:
+        """
+        Load the catalog if it is missing or older than ``max_age``.
+
+        Only one thread reloads at a time; others keep serving the current
+        contents meanwhile. After a failed load the database is not retried for
+        a few seconds.
+
+        Returns:
+            bool: True if the index has data to serve.
+        """
+        now = time.monotonic()
+        if self.loaded and now - self._loaded_at < self.max_age:
+            return True
+        if now < self._retry_at:
+            return self.loaded
+        if not self._load_lock.acquire(blocking=not self.loaded):
+            return self.loaded
+
+        try:
+            if self.loaded and time.monotonic() - self._loaded_at < self.max_age:
+                return True
+            try:
+                products = self._loader()
+            except Exception as e:
+                logger.error(f"Failed to load catalog index: {e}")
+                products = []
+            if not products:
+                # get_all_products() reports errors as an empty list
+                self._retry_at = time.monotonic() + 5.0
+                return self.loaded
+            self.load(products)
+            return True
+        finally:
+            self._load_lock.release()
+
+    def invalidate(self) -> None:
+        """Force a full reload on the next search."""
+        with self._lock:
+            self._loaded_at = None
+            self._retry_at = 0.0
+
+    def _add(self, product: Dict[str, Any]) -> None:
+        slot = len(self._rows)
+        self._rows.append(product)
+        self._slots[product["product_id"]] = slot
+        self._folded_names.append("")
+        self._folded_descriptions.append("")
+        self._prices.append(0.0)
+        self._index_slot(slot, product)
+
+    def _index_slot(self, slot: int, product: Dict[str, Any]) -> None:
+        name_tokens = tokenize(product.get("product_name"))
+        description_tokens = tokenize(product.get("description"))
+        category = (product.get("category_name") or "").lower()
+
+        self._folded_names[slot] = " ".join(name_tokens)
+        self._folded_descriptions[slot] = " ".join(description_tokens)
+        self._prices[slot] = float(product.get("price") or 0)
+        self._set_stock(slot, int(product.get("quantity") or 0))
+
+        for token in name_tokens:
+            self._name_postings.setdefault(token, set()).add(slot)
+        for token in description_tokens:
+            self._description_postings.setdefault(token, set()).add(slot)
+        self._category_postings.setdefault(category, set()).add(slot)
+
+    def _set_stock(self, slot: int, quantity: int) -> None:
+        self._rows[slot]["quantity"] = quantity
+        if quantity > 0:
+            self._in_stock.add(slot)
+        else:
+            self._in_stock.discard(slot)
+
+    def set_stock(self, quantities: Dict[int, int]) -> None:
+        """
+        Record new stock levels reported by a committed transaction.
+
+        Args:
+            quantities (Dict[int, int]): Current quantity per product_id.
+        """
+        if not quantities:
+            return
+        with self._lock:
+            for product_id, quantity in quantities.items():
+                slot = self._slots.get(int(product_id))
+                if slot is not None:
+                    self._set_stock(slot, int(quantity))
+            self._version += 1
+
+    def _prefix_postings(self, postings: Dict[str, Set[int]], prefix: str) -> Set[int]:
+        slots: Set[int] = set()
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        for token in self._vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            slots |= postings.get(token, set())
+        return slots
+
+    def _candidates(
+        self, category: Optional[str], min_price: Optional[float], max_price: Optional[float]
+    ) -> Set[int]:
+        candidates = set(self._in_stock)
+        if category:
+            candidates &= self._category_postings.get(category.lower(), set())
+        if min_price is not None and min_price > 0:
+            candidates = {slot for slot in candidates if self._prices[slot] >= min_price}
+        if max_price is not None and max_price > 0:
+            candidates = {slot for slot in candidates if self._prices[slot] <= max_price}
+        return candidates
+
+    def search(
+        self,
+        query: Optional[str] = None,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        limit: int = 2,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Search in-stock products the way the database search ranks them.
+
+        Query words are prefix-matched against name and description tokens, ranking
+        an exact name match first, then by weighted token hits. When no word matches,
+        the folded query is looked up as a substring, like the LIKE search does.
+
+        Args:
+            query (Optional[str]): Search text for product name or description.
+            category (Optional[str]): Category name filter.
+            min_price (Optional[float]): Minimum price filter.
+            max_price (Optional[float]): Maximum price filter.
+            limit (int): Maximum number of products to return.
+
+        Returns:
+            Optional[List[Dict[str, Any]]]: Product rows, or None if the index could not be loaded.
+        """
+        if not self.ensure_loaded():
+            return None
+
+        words = tokenize(query)
+        folded_query = " ".join(words)
+
+        with self._lock:
+            candidates = self._candidates(category, min_price, max_price)
+
+            if not words:
+                ranked = sorted(candidates, key=lambda slot: self._rows[slot]["product_name"])
+            else:
+                scores: Dict[int, float] = {}
+                for word in words:
+                    for slot in self._prefix_postings(self._name_postings, word) & candidates:
+                        scores[slot] = scores.get(slot, 0.0) + NAME_WEIGHT
+                    for slot in self._prefix_postings(self._description_postings, word) & candidates:
+                        scores[slot] = scores.get(slot, 0.0) + DESCRIPTION_WEIGHT
+
+                if not scores:
+                    for slot in candidates:
+                        if folded_query in self._folded_names[slot]:
+                            scores[slot] = NAME_WEIGHT
+                        elif folded_query in self._folded_descriptions[slot]:
+                            scores[slot] = DESCRIPTION_WEIGHT
+
+                ranked = sorted(
+                    scores,
+                    key=lambda slot: (
+                        self._folded_names[slot] != folded_query,
+                        -scores[slot],
+                        self._rows[slot]["product_name"],
+                    ),
+                )
+
+            return [dict(self._rows[slot]) for slot in ranked[:limit]]
+
+    def stats(self) -> Optional[Dict[str, Any]]:
+        """
+        Category counts and price range of in-stock products.
+
+        The snapshot is recomputed only when the catalog version changed.
+
+        Returns:
+            Optional[Dict[str, Any]]: "categories" and "price_stats" shaped like the aggregate
+            query rows, or None if the index is not loaded.
+        """
+        if not self.loaded:
+            return None
+
+        with self._lock:
+            if self._stats is not None and self._stats[0] == self._version:
+                return self._stats[1]
+
+            counts: Dict[str, int] = {}
+            for slot in self._in_stock:
+                name = self._rows[slot]["category_name"]
+                counts[name] = counts.get(name, 0) + 1
+            prices = [self._prices[slot] for slot in self._in_stock]
+
+            snapshot = {
+                "categories": [{"category_name": name, "count": count} for name, count in counts.items()],
+                "price_stats": {
+                    "min_price": min(prices) if prices else None,
+                    "max_price": max(prices) if prices else None,
+                    "avg_price": sum(prices) / len(prices) if prices else None,
+                },
+            }
+            self._stats = (self._version, snapshot)
+            return snapshot
+
+
+class CatalogStatsCache:
+    """
+    Search metadata (category counts, price range) without per-search aggregates.
+
+    Served from the catalog index when it is loaded. Otherwise the aggregate
+    query results are kept for ``ttl`` seconds, and dropped early as soon as an
+    order tool reports a stock change to the index.
+    """
+
+    def __init__(self, index: CatalogIndex, ttl: float = 60.0):
+        self.index = index
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._cached: Optional[Tuple[int, float, Dict[str, Any]]] = None
+
+    def get(self) -> Optional[Dict[str, Any]]:
+        """
+        Current snapshot, if one is available without querying the database.
+
+        Returns:
+            Optional[Dict[str, Any]]: "categories" and "price_stats", or None on a cache miss.
+        """
+        snapshot = self.index.stats()
+        if snapshot is not None:
+            return snapshot
+
+        with self._lock:
+            if self._cached is None:
+                return None
+            version, expires_at, snapshot = self._cached
+            if version != self.index.version or time.monotonic() >= expires_at:
+                self._cached = None
+                return None
+            return snapshot
+
+    def put(self, categories: List[Dict[str, Any]], price_stats: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Store freshly queried aggregates.
+
+        Args:
+            categories (List[Dict[str, Any]]): Rows of CATEGORY_COUNTS_SQL.
+            price_stats (Dict[str, Any]): Row of PRICE_STATS_SQL.
+
+        Returns:
+            Dict[str, Any]: The stored snapshot.
+        """
+        snapshot = {"categories": [dict(row) for row in categories], "price_stats": dict(price_stats)}
+        with self._lock:
+            self._cached = (self.index.version, time.monotonic() + self.ttl, snapshot)
+        return snapshot
+
+
+catalog_index = CatalogIndex(max_age=float(os.getenv("CATALOG_INDEX_MAX_AGE", "300")))
+catalog_stats = CatalogStatsCache(catalog_index, ttl=float(os.getenv("CATALOG_STATS_TTL", "60")))
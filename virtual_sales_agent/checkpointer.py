@@ -0,0 +1,604 @@
+"""
+Durable LangGraph checkpointer that keeps only recent history.
+
+``CompactingCheckpointSaver`` stores checkpoints and pending writes in Postgres
+(``graph_checkpoints`` / ``graph_checkpoint_writes``, migration 0009) or in a
+local SQLite file for tests and single-process development. Conversations
+survive restarts and are shared by every worker pointed at the same database.
+
+Compact: checkpoints are serialized with LangGraph's msgpack serializer and
+zlib-compressed above a size threshold, and only the newest ``keep_last``
+checkpoints of each thread are kept. Older ones and their writes are deleted in
+the transaction that stores a new one.
+
+Memory: the latest checkpoint of recently active threads is kept, still
+serialized, in a bounded LRU so resuming a conversation does not read the
+database. Threads idle for ``idle_seconds`` are evicted, so memory stays flat no
+matter how many conversations the process has seen.
+"""
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.serde.types import TASKS, ChannelProtocol
+
+from setupDatabase.postgresql_manager import PostgreSQLManager
+
+logger = logging.getLogger(__name__)
+
+# "postgres" (default), "sqlite" or "memory" (the old MemorySaver, nothing persisted)
+CHECKPOINT_BACKEND = os.getenv("CHECKPOINT_BACKEND", "postgres").lower()
+CHECKPOINT_SQLITE_PATH = os.getenv("CHECKPOINT_SQLITE_PATH", "checkpoints.sqlite")
+CHECKPOINT_KEEP_LAST = int(os.getenv("CHECKPOINT_KEEP_LAST", "20"))
+CHECKPOINT_CACHE_SIZE = int(os.getenv("CHECKPOINT_CACHE_SIZE", "256"))
+CHECKPOINT_CACHE_IDLE = float(os.getenv("CHECKPOINT_CACHE_IDLE", "1800"))
+
+# Schema shared by both backends; {blob} is BYTEA on Postgres and BLOB on SQLite
+CREATE_TABLES_SQL = (
+    """
+    CREATE TABLE IF NOT EXISTS graph_checkpoints (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        checkpoint_id TEXT NOT NULL,
+        parent_checkpoint_id TEXT,
+        type TEXT NOT NULL,
+        checkpoint {blob} NOT NULL,
+        metadata_type TEXT NOT NULL,
+        metadata {blob} NOT NULL,
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS graph_checkpoint_writes (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        checkpoint_id TEXT NOT NULL,
+        task_id TEXT NOT NULL,
+        idx INTEGER NOT NULL,
+        channel TEXT NOT NULL,
+        type TEXT NOT NULL,
+        value {blob} NOT NULL,
+        task_path TEXT NOT NULL DEFAULT '',
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+    )
+    """,
+)
+
+UPSERT_CHECKPOINT_SQL = """
+    INSERT INTO graph_checkpoints
+        (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON CONFLICT (thread_id, checkpoint_ns, checkpoint_id) DO UPDATE SET
+        type = excluded.type, checkpoint = excluded.checkpoint,
+        metadata_type = excluded.metadata_type, metadata = excluded.metadata
+"""
+
+# Checkpoint IDs are time-ordered UUIDs, so "older" is a string comparison. The cutoff is NULL,
+# and nothing is deleted, while the thread has no more than OFFSET checkpoints.
+PRUNE_CHECKPOINTS_SQL = """
+    DELETE FROM graph_checkpoints
+    WHERE thread_id = %s AND checkpoint_ns = %s AND checkpoint_id < (
+        SELECT checkpoint_id FROM graph_checkpoints
+        WHERE thread_id = %s AND checkpoint_ns = %s
+        ORDER BY checkpoint_id DESC LIMIT 1 OFFSET %s
+    )
+"""
+# Writes are kept one checkpoint further back: the oldest kept checkpoint reads its pending
+# sends from its parent's writes.
+PRUNE_WRITES_SQL = """
+    DELETE FROM graph_checkpoint_writes
+    WHERE thread_id = %s AND checkpoint_ns = %s AND checkpoint_id < (
+        SELECT checkpoint_id FROM graph_checkpoints
+        WHERE thread_id = %s AND checkpoint_ns = %s
+        ORDER BY checkpoint_id DESC LIMIT 1 OFFSET %s
+    )
+"""
+
+INSERT_WRITE_SQL = """
+    INSERT INTO graph_checkpoint_writes
+        (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+"""
+# Special channels (errors, interrupts, resumes) replace what the task wrote before;
+# ordinary writes are idempotent per (task, idx).
+UPSERT_WRITE_SQL = INSERT_WRITE_SQL + """
+    ON CONFLICT (thread_id, checkpoint_ns, checkpoint_id, task_id, idx) DO UPDATE SET
+        channel = excluded.channel, type = excluded.type, value = excluded.value
+"""
+INSERT_WRITE_IGNORE_SQL = INSERT_WRITE_SQL + """
+    ON CONFLICT (thread_id, checkpoint_ns, checkpoint_id, task_id, idx) DO NOTHING
+"""
+
+SELECT_CHECKPOINTS_SQL = """
+    SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata
+    FROM graph_checkpoints
+"""
+
+SELECT_WRITES_SQL = """
+    SELECT task_id, idx, channel, type, value
+    FROM graph_checkpoint_writes
+    WHERE thread_id = %s AND checkpoint_ns = %s AND checkpoint_id = %s
+    ORDER BY task_path, task_id, idx
+"""
+
+Blob = Tuple[str, bytes]
+ThreadKey = Tuple[str, str]
+
+
+class CompressedSerializer:
+    """Wrap a LangGraph serializer and zlib-compress payloads of at least ``min_size`` bytes."""
+
+    PREFIX = "zlib+"
+
+    def __init__(self, inner: Any = None, min_size: int = 512, level: int = 6):
+        self.inner = inner or JsonPlusSerializer()
+        self.min_size = min_size
+        self.level = level
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.inner.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return self.inner.loads(data)
+
+    def dumps_typed(self, obj: Any) -> Blob:
+        type_, data = self.inner.dumps_typed(obj)
+        if len(data) >= self.min_size:
+            return self.PREFIX + type_, zlib.compress(data, self.level)
+        return type_, data
+
+    def loads_typed(self, data: Blob) -> Any:
+        type_, payload = data
+        payload = bytes(payload)
+        if type_.startswith(self.PREFIX):
+            return self.inner.loads_typed((type_[len(self.PREFIX):], zlib.decompress(payload)))
+        return self.inner.loads_typed((type_, payload))
+
+
+@dataclass
+class _CachedThread:
+    """Latest checkpoint of a thread, still serialized, with the writes stored against it."""
+
+    checkpoint_id: str
+    parent_checkpoint_id: Optional[str]
+    checkpoint: Blob
+    metadata: Blob
+    writes: Dict[Tuple[str, int], Tuple[str, str, Blob]] = field(default_factory=dict)
+    # Serialized pending sends taken from the parent's writes; None when they must be read from the database
+    sends: Optional[List[Blob]] = None
+    last_used: float = field(default_factory=time.monotonic)
+
+
+class _PostgresBackend:
+    """Runs the checkpointer's SQL through the shared psycopg2 pool."""
+
+    blob_type = "BYTEA"
+
+    def __init__(self, db_manager: Optional[PostgreSQLManager] = None):
+        self.db_manager = db_manager or PostgreSQLManager()
+
+    @contextmanager
+    def cursor(self) -> Iterator[Any]:
+        with self.db_manager.get_connection() as conn:
+            with conn.cursor() as cur:
+                yield cur
+
+
+class _SQLiteCursor:
+    """Translate the psycopg2 ``%s`` placeholders used in this module to SQLite's ``?``."""
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> None:
+        self._cursor.execute(sql.replace("%s", "?"), params)
+
+    def executemany(self, sql: str, rows: Sequence[Sequence[Any]]) -> None:
+        self._cursor.executemany(sql.replace("%s", "?"), rows)
+
+    def fetchall(self) -> List[Tuple[Any, ...]]:
+        return self._cursor.fetchall()
+
+
+class _SQLiteBackend:
+    """Single SQLite connection shared by all threads behind a lock."""
+
+    blob_type = "BLOB"
+
+    def __init__(self, path: str):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def cursor(self) -> Iterator[_SQLiteCursor]:
+        with self._lock:
+            cur = self._conn.cursor()
+            try:
+                yield _SQLiteCursor(cur)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            finally:
+                cur.close()
+
+
+class CompactingCheckpointSaver(BaseCheckpointSaver[str]):
+    """
+    Checkpointer keeping the last ``keep_last`` checkpoints per thread in Postgres or SQLite.
+
+    Args:
+        backend: _PostgresBackend or _SQLiteBackend; see ``create_checkpointer``.
+        keep_last (int): Checkpoints kept per thread and namespace.
+        cache_size (int): Threads whose latest checkpoint is kept in memory.
+        idle_seconds (float): Threads unused for this long are evicted from memory.
+    """
+
+    def __init__(
+        self,
+        backend: Any,
+        keep_last: int = CHECKPOINT_KEEP_LAST,
+        cache_size: int = CHECKPOINT_CACHE_SIZE,
+        idle_seconds: float = CHECKPOINT_CACHE_IDLE,
+        serde: Any = None,
+    ):
+        super().__init__(serde=serde or CompressedSerializer())
+        self.backend = backend
+        self.keep_last = max(1, keep_last)
+        self.cache_size = cache_size
+        self.idle_seconds = idle_seconds
+        self._cache: "OrderedDict[ThreadKey, _CachedThread]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.setup()
+
+    def setup(self) -> None:
+        """Create the checkpoint tables if they do not exist yet."""
+        with self.backend.cursor() as cur:
+            for statement in CREATE_TABLES_SQL:
+                cur.execute(statement.format(blob=self.backend.blob_type))
+
+    # ---------- in-memory hot set ----------
+
+    def _cache_get(self, key: ThreadKey) -> Optional[_CachedThread]:
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry.last_used > self.idle_seconds:
+                del self._cache[key]
+                return None
+            entry.last_used = time.monotonic()
+            self._cache.move_to_end(key)
+            return entry
+
+    def _cache_put(self, key: ThreadKey, entry: _CachedThread) -> None:
+        with self._cache_lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        now = time.monotonic()
+        # Least recently used first, so idle threads sit at the front
+        while self._cache:
+            key, entry = next(iter(self._cache.items()))
+            if len(self._cache) > self.cache_size or now - entry.last_used > self.idle_seconds:
+                del self._cache[key]
+            else:
+                break
+
+    def evict_idle(self) -> int:
+        """Drop idle threads from memory now; returns how many are left."""
+        with self._cache_lock:
+            self._evict_locked()
+            return len(self._cache)
+
+    # ---------- reading ----------
+
+    def _load_writes(self, cur: Any, key: ThreadKey, checkpoint_id: str) -> Dict[Tuple[str, int], Tuple[str, str, Blob]]:
+        cur.execute(SELECT_WRITES_SQL, (key[0], key[1], checkpoint_id))
+        return {
+            (task_id, idx): (task_id, channel, (type_, bytes(value)))
+            for task_id, idx, channel, type_, value in cur.fetchall()
+        }
+
+    def _load_sends(self, cur: Any, key: ThreadKey, parent_checkpoint_id: Optional[str]) -> List[Blob]:
+        if not parent_checkpoint_id:
+            return []
+        writes = self._load_writes(cur, key, parent_checkpoint_id)
+        return [value for _, channel, value in writes.values() if channel == TASKS]
+
+    def _entry_from_row(self, cur: Any, row: Tuple[Any, ...]) -> Tuple[ThreadKey, _CachedThread]:
+        thread_id, checkpoint_ns, checkpoint_id, parent_id, type_, checkpoint, metadata_type, metadata = row
+        key = (thread_id, checkpoint_ns)
+        entry = _CachedThread(
+            checkpoint_id=checkpoint_id,
+            parent_checkpoint_id=parent_id,
+            checkpoint=(type_, bytes(checkpoint)),
+            metadata=(metadata_type, bytes(metadata)),
+        )
+        entry.writes = self._load_writes(cur, key, checkpoint_id)
+        entry.sends = self._load_sends(cur, key, parent_id)
+        return key, entry
+
+    def _to_tuple(self, key: ThreadKey, entry: _CachedThread, metadata: Optional[CheckpointMetadata] = None) -> CheckpointTuple:
+        thread_id, checkpoint_ns = key
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": entry.checkpoint_id,
+                }
+            },
+            checkpoint={
+                **self.serde.loads_typed(entry.checkpoint),
+                "pending_sends": [self.serde.loads_typed(send) for send in entry.sends or []],
+            },
+            metadata=metadata if metadata is not None else self.serde.loads_typed(entry.metadata),
+            parent_config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": entry.parent_checkpoint_id,
+                }
+            }
+            if entry.parent_checkpoint_id
+            else None,
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed(value))
+                for task_id, channel, value in entry.writes.values()
+            ],
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        configurable = config["configurable"]
+        key = (configurable["thread_id"], configurable.get("checkpoint_ns", ""))
+        checkpoint_id = get_checkpoint_id(config)
+
+        entry = self._cache_get(key)
+        if entry is not None and checkpoint_id in (None, entry.checkpoint_id):
+            self.cache_hits += 1
+            if entry.sends is None:
+                with self.backend.cursor() as cur:
+                    entry.sends = self._load_sends(cur, key, entry.parent_checkpoint_id)
+            return self._to_tuple(key, entry)
+        self.cache_misses += 1
+
+        query = SELECT_CHECKPOINTS_SQL + " WHERE thread_id = %s AND checkpoint_ns = %s"
+        params: List[Any] = list(key)
+        if checkpoint_id:
+            query += " AND checkpoint_id = %s"
+            params.append(checkpoint_id)
+        query += " ORDER BY checkpoint_id DESC LIMIT 1"
+
+        with self.backend.cursor() as cur:
+            cur.execute(query, params)
+            rows = cur.fetchall()
+            if not rows:
+                return None
+            key, entry = self._entry_from_row(cur, rows[0])
+
+        if checkpoint_id is None:
+            # Only the latest checkpoint is worth keeping hot
+            self._cache_put(key, entry)
+        return self._to_tuple(key, entry)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        conditions: List[str] = []
+        params: List[Any] = []
+        configurable = (config or {}).get("configurable", {})
+        if configurable.get("thread_id") is not None:
+            conditions.append("thread_id = %s")
+            params.append(configurable["thread_id"])
+        if configurable.get("checkpoint_ns") is not None:
+            conditions.append("checkpoint_ns = %s")
+            params.append(configurable["checkpoint_ns"])
+        if config and get_checkpoint_id(config):
+            conditions.append("checkpoint_id = %s")
+            params.append(get_checkpoint_id(config))
+        if before and get_checkpoint_id(before):
+            conditions.append("checkpoint_id < %s")
+            params.append(get_checkpoint_id(before))
+
+        query = SELECT_CHECKPOINTS_SQL
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY checkpoint_id DESC"
+        # The metadata filter runs after deserializing, so LIMIT can only go to SQL without one
+        if limit is not None and not filter:
+            query += " LIMIT %s"
+            params.append(limit)
+
+        # Rows are materialized before yielding so no connection is held by a paused generator
+        results: List[Tuple[ThreadKey, _CachedThread, CheckpointMetadata]] = []
+        with self.backend.cursor() as cur:
+            cur.execute(query, params)
+            for row in cur.fetchall():
+                metadata = self.serde.loads_typed((row[6], bytes(row[7])))
+                if filter and not all(metadata.get(k) == v for k, v in filter.items()):
+                    continue
+                key, entry = self._entry_from_row(cur, row)
+                results.append((key, entry, metadata))
+                if limit is not None and len(results) >= limit:
+                    break
+
+        for key, entry, metadata in results:
+            yield self._to_tuple(key, entry, metadata)
+
+    # ---------- writing ----------
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        configurable = config["configurable"]
+        key = (configurable["thread_id"], configurable.get("checkpoint_ns", ""))
+        parent_id = configurable.get("checkpoint_id")
+
+        # Pending sends are rebuilt from the parent's writes on read, like MemorySaver does
+        stored = {k: v for k, v in checkpoint.items() if k != "pending_sends"}
+        entry = _CachedThread(
+            checkpoint_id=checkpoint["id"],
+            parent_checkpoint_id=parent_id,
+            checkpoint=self.serde.dumps_typed(stored),
+            metadata=self.serde.dumps_typed(metadata),
+        )
+
+        with self.backend.cursor() as cur:
+            cur.execute(
+                UPSERT_CHECKPOINT_SQL,
+                (*key, entry.checkpoint_id, parent_id, *entry.checkpoint, *entry.metadata),
+            )
+            # Writes first: their cutoff is the checkpoint that is about to be pruned
+            cur.execute(PRUNE_WRITES_SQL, (*key, *key, self.keep_last))
+            cur.execute(PRUNE_CHECKPOINTS_SQL, (*key, *key, self.keep_last - 1))
+
+        previous = self._cache_get(key)
+        if previous is not None and previous.checkpoint_id == parent_id:
+            entry.sends = [value for _, channel, value in previous.writes.values() if channel == TASKS]
+        elif not parent_id:
+            entry.sends = []
+        self._cache_put(key, entry)
+
+        return {
+            "configurable": {
+                "thread_id": key[0],
+                "checkpoint_ns": key[1],
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        configurable = config["configurable"]
+        key = (configurable["thread_id"], configurable.get("checkpoint_ns", ""))
+        checkpoint_id = configurable["checkpoint_id"]
+
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            rows.append((task_id, WRITES_IDX_MAP.get(channel, idx), channel, self.serde.dumps_typed(value)))
+        if not rows:
+            return
+
+        sql = UPSERT_WRITE_SQL if all(channel in WRITES_IDX_MAP for channel, _ in writes) else INSERT_WRITE_IGNORE_SQL
+        with self.backend.cursor() as cur:
+            cur.executemany(
+                sql,
+                [(*key, checkpoint_id, task, idx, channel, *value, task_path) for task, idx, channel, value in rows],
+            )
+
+        entry = self._cache_get(key)
+        if entry is not None and entry.checkpoint_id == checkpoint_id:
+            with self._cache_lock:
+                for task, idx, channel, value in rows:
+                    if idx >= 0 and (task, idx) in entry.writes:
+                        continue
+                    entry.writes[(task, idx)] = (task, channel, value)
+
+    def get_next_version(self, current: Optional[str], channel: ChannelProtocol) -> str:
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # ---------- async: the backends are synchronous, so run them off the event loop ----------
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+
+def create_checkpointer(backend: str = CHECKPOINT_BACKEND) -> BaseCheckpointSaver:
+    """
+    Checkpointer selected by CHECKPOINT_BACKEND.
+
+    Falls back to MemorySaver, with an error in the log, when the database cannot be used,
+    so the assistant still runs without persisted conversations.
+
+    Args:
+        backend (str): "postgres", "sqlite" or "memory".
+
+    Returns:
+        BaseCheckpointSaver: The checkpointer to compile the graph with.
+    """
+    if backend == "memory":
+        return MemorySaver()
+    try:
+        if backend == "sqlite":
+            return CompactingCheckpointSaver(_SQLiteBackend(CHECKPOINT_SQLITE_PATH))
+        return CompactingCheckpointSaver(_PostgresBackend())
+    except Exception as e:
+        logger.error(f"Cannot use the {backend} checkpointer, conversations will not be persisted: {e}")
+        return MemorySaver()
@@ -0,0 +1,208 @@
+"""
+Token-budgeted message window with a rolling summary of older turns.
+
+``State.messages`` would otherwise grow for the whole session and be sent to
+the LLM on every step. The ``context_window`` node runs before the assistant on
+each turn and does three things:
+
+- Keeps the last turns verbatim, at most ``keep_turns`` of them within
+  ``max_tokens``. A turn is a HumanMessage plus everything that answered it. The
+  current turn is always kept.
+- Folds the older turns into ``State.summary`` with one LLM call that extends
+  the previous summary, then removes them from the checkpoint with RemoveMessage.
+- Shortens the ToolMessages of earlier turns that are still kept. The assistant
+  has already answered from them. Each call keeps a ToolMessage, so the
+  history stays valid for the provider.
+
+Token counts are estimated from text length; a small overshoot only means one
+more turn gets folded a little later.
+"""
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, RemoveMessage, ToolMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import Runnable
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "6000"))
+CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "6"))
+
+# Vietnamese text averages about three characters per token with the OpenAI tokenizers
+CHARS_PER_TOKEN = 3
+
+# What a consumed tool result is shortened to; the first characters keep ids and names visible
+CONSUMED_TOOL_RESULT_CHARS = 200
+SHORTENED_MARKER = " …(đã rút gọn, trợ lý đã trả lời dựa trên kết quả này)"
+
+summary_prompt = ChatPromptTemplate.from_messages(
+    [
+        (
+            "system",
+            """Bạn tóm tắt cuộc trò chuyện giữa khách hàng và trợ lý bán hàng để trợ lý tiếp tục phục vụ.
+Giữ lại: sản phẩm khách quan tâm (tên, mã, giá), đơn hàng đã nhắc đến (mã, trạng thái), thông tin khách đã cung cấp, yêu cầu còn dang dở.
+Bỏ qua lời chào và nội dung lặp lại. Viết tiếng Việt, tối đa 150 từ, dạng gạch đầu dòng.""",
+        ),
+        (
+            "human",
+            "Tóm tắt hiện có:\n{summary}\n\nCác tin nhắn mới cần gộp vào tóm tắt:\n{transcript}\n\nViết lại tóm tắt đầy đủ:",
+        ),
+    ]
+)
+
+
+def estimate_tokens(message: AnyMessage) -> int:
+    """Rough token count of a message, tool calls included."""
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content, ensure_ascii=False)
+    size = len(content)
+    if isinstance(message, AIMessage) and message.tool_calls:
+        size += len(json.dumps(message.tool_calls, ensure_ascii=False, default=str))
+    # A few tokens of per-message overhead (role, separators)
+    return size // CHARS_PER_TOKEN + 4
+
+
+def split_turns(messages: Sequence[AnyMessage]) -> List[List[AnyMessage]]:
+    """Group messages into turns, each starting at a HumanMessage; anything before the first one is its own group."""
+    turns: List[List[AnyMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+def plan_window(
+    messages: Sequence[AnyMessage],
+    max_tokens: int = CONTEXT_MAX_TOKENS,
+    keep_turns: int = CONTEXT_KEEP_TURNS,
+) -> Tuple[List[AnyMessage], List[List[AnyMessage]]]:
+    """
+    Decide which messages leave the window.
+
+    Nothing is folded until the window holds more than ``keep_turns`` turns or more than
+    ``max_tokens``; then it shrinks to half of both. Summaries are written every few
+    turns instead of on each one, and the message prefix stays stable in between.
+
+    Returns:
+        Tuple[List[AnyMessage], List[List[AnyMessage]]]: Messages to fold into the summary,
+        and the turns that stay, oldest first.
+    """
+    turns = split_turns(messages)
+    total = sum(estimate_tokens(message) for message in messages)
+    if len(turns) <= keep_turns and total <= max_tokens:
+        return [], turns
+
+    kept: List[List[AnyMessage]] = []
+    budget = max_tokens // 2
+    keep_turns = max(1, keep_turns // 2)
+    for turn in reversed(turns):
+        cost = sum(estimate_tokens(message) for message in turn)
+        # The current turn stays whatever it costs
+        if kept and (len(kept) >= keep_turns or cost > budget):
+            break
+        kept.append(turn)
+        budget -= cost
+    kept.reverse()
+    folded = [message for turn in turns[: len(turns) - len(kept)] for message in turn]
+    return folded, kept
+
+
+def shorten_consumed_tool_results(turns: Sequence[Sequence[AnyMessage]]) -> List[ToolMessage]:
+    """Shortened copies, same ids, of the long ToolMessages in every turn but the last."""
+    shortened = []
+    for turn in turns[:-1]:
+        for message in turn:
+            if not isinstance(message, ToolMessage) or not isinstance(message.content, str):
+                continue
+            if len(message.content) <= CONSUMED_TOOL_RESULT_CHARS or message.content.endswith(SHORTENED_MARKER):
+                continue
+            shortened.append(
+                ToolMessage(
+                    id=message.id,
+                    tool_call_id=message.tool_call_id,
+                    name=message.name,
+                    content=message.content[:CONSUMED_TOOL_RESULT_CHARS] + SHORTENED_MARKER,
+                    # The full result stays available to the UI
+                    artifact=message.artifact,
+                )
+            )
+    return shortened
+
+
+def transcript(messages: Sequence[AnyMessage]) -> str:
+    """Plain-text rendering of folded messages for the summarizer."""
+    lines = []
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            lines.append(f"Khách: {message.content}")
+        elif isinstance(message, AIMessage):
+            if message.content:
+                lines.append(f"Trợ lý: {message.content}")
+            for tool_call in message.tool_calls:
+                lines.append(f"Trợ lý gọi {tool_call['name']}({json.dumps(tool_call['args'], ensure_ascii=False, default=str)})")
+        elif isinstance(message, ToolMessage):
+            lines.append(f"Kết quả {message.name or 'tool'}: {str(message.content)[:CONSUMED_TOOL_RESULT_CHARS]}")
+    return "\n".join(lines)
+
+
+class ContextWindow:
+    """
+    Graph node keeping ``messages`` within budget and ``summary`` up to date.
+
+    Args:
+        llm: Chat model used to extend the summary.
+        max_tokens (int): Estimated token budget for the messages sent to the assistant.
+        keep_turns (int): Most recent turns kept verbatim.
+    """
+
+    def __init__(self, llm: Runnable, max_tokens: int = CONTEXT_MAX_TOKENS, keep_turns: int = CONTEXT_KEEP_TURNS):
+        self.summarizer = summary_prompt | llm
+        self.max_tokens = max_tokens
+        self.keep_turns = max(1, keep_turns)
+
+    def _update(self, state: Dict[str, Any], summary: Optional[str]) -> Dict[str, Any]:
+        messages = state.get("messages", [])
+        folded, kept = plan_window(messages, self.max_tokens, self.keep_turns)
+        update: Dict[str, Any] = {}
+        if folded and summary is not None:
+            update["summary"] = summary
+            update["messages"] = [RemoveMessage(id=message.id) for message in folded]
+            logger.info(
+                f"Context window: folded {len(folded)} messages into the summary, "
+                f"{sum(len(turn) for turn in kept)} kept"
+            )
+        shortened = shorten_consumed_tool_results(kept)
+        if shortened:
+            update["messages"] = update.get("messages", []) + shortened
+        return update
+
+    def _summary_input(self, state: Dict[str, Any]) -> Optional[Dict[str, str]]:
+        folded, _ = plan_window(state.get("messages", []), self.max_tokens, self.keep_turns)
+        if not folded:
+            return None
+        return {"summary": state.get("summary") or "(chưa có)", "transcript": transcript(folded)}
+
+    def __call__(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        summary_input = self._summary_input(state)
+        summary = None
+        if summary_input is not None:
+            try:
+                summary = self.summarizer.invoke(summary_input).content
+            except Exception as e:
+                # Keep every message rather than lose the folded turns without a summary
+                logger.error(f"Error summarizing conversation: {e}")
+        return self._update(state, summary)
+
+    async def acall(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        summary_input = self._summary_input(state)
+        summary = None
+        if summary_input is not None:
+            try:
+                summary = (await self.summarizer.ainvoke(summary_input)).content
+            except Exception as e:
+                logger.error(f"Error summarizing conversation: {e}")
+        return self._update(state, summary)
@@ -0,0 +1,77 @@
+"""
+Per-process cache of customer profiles (name, phone, address, email).
+
+The Streamlit order screens call ``get_customer_info`` on every rerun, so the
+tool reads through this cache and an order flow queries ``customers`` once.
+``update_customer_info`` and ``register_customer`` write through after they
+commit, so a profile changed by this process is never served stale; changes
+made by other processes show up after ``ttl`` seconds.
+"""
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from cachetools import TTLCache
+
+PROFILE_FIELDS = ("name", "phone", "address", "email")
+
+
+class CustomerProfileCache:
+    """Bounded TTL cache of customer profiles keyed by customer_id."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0):
+        self._profiles: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        # TTLCache is not thread-safe and the async tools share it with Streamlit threads
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, customer_id: Any) -> Optional[Dict[str, Any]]:
+        """
+        Cached profile of a customer.
+
+        Returns:
+            Optional[Dict[str, Any]]: A copy of the profile, or None on a cache miss.
+        """
+        with self._lock:
+            profile = self._profiles.get(str(customer_id))
+            if profile is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(profile)
+
+    def put(self, customer_id: Any, profile: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Store a profile read from or just written to the database.
+
+        Returns:
+            Dict[str, Any]: The stored profile.
+        """
+        profile = {field: profile.get(field) for field in PROFILE_FIELDS}
+        with self._lock:
+            self._profiles[str(customer_id)] = profile
+        return dict(profile)
+
+    def update(self, customer_id: Any, changes: Dict[str, Any]) -> None:
+        """Apply committed changes to a cached profile; an uncached profile is left to the next read."""
+        changes = {field: value for field, value in changes.items() if field in PROFILE_FIELDS and value is not None}
+        with self._lock:
+            profile = self._profiles.get(str(customer_id))
+            if profile is not None:
+                # Re-inserting restarts the TTL, which is right: the profile was just confirmed
+                self._profiles[str(customer_id)] = {**profile, **changes}
+
+    def invalidate(self, customer_id: Any) -> None:
+        with self._lock:
+            self._profiles.pop(str(customer_id), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._profiles.clear()
+
+
+customer_profiles = CustomerProfileCache(
+    maxsize=int(os.getenv("CUSTOMER_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("CUSTOMER_CACHE_TTL", "300")),
+)
@@ -2,13 +2,16 @@ import os
 from datetime import datetime
 from typing import Annotated
 import json
+import logging
+import threading
+import uuid
 
 from dotenv import load_dotenv
 from google.cloud import aiplatform
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import Runnable, RunnableConfig
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
 from langchain_google_vertexai import ChatVertexAI
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, START, StateGraph
 from langgraph.graph.message import AnyMessage, add_messages
 from langgraph.prebuilt import tools_condition
@@ -17,6 +20,7 @@ from langchain_together import ChatTogether
 from langchain_openai import ChatOpenAI
 
 from virtual_sales_agent.tools import (
+    PRODUCT_SEARCH_MODE,
     check_order_status,
     create_order,
     # get_available_categories,
@@ -28,15 +32,36 @@ from virtual_sales_agent.tools import (
     register_customer,
     login_customer,
     update_customer_info,
-    save_message_history,
     chitchat,
     get_customer_info,  # Add this new tool to get customer information
     search_products_by_image
 )
+from virtual_sales_agent.async_tools import register_async_tools
+from virtual_sales_agent.catalog_index import catalog_index
+from virtual_sales_agent.checkpointer import create_checkpointer
+from virtual_sales_agent.context_window import ContextWindow
+from virtual_sales_agent.history_writer import history_writer
+from virtual_sales_agent.intent_router import intent_router
+from virtual_sales_agent.reservations import hold_stock, reservation_sweeper
+from virtual_sales_agent.response_cache import response_cache
+from virtual_sales_agent.tool_projection import dumps, project_tool_message
 from virtual_sales_agent.utils import create_tool_node_with_fallback
 
 load_dotenv()
 
+# Let ToolNode await native coroutines when the graph is driven with ainvoke/astream
+register_async_tools()
+
+# Load the catalog index in the background so the first search does not pay for it
+if PRODUCT_SEARCH_MODE == "index":
+    threading.Thread(target=catalog_index.ensure_loaded, name="catalog-index-load", daemon=True).start()
+
+# Give back stock held for orders that were never confirmed
+reservation_sweeper.start()
+
+# Conversation history is written in batches off the request path
+history_writer.start()
+
 os.environ["LANGCHAIN_API_KEY"] = os.getenv("LANGCHAIN_API_KEY")
 os.environ["LANGCHAIN_TRACING_V2"] = os.getenv("LANGCHAIN_TRACING_V2")
 os.environ["LANGCHAIN_ENDPOINT"] = os.getenv("LANGCHAIN_ENDPOINT")
@@ -49,95 +74,140 @@ class State(TypedDict):
     messages: Annotated[list[AnyMessage], add_messages]
     user_info: str
     verified_product: dict  # Để lưu thông tin sản phẩm đã được xác minh
+    summary: str  # Tóm tắt các lượt cũ đã bị đưa ra khỏi cửa sổ tin nhắn
 
 
 class Assistant:
     def __init__(self, runnable: Runnable):
         self.runnable = runnable
+        self.input_tokens = 0
+        self.cached_input_tokens = 0
+
+    def _log_prompt_cache(self, result) -> None:
+        """Log how much of this call's prompt the provider served from its prefix cache."""
+        usage = getattr(result, "usage_metadata", None)
+        if not usage:
+            return
+        input_tokens = usage.get("input_tokens", 0)
+        cached = (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+        self.input_tokens += input_tokens
+        self.cached_input_tokens += cached
+        logging.info(
+            f"LLM input tokens: {input_tokens} ({cached} cached, {input_tokens - cached} uncached); "
+            f"process total {self.cached_input_tokens}/{self.input_tokens} cached"
+        )
+
+    def _with_context(self, state: State, config: RunnableConfig) -> dict:
+        configuration = config.get("configurable", {})
+        customer_id = configuration.get("customer_id", None)
+
+        # Các lượt gần đây đã có nguyên văn trong messages; phần cũ hơn chỉ còn bản tóm tắt
+        summary = state.get("summary")
+        return {
+            **state, 
+            "user_info": customer_id,
+            "conversation_summary": f"Tóm tắt phần trước của cuộc trò chuyện:\n{summary}\n\n" if summary else "",
+        }
+
+    def _history_payload(self, state: State, result, config: RunnableConfig):
+        """Build the history_writer.enqueue arguments for this turn, or None when nothing should be saved."""
+        configuration = config.get("configurable", {})
+        customer_id = configuration.get("customer_id", None)
+        if not customer_id or customer_id == "123456789":
+            return None
+
+        # Lấy tin nhắn cuối cùng của user
+        last_user_message = ""
+        for msg in reversed(state["messages"]):
+            if hasattr(msg, 'type') and msg.type == "human":
+                last_user_message = msg.content
+                break
+
+        if not last_user_message:
+            return None
+
+        # Thu thập tool calls nếu có
+        tool_calls = None
+        if hasattr(result, 'tool_calls') and result.tool_calls:
+            tool_calls = [
+                {
+                    "name": tool_call.get("name", ""),
+                    "args": json.dumps(tool_call.get("args", {})) if isinstance(tool_call.get("args"), dict) else tool_call.get("args", "{}"),
+                    "id": tool_call.get("id", "")
+                }
+                for tool_call in result.tool_calls
+            ]
+
+        return {
+            "user_message": last_user_message,
+            "bot_response": result.content or "Tool call executed",
+            "tool_calls": tool_calls,
+            "customer_id": customer_id
+        }
+
+    @staticmethod
+    def _is_empty(result) -> bool:
+        return not result.tool_calls and (
+            not result.content
+            or isinstance(result.content, list)
+            and not result.content[0].get("text")
+        )
+
+    @staticmethod
+    def _remember(state: State, result) -> None:
+        """Offer a final answer to the response cache; it keeps only customer-independent turns."""
+        try:
+            response_cache.remember_turn(state["messages"], result, state.get("verified_product"))
+        except Exception as e:
+            logging.error(f"Error caching response: {str(e)}")
 
     def __call__(self, state: State, config: RunnableConfig):
         while True:
-            configuration = config.get("configurable", {})
-            customer_id = configuration.get("customer_id", None)
-
-            # Lấy 5 đoạn hội thoại gần nhất từ state["messages"]
-            conversation_history = ""
-            messages = state.get("messages", [])
-            if messages:
-                # Lấy 5 cặp user-bot gần nhất (nếu có)
-                history_parts = []
-                count = 0
-                for msg in reversed(messages):
-                    if hasattr(msg, 'type') and msg.type == "human":
-                        history_parts.append(f"User: {msg.content}")
-                        count += 1
-                    elif hasattr(msg, 'type') and msg.type == "ai":
-                        history_parts.append(f"Bot: {msg.content}")
-                    if count >= 5:
-                        break
-                conversation_history = "\n".join(reversed(history_parts))
-
-            state_with_context = {
-                **state, 
-                "user_info": customer_id,
-                "conversation_history": conversation_history
-            }
-
-            result = self.runnable.invoke(state_with_context)
+            result = self.runnable.invoke(self._with_context(state, config))
+            self._log_prompt_cache(result)
 
             # Lưu tin nhắn vào database sau khi có phản hồi (bao gồm tool calls)
-            if customer_id and customer_id != "123456789":
-                try:
-                    # Lấy tin nhắn cuối cùng của user
-                    last_user_message = ""
-                    for msg in reversed(state["messages"]):
-                        if hasattr(msg, 'type') and msg.type == "human":
-                            last_user_message = msg.content
-                            break
-
-                    if last_user_message:
-                        # Thu thập tool calls nếu có
-                        tool_calls = None
-                        if hasattr(result, 'tool_calls') and result.tool_calls:
-                            tool_calls = [
-                                {
-                                    "name": tool_call.get("name", ""),
-                                    "args": json.dumps(tool_call.get("args", {})) if isinstance(tool_call.get("args"), dict) else tool_call.get("args", "{}"),
-                                    "id": tool_call.get("id", "")
-                                }
-                                for tool_call in result.tool_calls
-                            ]
-
-                        # Add better error handling for save_message_history
-                        try:
-                            save_message_history.invoke({
-                                "user_message": last_user_message,
-                                "bot_response": result.content or "Tool call executed",
-                                "tool_calls": tool_calls,
-                                "customer_id": customer_id  # Explicitly pass customer_id
-                            }, config)
-                        except Exception as e:
-                            import logging
-                            logging.error(f"Error saving conversation history: {str(e)}")
-                except Exception as e:
-                    import logging
-                    logging.error(f"Error preparing message history: {str(e)}")
+            try:
+                payload = self._history_payload(state, result, config)
+                if payload:
+                    history_writer.enqueue(**payload)
+            except Exception as e:
+                logging.error(f"Error saving conversation history: {str(e)}")
 
             # If the LLM happens to return an empty response, we will re-prompt it
             # for an actual response.
-            if not result.tool_calls and (
-                not result.content
-                or isinstance(result.content, list)
-                and not result.content[0].get("text")
-            ):
+            if self._is_empty(result):
+                messages = state["messages"] + [("user", "Respond with a real output.")]
+                state = {**state, "messages": messages}
+            else:
+                break
+        self._remember(state, result)
+        return {"messages": result}
+
+    async def acall(self, state: State, config: RunnableConfig):
+        """Async counterpart of ``__call__`` used when the graph runs with ainvoke/astream."""
+        while True:
+            result = await self.runnable.ainvoke(self._with_context(state, config))
+            self._log_prompt_cache(result)
+
+            try:
+                payload = self._history_payload(state, result, config)
+                if payload:
+                    history_writer.enqueue(**payload)
+            except Exception as e:
+                logging.error(f"Error saving conversation history: {str(e)}")
+
+            if self._is_empty(result):
                 messages = state["messages"] + [("user", "Respond with a real output.")]
                 state = {**state, "messages": messages}
             else:
                 break
+        self._remember(state, result)
         return {"messages": result}
 
 
-llm = ChatOpenAI(model="gpt-4o-mini")
+# stream_usage keeps token usage on replies that are streamed to the UI
+llm = ChatOpenAI(model="gpt-4o-mini", stream_usage=True)
 
 assistant_prompt = ChatPromptTemplate.from_messages(
     [
@@ -157,9 +227,8 @@ Khi tìm kiếm sản phẩm:
 - Hãy hiểu rõ nhu cầu và sở thích của khách hàng
 - Nếu người dùng chỉ hỏi sản phẩm(query) mà không cung cấp thêm thông tin gì về thể loại thì bạn hãy tự chọn category_name. category_name chỉ bao gồm 4 loại: thoi-trang, do-dung-nha-cua, games-toys, phu-kien.
 - Sử dụng tính linh hoạt về danh mục và khoảng giá để tìm các lựa chọn phù hợp nếu khách hàng cung cấp thông tin này
-- Cung cấp thông tin sản phẩm chi tiết bao gồm tên sản phẩm, giá cả, mô tả ngắn gọn, link sản phẩm và link ảnh sản phẩm dưới dạng markdown, mỗi dữ liệu là 1 dòng.
-- Khi trả về sản phẩm, nếu có trường 'image_url', hãy hiển thị hình ảnh sản phẩm cho người dùng bằng cú pháp markdown: ![Tên sản phẩm](image_url)
-- Trả lời chính xác những gì mà hệ thống trả về bao gồm tên sản phẩm, giá, link sản phẩm, link ảnh. Không được bịa đặt thông tin sản phẩm.
+- Giao diện tự hiển thị thẻ sản phẩm (tên, giá, hình ảnh, link) ngay dưới câu trả lời của bạn. Chỉ viết 1-2 câu ngắn giới thiệu kết quả, ví dụ số sản phẩm tìm được hoặc điểm nổi bật; không liệt kê lại tên, giá, link hay chèn ảnh markdown.
+- Không được bịa đặt thông tin sản phẩm; chỉ dựa vào những gì hệ thống trả về.
 - Nếu sản phẩm không có sẵn thì trả lời rằng sản phẩm này cửa hàng không có sẵn.
 
 Khi đưa ra đề xuất:
@@ -188,22 +257,20 @@ Khi xử lý đơn hàng:
 
 Nếu bạn không thể tìm thấy chính xác những gì khách hàng đang tìm kiếm, hãy khám phá các lựa chọn thay thế và đưa ra những gợi ý hữu ích trước khi kết luận rằng một mặt hàng không có sẵn.
 
-Hãy trả lời bằng tiếng Việt một cách tự nhiên và thân thiện. Sử dụng các cụm từ lịch sự như "xin chào", "cảm ơn", "xin lỗi" khi phù hợp.
-
-{conversation_history_text}
-
-\n\nKhách hàng hiện tại:\n<User>\n{user_info}\n</User>
-\nThời gian hiện tại: {time}.""",
+Hãy trả lời bằng tiếng Việt một cách tự nhiên và thân thiện. Sử dụng các cụm từ lịch sự như "xin chào", "cảm ơn", "xin lỗi" khi phù hợp.""",
         ),
         ("placeholder", "{messages}"),
+        # Per-turn values go after the conversation so the instructions above, together with the
+        # tool schemas, are a byte-identical prefix on every call and hit the provider's prompt cache
+        (
+            "system",
+            """{conversation_summary}Khách hàng hiện tại:\n<User>\n{user_info}\n</User>
+\nThời gian hiện tại: {time}.""",
+        ),
     ]
 ).partial(
-    time=datetime.now,
-    conversation_history_text=lambda **kwargs: (
-        f"\n\nLịch sử 3 cuộc trò chuyện gần nhất (bao gồm tools đã sử dụng):\n{kwargs.get('conversation_history', '')}\n" 
-        if kwargs.get('conversation_history') 
-        else ""
-    )
+    # Rounded to the hour: the model only needs the date and time of day
+    time=lambda: datetime.now().strftime("%Y-%m-%d %H:00"),
 )
 
 # "Read"-only tools
@@ -233,6 +300,13 @@ assistant_runnable = assistant_prompt | llm.bind_tools(safe_tools + sensitive_to
 builder = StateGraph(State)
 
 
+def _requested_item(args: dict) -> tuple:
+    """Product name and quantity of the first item of a create_order call."""
+    items = args.get("products") or [args]
+    first = items[0] if items and isinstance(items[0], dict) else {}
+    return first.get("product_name", ""), first.get("quantity", 1)
+
+
 class OrderPreparation:
     def __init__(self, runnable: Runnable):
         self.runnable = runnable
@@ -253,8 +327,7 @@ class OrderPreparation:
                         # Đây là lệnh tạo đơn hàng
                         try:
                             args = json.loads(tool_call.get("args", "{}")) if isinstance(tool_call.get("args"), str) else tool_call.get("args", {})
-                            product_name = args.get("product_name", "")
-                            quantity = args.get("quantity", 1)
+                            product_name, quantity = _requested_item(args)
                             
                             logging.info(f"Processing create_order with args: {args}")
                             
@@ -266,6 +339,25 @@ class OrderPreparation:
                                     # Đã tìm thấy sản phẩm, cập nhật state với thông tin sản phẩm
                                     product = search_result["products"][0]
                                     logging.info(f"Found product: {product}")
+
+                                    # Giữ hàng trong lúc chờ khách xác nhận để phiên khác không lấy mất
+                                    hold_note = ""
+                                    if customer_id and customer_id != "123456789":
+                                        try:
+                                            reservation = hold_stock(customer_id, product["product_id"], quantity)
+                                            product = {
+                                                **product,
+                                                "reservation_id": reservation["reservation_id"],
+                                                "reserved_quantity": reservation["quantity"],
+                                                "reserved_until": reservation["expires_at"].isoformat(),
+                                            }
+                                            hold_note = f"\n⏳ Đã giữ {reservation['quantity']} sản phẩm cho bạn đến {reservation['expires_at']:%H:%M}.\n"
+                                        except ValueError as e:
+                                            return {
+                                                "messages": [{"type": "ai", "content": f"❌ **{product.get('name')}**: {str(e)} (còn {product.get('stock')} sản phẩm)."}]
+                                            }
+                                        except Exception as e:
+                                            logging.warning(f"Could not hold stock for {product.get('product_id')}: {str(e)}")
                                     
                                     # Tạo tin nhắn xác nhận với người dùng - UI thân thiện hơn
                                     confirmation_message = f"""
@@ -274,7 +366,7 @@ class OrderPreparation:
 • **Tên:** {product.get('name')}
 • **Giá:** {product.get('price'):,.0f}đ
 • **Mô tả:** {product.get('description', 'Không có mô tả')}
-
+{hold_note}
 Đây có phải là sản phẩm bạn muốn đặt không? 
 
 Nếu đúng, vui lòng cho tôi biết số lượng bạn muốn đặt (hoặc điều chỉnh số lượng nếu cần).
@@ -308,7 +400,8 @@ Bạn có thể:
                                 logging.info(f"Creating order with verified_product: {verified_product}")
                                 
                                 # Kiểm tra xem có product_id không - đây là phần quan trọng để khắc phục lỗi
-                                if "id" not in verified_product:
+                                product_id = verified_product.get("product_id") or verified_product.get("id")
+                                if not product_id:
                                     error_message = f"""
 ❌ **Không thể tạo đơn hàng**
 
@@ -323,8 +416,8 @@ Vui lòng thử lại sau hoặc liên hệ hỗ trợ.
                                 
                                 # Tạo args mới với product_id thay vì product_name
                                 new_args = {
-                                    "product_id": verified_product["id"],  # Use product ID explicitly
-                                    "quantity": args.get("quantity", 1),
+                                    "product_id": product_id,  # Use product ID explicitly
+                                    "quantity": quantity,
                                     "customer_id": customer_id if customer_id and customer_id != "123456789" else None
                                 }
                                 
@@ -350,8 +443,8 @@ Vui lòng đăng nhập để tiếp tục.
                                     order_data = {
                                         "products": [
                                             {
-                                                "product_id": str(verified_product["id"]),  # Ensure it's a string
-                                                "quantity": args.get("quantity", 1)
+                                                "product_id": str(product_id),  # Ensure it's a string
+                                                "quantity": quantity
                                             }
                                         ]
                                     }
@@ -378,8 +471,8 @@ Vui lòng thử lại sau hoặc liên hệ hỗ trợ.
 Đơn hàng của bạn đã được tạo:
 • Mã đơn hàng: {result.get("order_id")}
 • Sản phẩm: {verified_product.get("name")}
-• Số lượng: {args.get("quantity", 1)}
-• Tổng thanh toán: {float(verified_product.get("price", 0)) * int(args.get("quantity", 1)):,.0f}đ
+• Số lượng: {quantity}
+• Tổng thanh toán: {float(verified_product.get("price", 0)) * int(quantity):,.0f}đ
 
 Cảm ơn bạn đã mua sắm cùng chúng tôi! Đơn hàng sẽ được xử lý và giao đến bạn trong thời gian sớm nhất.
 """
@@ -438,7 +531,8 @@ Vui lòng cung cấp thông tin đặt hàng theo định dạng:
                     logging.info(f"User confirmed order with product: {verified_product}")
                     
                     # Kiểm tra xem có product_id không
-                    if "id" not in verified_product:
+                    product_id = verified_product.get("product_id") or verified_product.get("id")
+                    if not product_id:
                         logging.error("Product ID missing in verified_product")
                         error_message = "❌ Lỗi: Không tìm thấy ID sản phẩm. Vui lòng thử lại."
                         return {
@@ -450,7 +544,7 @@ Vui lòng cung cấp thông tin đặt hàng theo định dạng:
                     order_data = {
                         "products": [
                             {
-                                "product_id": str(verified_product["id"]),  # Ensure it's a string
+                                "product_id": str(product_id),  # Ensure it's a string
                                 "quantity": quantity
                             }
                         ]
@@ -510,6 +604,16 @@ Vui lòng thử lại sau hoặc liên hệ hỗ trợ.
                     qty_match = re.search(r'thành\s+(\d+)', last_user_message)
                     new_quantity = int(qty_match.group(1)) if qty_match else 1
                     
+                    # Giữ lại hàng theo số lượng mới
+                    if verified_product.get("reservation_id"):
+                        reservation = hold_stock(customer_id, verified_product["product_id"], new_quantity)
+                        verified_product = {
+                            **verified_product,
+                            "reservation_id": reservation["reservation_id"],
+                            "reserved_quantity": reservation["quantity"],
+                            "reserved_until": reservation["expires_at"].isoformat(),
+                        }
+
                     # Tính tổng giá tiền mới
                     unit_price = float(verified_product.get('price', 0))
                     total_price = unit_price * new_quantity
@@ -528,6 +632,12 @@ Bạn có muốn xác nhận đặt hàng không?
                         "messages": [{"type": "ai", "content": confirmation_message}],
                         "verified_product": verified_product
                     }
+                except ValueError as e:
+                    # Không đủ hàng cho số lượng mới; phần hàng đã giữ trước đó vẫn còn
+                    return {
+                        "messages": [{"type": "ai", "content": f"❌ Không thể cập nhật số lượng: {str(e)}"}],
+                        "verified_product": verified_product
+                    }
                 except Exception as e:
                     logging.error(f"Error updating quantity: {str(e)}")
                     error_message = "❌ Không thể cập nhật số lượng. Vui lòng thử lại bằng cú pháp: Thay đổi số lượng thành [số lượng mới]"
@@ -539,11 +649,96 @@ Bạn có muốn xác nhận đặt hàng không?
         return state
 
 
+def route_small_talk(state: State, config: RunnableConfig):
+    """Answer greetings, thanks and goodbyes from the chitchat tables without calling the LLM."""
+    messages = state.get("messages", [])
+    # Tool responses sent back by the approval UI always go to the assistant
+    if not messages or not isinstance(messages[-1], HumanMessage) or not isinstance(messages[-1].content, str):
+        return {}
+    response = intent_router.route(messages[-1].content)
+    if response is None:
+        return {}
+
+    return {"messages": [_fast_reply(state, config, response, "intent_router")]}
+
+
+def serve_cached_response(state: State, config: RunnableConfig):
+    """Answer a repeated customer-independent question from the response cache."""
+    messages = state.get("messages", [])
+    if (
+        state.get("verified_product")
+        or not messages
+        or not isinstance(messages[-1], HumanMessage)
+        or not isinstance(messages[-1].content, str)
+    ):
+        return {}
+    cached = response_cache.get(messages[-1].content)
+    if cached is None:
+        return {}
+    response, search = cached
+    reply = _fast_reply(state, config, response, "response_cache")
+    if search is None:
+        return {"messages": [reply]}
+
+    # Replay the search the answer was written from: the model sees which products were
+    # shown (projected like any tool result) and the UI renders their cards from the artifact
+    tool_call_id = f"cache_{uuid.uuid4().hex}"
+    return {
+        "messages": [
+            AIMessage(
+                content="",
+                tool_calls=[{"name": "search_products", "args": search["args"], "id": tool_call_id}],
+                response_metadata={"source": "response_cache"},
+            ),
+            project_tool_message(
+                ToolMessage(content=dumps(search["result"]), tool_call_id=tool_call_id, name="search_products")
+            ),
+            reply,
+        ]
+    }
+
+
+def _fast_reply(state: State, config: RunnableConfig, content: str, source: str) -> AIMessage:
+    """AIMessage for a turn answered without the LLM, logged to the conversation history like any other."""
+    reply = AIMessage(content=content, response_metadata={"source": source})
+    try:
+        payload = assistant._history_payload(state, reply, config)
+        if payload:
+            history_writer.enqueue(**payload)
+    except Exception as e:
+        logging.error(f"Error saving conversation history: {str(e)}")
+    return reply
+
+
+def _answered_by(state: State, source: str) -> bool:
+    # The image search flow also ends its input with an AIMessage, so check where the message came from
+    last_message = state["messages"][-1]
+    return isinstance(last_message, AIMessage) and last_message.response_metadata.get("source") == source
+
+
+def after_small_talk(state: State):
+    return END if _answered_by(state, "intent_router") else "response_cache"
+
+
+def after_response_cache(state: State):
+    return END if _answered_by(state, "response_cache") else "context_window"
+
+
 # Define nodes: these do the work
-builder.add_node("assistant", Assistant(assistant_runnable))
+assistant = Assistant(assistant_runnable)
+builder.add_node("intent_router", route_small_talk)
+builder.add_node("response_cache", serve_cached_response)
+context_window = ContextWindow(llm)
+builder.add_node("context_window", RunnableLambda(context_window, afunc=context_window.acall, name="context_window"))
+builder.add_node("assistant", RunnableLambda(assistant, afunc=assistant.acall, name="assistant"))
 builder.add_node("order_preparation", OrderPreparation(assistant_runnable))
-builder.add_node("safe_tools", create_tool_node_with_fallback(safe_tools))
-builder.add_node("sensitive_tools", create_tool_node_with_fallback(sensitive_tools))
+# ToolNode runs every call of the last AI message at once (thread pool, or asyncio.gather
+# under astream) and returns all the ToolMessages together
+# Also used by the approval UI for read-only calls batched with a sensitive one
+safe_tool_node = create_tool_node_with_fallback(safe_tools)
+builder.add_node("safe_tools", safe_tool_node)
+# Approved batches may mix in read-only calls, so this node knows every tool
+builder.add_node("sensitive_tools", create_tool_node_with_fallback(safe_tools + sensitive_tools))
 
 
 def route_tools(state: State):
@@ -552,18 +747,22 @@ def route_tools(state: State):
     if next_node == END:
         return END
     ai_message = state["messages"][-1]
-    # This assumes single tool calls. To handle parallel tool calling, you'd want to
-    # use an ANY condition
-    first_tool_call = ai_message.tool_calls[0]
-    if first_tool_call["name"] == "create_order":
+    # Route on every call of the turn, not just the first one
+    tool_names = {tool_call["name"] for tool_call in ai_message.tool_calls}
+    # The approval screen answers the other calls of the batch (ui.record_tool_outcome)
+    if "create_order" in tool_names:
         return "order_preparation"
-    elif first_tool_call["name"] in sensitive_tool_names:
+    # One sensitive call puts the whole batch behind the user's approval
+    elif tool_names & sensitive_tool_names:
         return "sensitive_tools"
     return "safe_tools"
 
 
 # Define edges: these determine how the control flow moves
-builder.add_edge(START, "assistant")
+builder.add_edge(START, "intent_router")
+builder.add_conditional_edges("intent_router", after_small_talk, ["response_cache", END])
+builder.add_conditional_edges("response_cache", after_response_cache, ["context_window", END])
+builder.add_edge("context_window", "assistant")
 builder.add_conditional_edges(
     "assistant", route_tools, ["safe_tools", "sensitive_tools", "order_preparation", END]
 )
@@ -572,5 +771,6 @@ builder.add_edge("sensitive_tools", "assistant")
 builder.add_edge("order_preparation", END)
 
 # Compile the graph
-memory = MemorySaver()
+# Conversation state persisted in Postgres, newest CHECKPOINT_KEEP_LAST checkpoints per thread
+memory = create_checkpointer()
 graph = builder.compile(checkpointer=memory, interrupt_before=["sensitive_tools", "order_preparation"])
@@ -0,0 +1,224 @@
+"""
+Write-behind logging of conversation turns to ``conversation_history``.
+
+``Assistant`` hands every turn to ``history_writer.enqueue``, which only puts a
+row on a bounded in-memory queue. A background thread drains the queue and
+writes rows with one multi-row ``INSERT`` per batch, flushing when
+``batch_size`` rows are waiting or ``flush_interval`` seconds after the oldest
+one arrived. When the database falls behind and the queue is full, new rows are
+dropped and counted instead of blocking the user. Whatever is still queued is
+written on interpreter shutdown.
+
+The table comes from migration 0008. The writer also creates it once when it
+starts, for databases that have not been migrated yet.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from psycopg2.extras import execute_values
+
+from setupDatabase.postgresql_manager import PostgreSQLManager
+
+logger = logging.getLogger(__name__)
+
+HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", "1000"))
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "50"))
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "2"))
+
+CREATE_HISTORY_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS conversation_history (
+        id SERIAL PRIMARY KEY,
+        customer_id VARCHAR(50),
+        user_message TEXT,
+        bot_response TEXT,
+        tool_calls JSON,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+INSERT_HISTORY_SQL = """
+    INSERT INTO conversation_history (customer_id, user_message, bot_response, tool_calls, timestamp)
+    VALUES %s
+"""
+
+HistoryRow = Tuple[str, str, str, Optional[str], datetime]
+
+
+def history_row(
+    customer_id: Any,
+    user_message: str,
+    bot_response: str,
+    tool_calls: Optional[List[Dict[str, Any]]] = None,
+) -> HistoryRow:
+    """Build a conversation_history row, timestamped now."""
+    tool_calls_json = None
+    if tool_calls:
+        try:
+            tool_calls_json = json.dumps(tool_calls)
+        except Exception as e:
+            logger.error(f"Error serializing tool calls: {e}")
+    return (str(customer_id), user_message, bot_response, tool_calls_json, datetime.now())
+
+
+class HistoryWriter:
+    """Bounded queue of conversation rows drained by a daemon thread in batches."""
+
+    def __init__(
+        self,
+        db_manager: Optional[PostgreSQLManager] = None,
+        max_queue: int = HISTORY_QUEUE_SIZE,
+        batch_size: int = HISTORY_BATCH_SIZE,
+        flush_interval: float = HISTORY_FLUSH_INTERVAL,
+    ):
+        self._db_manager = db_manager
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[HistoryRow]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._table_ready = False
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+
+    @property
+    def db_manager(self) -> PostgreSQLManager:
+        if self._db_manager is None:
+            self._db_manager = PostgreSQLManager()
+        return self._db_manager
+
+    @property
+    def backlog(self) -> int:
+        """Rows waiting to be written."""
+        return self._queue.qsize()
+
+    def stats(self) -> Dict[str, int]:
+        return {"backlog": self.backlog, "dropped": self.dropped, "written": self.written, "failed": self.failed}
+
+    def enqueue(
+        self,
+        customer_id: Any,
+        user_message: str,
+        bot_response: str,
+        tool_calls: Optional[List[Dict[str, Any]]] = None,
+    ) -> bool:
+        """
+        Queue one conversation turn without waiting for the database.
+
+        Returns:
+            bool: False if the queue was full and the turn was dropped.
+        """
+        try:
+            self._queue.put_nowait(history_row(customer_id, user_message, bot_response, tool_calls))
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                dropped = self.dropped
+            # Log the first drop and then every hundredth, not one line per turn
+            if dropped == 1 or dropped % 100 == 0:
+                logger.warning(f"Conversation history queue full, {dropped} turns dropped so far")
+            return False
+
+    def start(self) -> None:
+        """Start the writer once per process and flush it at interpreter exit; later calls do nothing."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the thread and write whatever is still queued."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+        self.flush()
+
+    def flush(self) -> int:
+        """
+        Write every queued row now, in batches of ``batch_size``.
+
+        Returns:
+            int: Number of rows written.
+        """
+        written = 0
+        while True:
+            batch = self._take(self.batch_size)
+            if not batch:
+                return written
+            written += self._write(batch)
+
+    def _take(self, limit: int) -> List[HistoryRow]:
+        batch: List[HistoryRow] = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _ensure_table(self) -> None:
+        if self._table_ready:
+            return
+        with self.db_manager.get_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(CREATE_HISTORY_TABLE_SQL)
+        self._table_ready = True
+
+    def _write(self, batch: Sequence[HistoryRow]) -> int:
+        # The background thread and stop() at exit may both be writing
+        with self._write_lock:
+            try:
+                self._ensure_table()
+                with self.db_manager.get_connection() as conn:
+                    with conn.cursor() as cur:
+                        execute_values(cur, INSERT_HISTORY_SQL, batch, page_size=len(batch))
+            except Exception as e:
+                with self._lock:
+                    self.failed += len(batch)
+                logger.error(f"Error saving {len(batch)} conversation history rows: {e}")
+                return 0
+        with self._lock:
+            self.written += len(batch)
+        return len(batch)
+
+    def _run(self) -> None:
+        try:
+            self._ensure_table()
+        except Exception as e:
+            logger.error(f"Error creating conversation_history table: {e}")
+
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            # Wait for a full batch, but no longer than flush_interval after the first row
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+
+history_writer = HistoryWriter()
@@ -0,0 +1,117 @@
+"""
+Rule-based fast path for small talk, run before the LLM.
+
+Greetings, thanks, goodbyes and "who are you" used to take a model call that
+only picked the ``chitchat`` tool and a second one to phrase its answer. The
+``intent_router`` node answers them directly from the ``chitchat`` tables in
+``tools.py``, with one compiled pattern per intent that matches whole words
+only ("hi" does not fire inside "chiếc").
+
+A turn is answered only when it is nothing but small talk: after removing the
+matched keywords and polite fillers ("ạ", "nhé", "shop ơi") no word may remain.
+"Chào shop, có áo thun không?" therefore still goes to the LLM. Hit and miss
+counts are kept per process; see ``IntentRouter.stats``.
+"""
+import logging
+import re
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from virtual_sales_agent.tools import CHITCHAT_INTENTS
+
+logger = logging.getLogger(__name__)
+
+# Intents safe to answer without the LLM, in the order they are tried.
+# Goodbye comes before greeting because "chào tạm biệt" contains "chào".
+FAST_PATH_INTENTS = ("goodbye", "thanks", "identity", "greeting")
+
+# Words that may surround small talk without changing what is asked
+FILLER_WORDS = {
+    "ạ", "à", "a", "nhé", "nhe", "nha", "nhá", "ơi", "oi", "nhiều", "lắm", "rất", "nhỉ",
+    "shop", "bạn", "em", "anh", "chị", "ad", "admin", "you", "so", "much", "very", "there",
+    "mình", "tôi", "nhaa", "xin", "vâng", "dạ", "ok", "okay",
+}
+
+# Longer messages are questions with a greeting attached, leave them to the LLM
+MAX_FAST_PATH_WORDS = 8
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _keyword_pattern(keywords: Sequence[str]) -> "re.Pattern[str]":
+    # Longest first so "chào tạm biệt" wins over "chào"; \w boundaries work on Vietnamese letters
+    alternatives = sorted((re.escape(keyword) for keyword in keywords), key=len, reverse=True)
+    return re.compile(r"(?<!\w)(?:" + "|".join(alternatives) + r")(?!\w)", re.IGNORECASE | re.UNICODE)
+
+
+class IntentRouter:
+    """Answers pure small-talk messages from the chitchat tables and counts hits and misses."""
+
+    def __init__(self, intents: Sequence[Tuple[str, List[str], str]] = CHITCHAT_INTENTS):
+        tables = {name: (keywords, response) for name, keywords, response in intents}
+        self._rules = [
+            (name, _keyword_pattern(tables[name][0]), tables[name][1])
+            for name in FAST_PATH_INTENTS
+            if name in tables
+        ]
+        # Every fast-path keyword at once, to check that nothing but small talk is left
+        self._any_keyword = _keyword_pattern(
+            [keyword for name in FAST_PATH_INTENTS if name in tables for keyword in tables[name][0]]
+        )
+        self._lock = threading.Lock()
+        self.hits: Dict[str, int] = {name: 0 for name, _, _ in self._rules}
+        self.misses = 0
+
+    def classify(self, message: str) -> Optional[Tuple[str, str]]:
+        """
+        Match a user message against the fast-path intents.
+
+        Args:
+            message (str): The user's message.
+
+        Returns:
+            Optional[Tuple[str, str]]: (intent, response), or None when the LLM should answer.
+        """
+        text = message.strip().lower()
+        if not text or len(_WORD_RE.findall(text)) > MAX_FAST_PATH_WORDS:
+            return None
+        # Several intents may share the message, e.g. "chào shop, cảm ơn nhé"
+        if set(_WORD_RE.findall(self._any_keyword.sub(" ", text))) - FILLER_WORDS:
+            return None
+        for name, pattern, response in self._rules:
+            if pattern.search(text):
+                return name, response
+        return None
+
+    def route(self, message: str) -> Optional[str]:
+        """
+        Classify one user turn and record the outcome.
+
+        Returns:
+            Optional[str]: The canned response, or None to fall through to the LLM.
+        """
+        match = self.classify(message)
+        with self._lock:
+            if match is None:
+                self.misses += 1
+            else:
+                self.hits[match[0]] += 1
+            total = self.misses + sum(self.hits.values())
+        if total % 100 == 0:
+            logger.info(f"Intent router: {self.stats()}")
+        return match[1] if match else None
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            hits = sum(self.hits.values())
+            total = hits + self.misses
+            return {
+                "turns": total,
+                "hits": hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 3) if total else 0.0,
+                "by_intent": dict(self.hits),
+            }
+
+
+intent_router = IntentRouter()
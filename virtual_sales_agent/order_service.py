@@ -0,0 +1,562 @@
+"""
+Set-based order writing shared by the synchronous and async order tools.
+
+An order costs a constant number of statements regardless of how many items it
+has: one product lookup with ``= ANY(...)``, one conditional stock decrement over
+a ``VALUES`` list, and one multi-row insert of the order lines. The callers own
+the transaction, so any error raised here rolls the whole order back.
+
+Contention: the lookup locks every product row the transaction will touch with
+``FOR UPDATE`` in product_id order, so two multi-item orders can never wait on
+each other in opposite orders, and the decrement only applies where
+``quantity >= qty`` so stock can never be oversold. Callers run these functions
+through ``run_transaction`` to retry the rare serialization failure.
+
+Reservations: stock the customer already holds for these products (see
+``reservations``) is given back right before the decrement, in the same
+transaction, so the hold turns into the sale without ever being sold twice.
+``hold_order_lines`` takes those holds for a whole proposed order at once.
+
+Summaries: every function that changes an order's lines finishes with
+``refresh_order_summary``, so ``orders.total_amount``, ``item_count`` and
+``line_summary`` (migration 0006) commit together with the lines they describe.
+
+Reads: ``read_orders`` loads the header and lines of any number of orders in one
+statement, for the order tools and the UI order screens alike.
+"""
+from datetime import datetime
+from decimal import Decimal
+import json
+from typing import Any, Dict, List, Sequence, Tuple
+
+from psycopg2.extras import execute_values
+
+from setupDatabase.postgresql_async_manager import execute_values as aexecute_values
+from virtual_sales_agent.reservations import RESERVATION_TTL_SECONDS, arelease_holds, hold, release_holds
+
+PRODUCT_RESOLVE_SQL = """
+    SELECT product_id, product_name, price, quantity
+    FROM products
+    WHERE product_id = ANY(%s::int[]) OR LOWER(product_name) = ANY(%s::text[])
+    ORDER BY product_id
+"""
+PRODUCT_LOOKUP_SQL = PRODUCT_RESOLVE_SQL + "    FOR UPDATE\n"
+
+LOCK_PRODUCTS_SQL = "SELECT product_id FROM products WHERE product_id = ANY(%s::int[]) ORDER BY product_id FOR UPDATE"
+
+ORDER_FOR_UPDATE_SQL = "SELECT status FROM orders WHERE order_id = %s AND customer_id = %s FOR UPDATE"
+
+PREVIOUS_LINES_SQL = "SELECT product_id, quantity, unit_price FROM orders_details WHERE order_id = %s"
+
+INSERT_ORDER_SQL = """
+    INSERT INTO orders (customer_id, order_date, status)
+    VALUES (%s, %s, %s) RETURNING order_id
+"""
+
+# Rows whose stock is too low are simply not updated; the caller compares what came back.
+# A negative qty gives stock back and always applies.
+DECREMENT_STOCK_SQL = """
+    UPDATE products AS p
+    SET quantity = p.quantity - v.qty
+    FROM (VALUES %s) AS v(product_id, qty)
+    WHERE p.product_id = v.product_id AND p.quantity >= v.qty
+    RETURNING p.product_id, p.quantity
+"""
+DECREMENT_STOCK_TEMPLATE = "(%s::int, %s::int)"
+
+INSERT_ORDER_LINES_SQL = "INSERT INTO orders_details (order_id, product_id, quantity, unit_price) VALUES %s"
+
+# Retained lines keep the price they were sold at; relies on uq_orders_details_order_product (migration 0005)
+UPSERT_ORDER_LINES_SQL = INSERT_ORDER_LINES_SQL + """
+    ON CONFLICT (order_id, product_id) DO UPDATE SET quantity = EXCLUDED.quantity
+"""
+
+DELETE_REMOVED_LINES_SQL = "DELETE FROM orders_details WHERE order_id = %s AND product_id = ANY(%s::int[])"
+
+# Aggregates over one order's lines always return a row, so an order without lines resets to 0
+REFRESH_ORDER_SUMMARY_SQL = """
+    UPDATE orders AS o
+    SET total_amount = s.total_amount,
+        item_count = s.item_count,
+        line_summary = s.line_summary
+    FROM (
+        SELECT
+            COALESCE(SUM(od.quantity * od.unit_price), 0) AS total_amount,
+            COUNT(od.order_detail_id)::int AS item_count,
+            STRING_AGG(p.product_name || ' (x' || od.quantity || ')', ', ' ORDER BY od.product_id) AS line_summary
+        FROM orders_details od
+        JOIN products p ON od.product_id = p.product_id
+        WHERE od.order_id = %(order_id)s
+    ) AS s
+    WHERE o.order_id = %(order_id)s
+"""
+
+
+# Lines are aggregated per order in a LATERAL subquery, so a batch of orders is still one round trip
+ORDERS_WITH_LINES_SQL = """
+    SELECT
+        o.order_id, o.customer_id, o.order_date, o.status, o.total_amount, o.item_count,
+        COALESCE(l.lines, '[]'::json) AS lines
+    FROM orders o
+    LEFT JOIN LATERAL (
+        SELECT json_agg(
+            json_build_object(
+                'product_id', od.product_id,
+                'product_name', p.product_name,
+                'quantity', od.quantity,
+                'unit_price', od.unit_price
+            ) ORDER BY od.product_id
+        ) AS lines
+        FROM orders_details od
+        JOIN products p ON od.product_id = p.product_id
+        WHERE od.order_id = o.order_id
+    ) AS l ON TRUE
+    WHERE o.order_id = ANY(%s::int[]) AND (%s::int IS NULL OR o.customer_id = %s::int)
+"""
+
+
+def parse_order_items(products: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Validate the items passed to create_order.
+
+    Each item names its product by ``product_id`` or ``product_name``.
+
+    Args:
+        products (Sequence[Dict[str, Any]]): Items as sent by the model.
+
+    Returns:
+        List[Dict[str, Any]]: Items with "product_id" (int or None), "product_name" and "quantity".
+
+    Raises:
+        ValueError: If an item has no product reference or an invalid quantity.
+    """
+    if not products:
+        raise ValueError("Danh sách sản phẩm trống.")
+
+    items = []
+    for item in products:
+        product_id = item.get("product_id")
+        product_name = item.get("product_name")
+        if product_id in (None, "") and not product_name:
+            raise ValueError("Thiếu tên sản phẩm (product_name) trong danh sách sản phẩm.")
+
+        label = product_name or product_id
+        try:
+            quantity = int(item.get("quantity") or item.get("Quantity") or 0)
+        except (TypeError, ValueError):
+            quantity = 0
+        if quantity <= 0:
+            raise ValueError(f"Số lượng không hợp lệ cho sản phẩm {label}")
+
+        try:
+            product_id = int(product_id) if product_id not in (None, "") else None
+        except (TypeError, ValueError):
+            raise ValueError(f"Mã sản phẩm không hợp lệ: {product_id}")
+
+        items.append({"product_id": product_id, "product_name": product_name, "quantity": quantity})
+    return items
+
+
+def lookup_params(items: List[Dict[str, Any]]) -> Tuple[List[int], List[str]]:
+    """Parameters for PRODUCT_LOOKUP_SQL and PRODUCT_RESOLVE_SQL."""
+    ids = sorted({item["product_id"] for item in items if item["product_id"] is not None})
+    names = sorted({item["product_name"].lower() for item in items if item["product_id"] is None})
+    return ids, names
+
+
+def build_order_lines(items: List[Dict[str, Any]], rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Match items to product rows and merge items that refer to the same product.
+
+    Args:
+        items (List[Dict[str, Any]]): Output of parse_order_items.
+        rows (List[Dict[str, Any]]): Rows of PRODUCT_LOOKUP_SQL.
+
+    Returns:
+        List[Dict[str, Any]]: One line per product, sorted by product_id.
+
+    Raises:
+        ValueError: If an item matches no product.
+    """
+    by_id = {row["product_id"]: row for row in rows}
+    by_name: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        # Rows are ordered by product_id, so duplicated names resolve to the oldest product
+        by_name.setdefault(row["product_name"].lower(), row)
+
+    lines: Dict[int, Dict[str, Any]] = {}
+    for item in items:
+        if item["product_id"] is not None:
+            product = by_id.get(item["product_id"])
+        else:
+            product = by_name.get(item["product_name"].lower())
+        if not product:
+            raise ValueError(f"Không tìm thấy sản phẩm: {item['product_name'] or item['product_id']}")
+
+        line = lines.get(product["product_id"])
+        if line is None:
+            lines[product["product_id"]] = {
+                "product_id": product["product_id"],
+                "name": item["product_name"] or product["product_name"],
+                "quantity": item["quantity"],
+                "unit_price": product["price"],
+            }
+        else:
+            line["quantity"] += item["quantity"]
+
+    return [lines[product_id] for product_id in sorted(lines)]
+
+
+def check_decrement(lines: List[Dict[str, Any]], updated: List[Dict[str, Any]]) -> Dict[int, int]:
+    """
+    Verify that every line's stock was decremented.
+
+    Args:
+        lines (List[Dict[str, Any]]): Order lines passed to DECREMENT_STOCK_SQL.
+        updated (List[Dict[str, Any]]): Rows it returned.
+
+    Returns:
+        Dict[int, int]: New stock level per product_id.
+
+    Raises:
+        ValueError: Naming the first product that did not have enough stock.
+    """
+    stock_levels = {row["product_id"]: row["quantity"] for row in updated}
+    for line in lines:
+        if line["product_id"] not in stock_levels:
+            raise ValueError(f"Không đủ hàng cho sản phẩm {line['name']}")
+    return stock_levels
+
+
+def diff_order_lines(previous: List[Dict[str, Any]], lines: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Compare an order's stored lines with the requested ones.
+
+    Args:
+        previous (List[Dict[str, Any]]): Rows of PREVIOUS_LINES_SQL.
+        lines (List[Dict[str, Any]]): Requested lines from build_order_lines.
+
+    Returns:
+        Dict[str, Any]: "deltas" (product_id, units to take; negative gives back), "upserts" and
+        "removed" for the lines that changed, and "lines", the resulting order where retained
+        products keep their original unit_price.
+    """
+    old = {row["product_id"]: row for row in previous}
+    new = {line["product_id"]: line for line in lines}
+
+    deltas: List[Tuple[int, int]] = []
+    upserts: List[Dict[str, Any]] = []
+    result_lines: List[Dict[str, Any]] = []
+    for product_id, line in new.items():
+        before = old.get(product_id)
+        if before is not None:
+            line = {**line, "unit_price": before["unit_price"]}
+        result_lines.append(line)
+
+        delta = line["quantity"] - (before["quantity"] if before else 0)
+        if delta:
+            deltas.append((product_id, delta))
+            upserts.append(line)
+
+    removed = sorted(product_id for product_id in old if product_id not in new)
+    deltas.extend((product_id, -old[product_id]["quantity"]) for product_id in removed)
+
+    return {"deltas": sorted(deltas), "upserts": upserts, "removed": removed, "lines": result_lines}
+
+
+def check_order_editable(order: Dict[str, Any]) -> None:
+    """Raise ValueError unless an order row from ORDER_FOR_UPDATE_SQL exists and is still pending."""
+    if not order:
+        raise ValueError("Không tìm thấy đơn hàng hoặc đơn hàng không thuộc về khách hàng này.")
+    if order["status"].lower() != "pending":
+        raise ValueError(f"Chỉ có thể cập nhật đơn hàng đang chờ xử lý. Trạng thái hiện tại: {order['status']}")
+
+
+def refresh_order_summary(cursor, order_id: Any) -> None:
+    """Recompute the stored total_amount, item_count and line_summary of an order inside the caller's transaction."""
+    cursor.execute(REFRESH_ORDER_SUMMARY_SQL, {"order_id": order_id})
+
+
+async def arefresh_order_summary(cursor, order_id: Any) -> None:
+    """Async variant of refresh_order_summary."""
+    await cursor.execute(REFRESH_ORDER_SUMMARY_SQL, {"order_id": order_id})
+
+
+def summarize_order(order_id: int, lines: List[Dict[str, Any]], stock_levels: Dict[int, int]) -> Dict[str, Any]:
+    """Shape a written order the way create_order reports it."""
+    total_amount = sum(
+        (Decimal(str(line["unit_price"])) * Decimal(str(line["quantity"])) for line in lines), Decimal("0")
+    )
+    return {
+        "order_id": order_id,
+        "total_amount": total_amount,
+        "products": [
+            {"name": line["name"], "quantity": line["quantity"], "unit_price": float(line["unit_price"])}
+            for line in lines
+        ],
+        "stock_levels": stock_levels,
+    }
+
+
+def order_read_params(order_ids: Sequence[Any], customer_id: Any = None) -> Tuple[List[int], Any, Any]:
+    """
+    Parameters for ORDERS_WITH_LINES_SQL.
+
+    Raises:
+        ValueError: If an order ID is not a number.
+    """
+    try:
+        ids = [int(order_id) for order_id in order_ids]
+    except (TypeError, ValueError):
+        raise ValueError(f"Mã đơn hàng không hợp lệ: {order_ids}")
+    customer_id = int(customer_id) if customer_id is not None else None
+    return ids, customer_id, customer_id
+
+
+def shape_orders(order_ids: List[int], rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Shape ORDERS_WITH_LINES_SQL rows in the order the IDs were requested, skipping unknown IDs."""
+    by_id: Dict[int, Dict[str, Any]] = {}
+    for row in rows:
+        lines = row["lines"]
+        if isinstance(lines, str):
+            lines = json.loads(lines)
+        by_id[row["order_id"]] = {
+            "order_id": row["order_id"],
+            "customer_id": row["customer_id"],
+            "order_date": row["order_date"],
+            "status": row["status"],
+            "total_amount": float(row["total_amount"]),
+            "item_count": row["item_count"],
+            "products": [
+                {
+                    "product_id": line["product_id"],
+                    "product_name": line["product_name"],
+                    "quantity": line["quantity"],
+                    "unit_price": float(line["unit_price"]),
+                    "subtotal": float(line["quantity"]) * float(line["unit_price"]),
+                }
+                for line in lines
+            ],
+        }
+    return [by_id[order_id] for order_id in dict.fromkeys(order_ids) if order_id in by_id]
+
+
+def read_orders(cursor, order_ids: Sequence[Any], customer_id: Any = None) -> List[Dict[str, Any]]:
+    """
+    Load the header and lines of several orders in one query.
+
+    Args:
+        cursor: psycopg2 cursor returning dictionaries.
+        order_ids (Sequence[Any]): Orders to load.
+        customer_id (Any): When given, orders of other customers are left out.
+
+    Returns:
+        List[Dict[str, Any]]: One dict per order found, in the requested order, with order_id,
+        customer_id, order_date, status, total_amount, item_count and products.
+
+    Raises:
+        ValueError: If an order ID is not a number.
+    """
+    params = order_read_params(order_ids, customer_id)
+    cursor.execute(ORDERS_WITH_LINES_SQL, params)
+    return shape_orders(params[0], cursor.fetchall())
+
+
+async def aread_orders(cursor, order_ids: Sequence[Any], customer_id: Any = None) -> List[Dict[str, Any]]:
+    """Async variant of read_orders for psycopg 3 cursors returning dictionaries."""
+    params = order_read_params(order_ids, customer_id)
+    await cursor.execute(ORDERS_WITH_LINES_SQL, params)
+    return shape_orders(params[0], await cursor.fetchall())
+
+
+def write_order(cursor, customer_id: Any, products: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Create an order inside the caller's transaction.
+
+    Args:
+        cursor: psycopg2 cursor returning dictionaries.
+        customer_id (Any): Customer placing the order.
+        products (Sequence[Dict[str, Any]]): Items with product_id or product_name and quantity.
+
+    Returns:
+        Dict[str, Any]: order_id, total_amount, products and the new stock_levels.
+
+    Raises:
+        ValueError: If an item is invalid, unknown or out of stock.
+    """
+    items = parse_order_items(products)
+
+    cursor.execute(PRODUCT_LOOKUP_SQL, lookup_params(items))
+    lines = build_order_lines(items, cursor.fetchall())
+    stock_levels = release_holds(cursor, customer_id, [line["product_id"] for line in lines])
+
+    updated = execute_values(
+        cursor,
+        DECREMENT_STOCK_SQL,
+        [(line["product_id"], line["quantity"]) for line in lines],
+        template=DECREMENT_STOCK_TEMPLATE,
+        fetch=True,
+    )
+    stock_levels.update(check_decrement(lines, updated))
+
+    cursor.execute(INSERT_ORDER_SQL, (customer_id, datetime.now(), "Pending"))
+    order_id = cursor.fetchone()["order_id"]
+
+    execute_values(
+        cursor,
+        INSERT_ORDER_LINES_SQL,
+        [(order_id, line["product_id"], line["quantity"], line["unit_price"]) for line in lines],
+    )
+    refresh_order_summary(cursor, order_id)
+    return summarize_order(order_id, lines, stock_levels)
+
+
+def hold_order_lines(
+    cursor, customer_id: Any, products: Sequence[Dict[str, Any]], ttl: float = RESERVATION_TTL_SECONDS
+) -> Dict[str, Any]:
+    """
+    Hold the stock of a proposed order inside the caller's transaction.
+
+    Args:
+        cursor: psycopg2 cursor returning dictionaries.
+        customer_id (Any): Customer the stock is held for.
+        products (Sequence[Dict[str, Any]]): Items with product_id or product_name and quantity.
+        ttl (float): Seconds until the holds expire.
+
+    Returns:
+        Dict[str, Any]: product_ids held, expires_at of the holds and the new stock_levels.
+
+    Raises:
+        ValueError: If an item is invalid or unknown, or a product has too little stock to hold.
+    """
+    items = parse_order_items(products)
+
+    cursor.execute(PRODUCT_LOOKUP_SQL, lookup_params(items))
+    lines = build_order_lines(items, cursor.fetchall())
+
+    stock_levels: Dict[int, int] = {}
+    expires_at = None
+    for line in lines:
+        try:
+            reservation = hold(cursor, customer_id, line["product_id"], line["quantity"], ttl)
+        except ValueError:
+            raise ValueError(f"Không đủ hàng để giữ cho sản phẩm {line['name']}")
+        stock_levels.update(reservation["stock_levels"])
+        expires_at = reservation["expires_at"]
+
+    return {
+        "product_ids": [line["product_id"] for line in lines],
+        "expires_at": expires_at,
+        "stock_levels": stock_levels,
+    }
+
+
+async def awrite_order(cursor, customer_id: Any, products: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """Async variant of write_order for psycopg 3 cursors returning dictionaries."""
+    items = parse_order_items(products)
+
+    await cursor.execute(PRODUCT_LOOKUP_SQL, lookup_params(items))
+    lines = build_order_lines(items, await cursor.fetchall())
+    stock_levels = await arelease_holds(cursor, customer_id, [line["product_id"] for line in lines])
+
+    updated = await aexecute_values(
+        cursor,
+        DECREMENT_STOCK_SQL,
+        [(line["product_id"], line["quantity"]) for line in lines],
+        template=DECREMENT_STOCK_TEMPLATE,
+        fetch=True,
+    )
+    stock_levels.update(check_decrement(lines, updated))
+
+    await cursor.execute(INSERT_ORDER_SQL, (customer_id, datetime.now(), "Pending"))
+    order_id = (await cursor.fetchone())["order_id"]
+
+    await aexecute_values(
+        cursor,
+        INSERT_ORDER_LINES_SQL,
+        [(order_id, line["product_id"], line["quantity"], line["unit_price"]) for line in lines],
+    )
+    await arefresh_order_summary(cursor, order_id)
+    return summarize_order(order_id, lines, stock_levels)
+
+
+def update_order_lines(cursor, order_id: Any, customer_id: Any, products: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Apply a new item list to an existing order inside the caller's transaction.
+
+    Only the difference is written: stock moves by the net change per product in
+    one statement, changed lines are upserted in one statement and removed lines
+    deleted in one statement, so editing one line of a large order touches one line.
+
+    Args:
+        cursor: psycopg2 cursor returning dictionaries.
+        order_id (Any): Order to update.
+        customer_id (Any): Customer who must own the order.
+        products (Sequence[Dict[str, Any]]): Full new item list with product_id or product_name and quantity.
+
+    Returns:
+        Dict[str, Any]: order_id, total_amount, products and the new stock_levels.
+
+    Raises:
+        ValueError: If the order cannot be edited or an item is invalid, unknown or out of stock.
+    """
+    items = parse_order_items(products)
+
+    cursor.execute(ORDER_FOR_UPDATE_SQL, (order_id, customer_id))
+    check_order_editable(cursor.fetchone())
+
+    cursor.execute(PREVIOUS_LINES_SQL, (order_id,))
+    previous = cursor.fetchall()
+    cursor.execute(PRODUCT_RESOLVE_SQL, lookup_params(items))
+    diff = diff_order_lines(previous, build_order_lines(items, cursor.fetchall()))
+
+    stock_levels: Dict[int, int] = {}
+    if diff["deltas"]:
+        cursor.execute(LOCK_PRODUCTS_SQL, ([product_id for product_id, _ in diff["deltas"]],))
+        updated = execute_values(cursor, DECREMENT_STOCK_SQL, diff["deltas"], template=DECREMENT_STOCK_TEMPLATE, fetch=True)
+        stock_levels = check_decrement(diff["upserts"], updated)
+    if diff["upserts"]:
+        execute_values(
+            cursor,
+            UPSERT_ORDER_LINES_SQL,
+            [(order_id, line["product_id"], line["quantity"], line["unit_price"]) for line in diff["upserts"]],
+        )
+    if diff["removed"]:
+        cursor.execute(DELETE_REMOVED_LINES_SQL, (order_id, diff["removed"]))
+    if diff["deltas"]:
+        refresh_order_summary(cursor, order_id)
+
+    return summarize_order(order_id, diff["lines"], stock_levels)
+
+
+async def aupdate_order_lines(cursor, order_id: Any, customer_id: Any, products: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+    """Async variant of update_order_lines for psycopg 3 cursors returning dictionaries."""
+    items = parse_order_items(products)
+
+    await cursor.execute(ORDER_FOR_UPDATE_SQL, (order_id, customer_id))
+    check_order_editable(await cursor.fetchone())
+
+    await cursor.execute(PREVIOUS_LINES_SQL, (order_id,))
+    previous = await cursor.fetchall()
+    await cursor.execute(PRODUCT_RESOLVE_SQL, lookup_params(items))
+    diff = diff_order_lines(previous, build_order_lines(items, await cursor.fetchall()))
+
+    stock_levels: Dict[int, int] = {}
+    if diff["deltas"]:
+        await cursor.execute(LOCK_PRODUCTS_SQL, ([product_id for product_id, _ in diff["deltas"]],))
+        updated = await aexecute_values(
+            cursor, DECREMENT_STOCK_SQL, diff["deltas"], template=DECREMENT_STOCK_TEMPLATE, fetch=True
+        )
+        stock_levels = check_decrement(diff["upserts"], updated)
+    if diff["upserts"]:
+        await aexecute_values(
+            cursor,
+            UPSERT_ORDER_LINES_SQL,
+            [(order_id, line["product_id"], line["quantity"], line["unit_price"]) for line in diff["upserts"]],
+        )
+    if diff["removed"]:
+        await cursor.execute(DELETE_REMOVED_LINES_SQL, (order_id, diff["removed"]))
+    if diff["deltas"]:
+        await arefresh_order_summary(cursor, order_id)
+
+    return summarize_order(order_id, diff["lines"], stock_levels)
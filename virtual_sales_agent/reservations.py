@@ -0,0 +1,208 @@
+"""
+Stock reservations held while an order waits for the customer's approval.
+
+The create_order approval screen (``ui.create_order_ui``) holds the proposed
+quantities as soon as it renders, once per tool call, and gives them back with
+``release_customer_holds`` when the customer cancels; ``OrderPreparation`` does
+the same for the product it shows. Other sessions therefore cannot take the
+stock while the customer decides. A hold
+decrements ``products.quantity`` immediately and records a row in
+``stock_reservations`` (migration 0004) with an expiry. ``create_order`` gives the
+customer's holds back and takes the ordered quantity in the same transaction, so
+a hold turns into a sale atomically. Holds nobody used are returned in bulk by
+a background sweeper.
+"""
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional, Sequence
+
+from setupDatabase.postgresql_manager import PostgreSQLManager
+from virtual_sales_agent.catalog_index import catalog_index
+
+logger = logging.getLogger(__name__)
+
+db_manager = PostgreSQLManager()
+
+RESERVATION_TTL_SECONDS = float(os.getenv("RESERVATION_TTL_SECONDS", "900"))
+RESERVATION_SWEEP_INTERVAL = float(os.getenv("RESERVATION_SWEEP_INTERVAL", "30"))
+RESERVATION_SWEEP_BATCH = int(os.getenv("RESERVATION_SWEEP_BATCH", "500"))
+
+# Give a customer's holds on the given products back to stock
+RELEASE_HOLDS_SQL = """
+    WITH released AS (
+        DELETE FROM stock_reservations
+        WHERE customer_id = %s AND product_id = ANY(%s::int[])
+        RETURNING product_id, quantity
+    ), totals AS (
+        SELECT product_id, SUM(quantity)::int AS qty FROM released GROUP BY product_id
+    )
+    UPDATE products AS p
+    SET quantity = p.quantity + t.qty
+    FROM totals t
+    WHERE p.product_id = t.product_id
+    RETURNING p.product_id, p.quantity
+"""
+
+HOLD_STOCK_SQL = """
+    WITH held AS (
+        UPDATE products
+        SET quantity = quantity - %(quantity)s
+        WHERE product_id = %(product_id)s AND quantity >= %(quantity)s
+        RETURNING product_id, quantity
+    )
+    INSERT INTO stock_reservations (product_id, customer_id, quantity, expires_at)
+    SELECT product_id, %(customer_id)s, %(quantity)s, NOW() + make_interval(secs => %(ttl)s)
+    FROM held
+    RETURNING reservation_id, product_id, quantity, expires_at, (SELECT quantity FROM held) AS stock
+"""
+
+# SKIP LOCKED leaves holds that a create_order is consuming right now to that transaction
+SWEEP_EXPIRED_SQL = """
+    WITH expired AS (
+        DELETE FROM stock_reservations
+        WHERE reservation_id IN (
+            SELECT reservation_id FROM stock_reservations
+            WHERE expires_at <= NOW()
+            ORDER BY reservation_id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING product_id, quantity
+    ), totals AS (
+        SELECT product_id, SUM(quantity)::int AS qty FROM expired GROUP BY product_id
+    )
+    UPDATE products AS p
+    SET quantity = p.quantity + t.qty
+    FROM totals t
+    WHERE p.product_id = t.product_id
+    RETURNING p.product_id, p.quantity
+"""
+
+
+def release_holds(cursor, customer_id: Any, product_ids: Sequence[int]) -> Dict[int, int]:
+    """
+    Return a customer's holds on ``product_ids`` to stock inside the caller's transaction.
+
+    Returns:
+        Dict[int, int]: New stock level of every product that had a hold.
+    """
+    cursor.execute(RELEASE_HOLDS_SQL, (int(customer_id), sorted(set(product_ids))))
+    return {row["product_id"]: row["quantity"] for row in cursor.fetchall()}
+
+
+async def arelease_holds(cursor, customer_id: Any, product_ids: Sequence[int]) -> Dict[int, int]:
+    """Async variant of release_holds."""
+    await cursor.execute(RELEASE_HOLDS_SQL, (int(customer_id), sorted(set(product_ids))))
+    return {row["product_id"]: row["quantity"] for row in await cursor.fetchall()}
+
+
+def hold(cursor, customer_id: Any, product_id: Any, quantity: int, ttl: float = RESERVATION_TTL_SECONDS) -> Dict[str, Any]:
+    """
+    Hold stock inside the caller's transaction, replacing the customer's hold on the product.
+
+    Returns:
+        Dict[str, Any]: The reservation row plus "stock_levels", the new stock of the product.
+
+    Raises:
+        ValueError: If there is not enough stock left to hold.
+    """
+    stock_levels = release_holds(cursor, customer_id, [int(product_id)])
+    cursor.execute(
+        HOLD_STOCK_SQL,
+        {"customer_id": int(customer_id), "product_id": int(product_id), "quantity": int(quantity), "ttl": ttl},
+    )
+    reservation = cursor.fetchone()
+    if not reservation:
+        raise ValueError("Không đủ hàng để giữ cho đơn hàng này")
+    stock_levels[reservation["product_id"]] = reservation.pop("stock")
+    return {**reservation, "stock_levels": stock_levels}
+
+
+def hold_stock(customer_id: Any, product_id: Any, quantity: int, ttl: float = RESERVATION_TTL_SECONDS) -> Dict[str, Any]:
+    """
+    Reserve ``quantity`` units of a product for a customer, replacing any hold they already have on it.
+
+    Args:
+        customer_id (Any): Customer the stock is held for.
+        product_id (Any): Product to hold.
+        quantity (int): Units to hold.
+        ttl (float): Seconds until the hold expires.
+
+    Returns:
+        Dict[str, Any]: reservation_id, product_id, quantity and expires_at of the new hold.
+
+    Raises:
+        ValueError: If there is not enough stock left to hold.
+    """
+    quantity = int(quantity)
+    if quantity <= 0:
+        raise ValueError(f"Số lượng không hợp lệ: {quantity}")
+
+    reservation = db_manager.run_transaction(lambda cursor: hold(cursor, customer_id, product_id, quantity, ttl))
+    catalog_index.set_stock(reservation.pop("stock_levels"))
+    logger.info(
+        f"Held {quantity} of product {product_id} for customer {customer_id} "
+        f"until {reservation['expires_at']} (reservation {reservation['reservation_id']})"
+    )
+    return reservation
+
+
+def release_customer_holds(customer_id: Any, product_ids: Sequence[int]) -> None:
+    """Give a customer's holds on ``product_ids`` back, e.g. when they abandon an order."""
+    stock_levels = db_manager.run_transaction(lambda cursor: release_holds(cursor, customer_id, product_ids))
+    catalog_index.set_stock(stock_levels)
+
+
+def sweep_expired(batch_size: int = RESERVATION_SWEEP_BATCH) -> int:
+    """
+    Return expired holds to stock, ``batch_size`` reservations per statement.
+
+    Returns:
+        int: Number of products whose stock went back up.
+    """
+    restocked = 0
+    while True:
+        def _sweep(cursor) -> Dict[int, int]:
+            cursor.execute(SWEEP_EXPIRED_SQL, (batch_size,))
+            return {row["product_id"]: row["quantity"] for row in cursor.fetchall()}
+
+        stock_levels = db_manager.run_transaction(_sweep)
+        if not stock_levels:
+            return restocked
+        catalog_index.set_stock(stock_levels)
+        restocked += len(stock_levels)
+
+
+class ReservationSweeper:
+    """Daemon thread that calls sweep_expired() every ``interval`` seconds."""
+
+    def __init__(self, interval: float = RESERVATION_SWEEP_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Start the sweeper once per process; later calls do nothing."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="reservation-sweeper", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                restocked = sweep_expired()
+                if restocked:
+                    logger.info(f"Released expired stock reservations for {restocked} products")
+            except Exception as e:
+                logger.error(f"Error sweeping expired stock reservations: {e}")
+
+
+reservation_sweeper = ReservationSweeper()
@@ -0,0 +1,286 @@
+"""
+Cache of assistant answers to repeated, customer-independent questions.
+
+Much of the traffic is the same few questions ("shop bán gì", "có áo thun
+không"), and each one costs one or two LLM calls. The ``response_cache`` node
+runs before the assistant and answers from here. It has two tiers:
+
+- Exact: the normalized message (lowercase, punctuation and extra spaces removed)
+  is the key.
+- Similar: the cosine similarity of character trigram vectors of the
+  diacritic-folded message, computed locally, must reach ``similarity``. Both
+  messages must also have the same content words once folded and stripped of
+  filler ("shop", "có", "không", "ko"...). This tier therefore only absorbs
+  spelling, diacritic and punctuation variants: "áo thun nam" never answers
+  "áo thun nữ", nor "dưới 200k" "dưới 300k", however close their trigrams are.
+
+Only turns answered from catalog tools (``search_products``, ``chitchat``) are
+stored. A turn answered without any tool is not: the prompt carries the
+customer's profile and the conversation summary, so "tôi tên gì" would leak to
+the next customer. Follow-ups such as "còn màu khác không" depend on the
+conversation, so they are neither stored nor served, and neither is anything
+while an order is being prepared. Entries expire after ``ttl`` seconds, the
+least recently used ones are evicted beyond ``maxsize``, and an entry is dropped
+once ``catalog_index.version`` moves past the version it was stored under.
+
+The answer to a search is only a short introduction, because the UI renders the
+products as cards from the ``search_products`` result. Each entry therefore
+keeps the search of the turn it was stored from (``turn_search``), and a cached
+reply replays it: the model sees which products the customer was shown, so a
+follow-up such as "cái thứ hai giá bao nhiêu" still resolves, and the UI renders
+the same cards.
+"""
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage, ToolMessage
+
+from virtual_sales_agent.catalog_index import catalog_index
+from virtual_sales_agent.utils import fold_diacritics
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "600"))
+RESPONSE_CACHE_SIMILARITY = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0.85"))
+
+# Tools whose results do not depend on who is asking
+CACHEABLE_TOOLS = frozenset({"search_products", "chitchat"})
+
+# Words that point back at earlier messages ("cái đó", "còn màu khác không"); not folded,
+# since "đó" and "đỏ" or "đồ" fold to the same word
+FOLLOW_UP_WORDS = frozenset({"đó", "này", "kia", "khác", "nữa", "thêm", "vậy", "it", "that", "this", "those"})
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACES_RE = re.compile(r"\s+")
+
+# Folded words that do not change which products are asked for. "do" stays out: "đỏ" folds to it
+FILLER_WORDS = frozenset({
+    "shop", "cua", "hang", "co", "khong", "ko", "k", "hong", "ban", "a", "nhe", "nha", "nhi", "oi", "gi",
+    "cho", "minh", "toi", "em", "anh", "chi", "ad", "voi", "la", "nao", "duoc", "dc", "xin", "hoi", "xem",
+    "tim", "muon", "can", "van", "con", "the", "you", "have", "any", "there",
+})
+
+
+def normalize_message(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace; diacritics are kept, they change meaning."""
+    return _SPACES_RE.sub(" ", _PUNCTUATION_RE.sub(" ", text.lower())).strip()
+
+
+def trigram_vector(normalized: str) -> Counter:
+    """Character trigram counts of the folded message, padded so word edges count."""
+    folded = f" {fold_diacritics(normalized)} "
+    return Counter(folded[i:i + 3] for i in range(len(folded) - 2))
+
+
+def content_words(normalized: str) -> FrozenSet[str]:
+    """Folded words of a normalized message that are not filler."""
+    return frozenset(fold_diacritics(normalized).split()) - FILLER_WORDS
+
+
+def cosine(a: Counter, a_norm: float, b: Counter, b_norm: float) -> float:
+    if not a_norm or not b_norm:
+        return 0.0
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(count * b.get(gram, 0) for gram, count in a.items()) / (a_norm * b_norm)
+
+
+def is_follow_up(normalized: str) -> bool:
+    return bool(FOLLOW_UP_WORDS & set(normalized.split()))
+
+
+def current_turn(messages: Sequence[AnyMessage]) -> Tuple[Optional[HumanMessage], Sequence[AnyMessage]]:
+    """The last HumanMessage and the messages that followed it."""
+    for index in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[index], HumanMessage):
+            return messages[index], messages[index + 1:]
+    return None, ()
+
+
+def turn_tool_names(messages: Iterable[AnyMessage]) -> FrozenSet[str]:
+    return frozenset(
+        tool_call["name"]
+        for message in messages
+        if isinstance(message, AIMessage)
+        for tool_call in message.tool_calls
+    )
+
+
+def turn_search(messages: Iterable[AnyMessage]) -> Optional[Dict[str, Any]]:
+    """
+    The last search_products call of a turn that found products.
+
+    Returns:
+        Optional[Dict[str, Any]]: "args" of the call and its full "result", or None.
+    """
+    messages = list(messages)
+    args_by_id = {
+        tool_call["id"]: tool_call["args"]
+        for message in messages
+        if isinstance(message, AIMessage)
+        for tool_call in message.tool_calls
+    }
+    search = None
+    for message in messages:
+        if (
+            isinstance(message, ToolMessage)
+            and message.name == "search_products"
+            and isinstance(message.artifact, dict)
+            and message.artifact.get("products")
+        ):
+            search = {"args": args_by_id.get(message.tool_call_id, {}), "result": message.artifact}
+    return search
+
+
+@dataclass
+class _Entry:
+    response: str
+    vector: Counter
+    norm: float
+    words: FrozenSet[str]
+    catalog_version: int
+    stored_at: float
+    search: Optional[Dict[str, Any]] = None
+
+
+class ResponseCache:
+    """
+    LRU + TTL map from normalized user message to assistant answer, with a similarity fallback.
+
+    Args:
+        maxsize (int): Entries kept; the least recently used one is evicted first.
+        ttl (float): Seconds an entry may be served.
+        similarity (float): Minimum trigram cosine for the similarity tier; above 1 disables it.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = RESPONSE_CACHE_SIZE,
+        ttl: float = RESPONSE_CACHE_TTL,
+        similarity: float = RESPONSE_CACHE_SIMILARITY,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    def _expired(self, entry: _Entry, now: float) -> bool:
+        return now - entry.stored_at > self.ttl or entry.catalog_version != catalog_index.version
+
+    def get(self, message: str) -> Optional[Tuple[str, Optional[Dict[str, Any]]]]:
+        """
+        Cached answer for a user message.
+
+        Returns:
+            Optional[Tuple[str, Optional[Dict[str, Any]]]]: The answer and the search it was
+            written from (see turn_search), or None on a miss or for follow-up questions.
+        """
+        normalized = normalize_message(message)
+        if not normalized or is_follow_up(normalized):
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(normalized)
+            if entry is not None and not self._expired(entry, now):
+                self._entries.move_to_end(normalized)
+                self.exact_hits += 1
+                return entry.response, entry.search
+
+            best_key, best_score = None, self.similarity
+            if self.similarity <= 1.0:
+                vector = trigram_vector(normalized)
+                norm = math.sqrt(sum(count * count for count in vector.values()))
+                words = content_words(normalized)
+                for key, candidate in list(self._entries.items()):
+                    if self._expired(candidate, now):
+                        del self._entries[key]
+                        continue
+                    # Close spellings of different products ("nam"/"nữ", "đỏ"/"đen") must not match
+                    if candidate.words != words:
+                        continue
+                    score = cosine(vector, norm, candidate.vector, candidate.norm)
+                    if score >= best_score:
+                        best_key, best_score = key, score
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.similar_hits += 1
+            entry = self._entries[best_key]
+            return entry.response, entry.search
+
+    def put(self, message: str, response: str, search: Optional[Dict[str, Any]] = None) -> None:
+        normalized = normalize_message(message)
+        if not normalized or not response or is_follow_up(normalized):
+            return
+        vector = trigram_vector(normalized)
+        entry = _Entry(
+            response=response,
+            vector=vector,
+            norm=math.sqrt(sum(count * count for count in vector.values())),
+            words=content_words(normalized),
+            catalog_version=catalog_index.version,
+            stored_at=time.monotonic(),
+            search=search,
+        )
+        with self._lock:
+            self._entries[normalized] = entry
+            self._entries.move_to_end(normalized)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def remember_turn(self, messages: Sequence[AnyMessage], answer: AIMessage, verified_product: Optional[dict] = None) -> bool:
+        """
+        Store the assistant's final answer to the current turn if it is customer-independent.
+
+        Args:
+            messages: State messages before ``answer``, ending with this turn's tool round trips.
+            answer (AIMessage): The assistant's reply without tool calls.
+            verified_product: Order in preparation, if any; such turns are never stored.
+
+        Returns:
+            bool: Whether the answer was cached.
+        """
+        if verified_product or answer.tool_calls or not isinstance(answer.content, str):
+            return False
+        question, followers = current_turn(messages)
+        if question is None or not isinstance(question.content, str):
+            return False
+        # No tool means the answer came from the prompt, which holds the customer's profile
+        tools = turn_tool_names(followers)
+        if not tools or not tools <= CACHEABLE_TOOLS:
+            return False
+        self.put(question.content, answer.content, turn_search(followers))
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            hits = self.exact_hits + self.similar_hits
+            total = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 3) if total else 0.0,
+            }
+
+
+response_cache = ResponseCache()
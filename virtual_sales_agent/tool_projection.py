@@ -0,0 +1,98 @@
+"""
+Compact tool results before they enter the LLM context.
+
+A ToolMessage is re-sent on every later LLM step of the thread, so its content
+should hold only what the model needs to answer. After a ToolNode runs,
+``project_tool_messages`` does two things:
+
+- For tools listed in ``PROJECTIONS``, the content becomes a small field set
+  with truncated descriptions. The full result moves to ``ToolMessage.artifact``,
+  which stays in graph state for the UI and is never sent to the model.
+- Every JSON result is re-serialized with orjson without whitespace.
+
+The estimated token reduction of each batch is logged.
+"""
+import logging
+from typing import Any, Callable, Dict, List
+
+import orjson
+from langchain_core.messages import ToolMessage
+
+from virtual_sales_agent.context_window import CHARS_PER_TOKEN
+
+logger = logging.getLogger(__name__)
+
+# Characters of a product description the model sees; the UI shows the full text
+DESCRIPTION_CHARS = 160
+
+
+def truncate(text: Any, limit: int) -> Any:
+    if not isinstance(text, str) or len(text) <= limit:
+        return text
+    return text[:limit].rsplit(" ", 1)[0] + "…"
+
+
+def project_search_products(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Products with the fields the model answers from.
+
+    Links, images, usage notes and catalog metadata are dropped: the UI renders product
+    cards from the artifact and the model only introduces them.
+    """
+    projected: Dict[str, Any] = {"status": result.get("status")}
+    if "message" in result:
+        projected["message"] = result["message"]
+    if "products" in result:
+        projected["products"] = [
+            {
+                "product_id": product.get("product_id"),
+                "name": product.get("name"),
+                "category": product.get("category"),
+                "price": product.get("price"),
+                "stock": product.get("stock"),
+                "description": truncate(product.get("description"), DESCRIPTION_CHARS),
+            }
+            for product in result["products"]
+        ]
+    return projected
+
+
+# Tool name -> projection of its parsed result
+PROJECTIONS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    "search_products": project_search_products,
+}
+
+
+def dumps(value: Any) -> str:
+    """Compact JSON; dates and decimals fall back to str like the tools' own json.dumps(default=str)."""
+    return orjson.dumps(value, default=str).decode()
+
+
+def project_tool_message(message: ToolMessage) -> ToolMessage:
+    """Projected copy of one ToolMessage, or the message itself when its content is not JSON."""
+    if not isinstance(message.content, str):
+        return message
+    try:
+        result = orjson.loads(message.content)
+    except orjson.JSONDecodeError:
+        return message
+
+    projection = PROJECTIONS.get(message.name)
+    if projection is not None and isinstance(result, dict):
+        return message.model_copy(update={"content": dumps(projection(result)), "artifact": result})
+    return message.model_copy(update={"content": dumps(result)})
+
+
+def project_tool_messages(output: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply ``project_tool_message`` to the ToolMessages a ToolNode returned."""
+    messages: List[Any] = output.get("messages", [])
+    projected = [project_tool_message(m) if isinstance(m, ToolMessage) else m for m in messages]
+
+    before = sum(len(m.content) for m in messages if isinstance(m, ToolMessage) and isinstance(m.content, str))
+    after = sum(len(m.content) for m in projected if isinstance(m, ToolMessage) and isinstance(m.content, str))
+    if before:
+        logger.info(
+            f"Tool results projected: ~{before // CHARS_PER_TOKEN} -> ~{after // CHARS_PER_TOKEN} tokens "
+            f"({100 - 100 * after // before}% smaller)"
+        )
+    return {**output, "messages": projected}
@@ -1,8 +1,7 @@
 from datetime import datetime
-from decimal import Decimal
-from typing import Any, Dict, List, Optional, Union
-import json
+from typing import Any, Dict, List, Optional, Tuple, Union
 import logging  # Add logging import
+import os
 import unicodedata
 import re
 
@@ -11,9 +10,23 @@ from langchain_core.tools import tool
 import psycopg2.extras
 
 from setupDatabase.postgresql_manager import PostgreSQLManager
+from virtual_sales_agent.catalog_index import catalog_index, catalog_stats
+from virtual_sales_agent.customer_cache import customer_profiles
+from virtual_sales_agent.history_writer import history_writer
+from virtual_sales_agent.order_service import read_orders, refresh_order_summary, update_order_lines, write_order
+from virtual_sales_agent.utils import fold_diacritics
 
 db_manager = PostgreSQLManager()
 
+# "index" answers from the in-process catalog index and uses the database only while
+# the index cannot be loaded; "fts" ranks with the products.search_vector GIN index
+# (migration 0003) and falls back to the LIKE ranking when it finds nothing or is
+# unavailable; "like" only runs the LIKE ranking.
+PRODUCT_SEARCH_MODE = os.getenv("PRODUCT_SEARCH_MODE", "index").lower()
+
+# Dumps the whole in-stock catalog to the log on every search; only for debugging.
+SALES_AGENT_DIAGNOSTICS = os.getenv("SALES_AGENT_DIAGNOSTICS", "0").lower() in ("1", "true", "yes")
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -29,6 +42,28 @@ def debug_products_in_db():
             logging.info(f"  - {repr(product['product_name'])}")  # Use repr to see exact characters
         return products
 
+CHITCHAT_WELCOME = "Xin chào! Tôi là trợ lý ảo của cửa hàng đồ thủ công mỹ nghệ. Tôi có thể giúp bạn tìm kiếm sản phẩm, tạo đơn hàng và trả lời các câu hỏi. Bạn cần hỗ trợ gì không?"
+
+# (intent, keywords, response), checked in order; shared with the pre-LLM intent router
+CHITCHAT_INTENTS = [
+    # Chào hỏi
+    ("greeting", ["xin chào", "hello", "hi", "chào"], "Xin chào! Rất vui được gặp bạn. Tôi là trợ lý ảo của cửa hàng đồ thủ công mỹ nghệ. Tôi có thể giúp bạn tìm sản phẩm, đặt hàng hoặc trả lời thắc mắc. Bạn cần hỗ trợ gì hôm nay?"),
+    # Hỏi về danh tính
+    ("identity", ["bạn là ai", "giới thiệu", "who are you"], "Tôi là trợ lý ảo thông minh của cửa hàng đồ thủ công mỹ nghệ. Tôi chuyên hỗ trợ khách hàng tìm kiếm sản phẩm trong các danh mục: thời trang, đồ dùng nhà cửa, đồ chơi/trò chơi, và phụ kiện. Tôi có thể giúp bạn đặt hàng, kiểm tra đơn hàng, và trả lời mọi thắc mắc về sản phẩm."),
+    # Hỏi về thời tiết
+    ("weather", ["thời tiết", "weather", "trời"], "Tôi không thể kiểm tra thời tiết, nhưng tôi có thể giúp bạn tìm những sản phẩm phù hợp với mọi thời tiết! Ví dụ như áo mưa, ô dù, hoặc quần áo mùa hè. Bạn có muốn xem các sản phẩm thời trang không?"),
+    # Cảm ơn
+    ("thanks", ["cảm ơn", "thank", "thanks"], "Không có gì! Tôi luôn sẵn sàng hỗ trợ bạn. Nếu cần thêm thông tin về sản phẩm hoặc muốn đặt hàng, đừng ngần ngại hỏi nhé!"),
+    # Tạm biệt
+    ("goodbye", ["tạm biệt", "bye", "goodbye", "chào tạm biệt"], "Tạm biệt và cảm ơn bạn đã ghé thăm! Hẹn gặp lại bạn sớm. Nếu cần hỗ trợ gì, tôi luôn sẵn sàng giúp đỡ!"),
+    # Hỏi về cửa hàng
+    ("shop", ["cửa hàng", "shop", "store", "bán gì"], "Cửa hàng chúng tôi chuyên bán các đồ thủ công mỹ nghệ chất lượng cao gồm 4 danh mục chính: Thời trang (quần áo, nón, túi xách), Đồ dùng nhà cửa, Đồ chơi/Trò chơi, và Phụ kiện. Bạn muốn xem sản phẩm nào không?"),
+]
+
+# Câu trả lời mặc định cho các câu hỏi khác
+CHITCHAT_DEFAULT_RESPONSE = "Tôi hiểu bạn muốn trò chuyện! Tôi chuyên hỗ trợ về các sản phẩm đồ thủ công mỹ nghệ. Bạn có muốn tìm hiểu về sản phẩm nào không? Hoặc cần hỗ trợ gì về đặt hàng và dịch vụ?"
+
+
 @tool
 def chitchat(message: Optional[str] = None) -> Dict[str, str]:
     """
@@ -45,37 +80,245 @@ def chitchat(message: Optional[str] = None) -> Dict[str, str]:
     câu hỏi chung về cửa hàng và dịch vụ.
     """
     if not message:
-        return {"response": "Xin chào! Tôi là trợ lý ảo của cửa hàng đồ thủ công mỹ nghệ. Tôi có thể giúp bạn tìm kiếm sản phẩm, tạo đơn hàng và trả lời các câu hỏi. Bạn cần hỗ trợ gì không?"}
+        return {"response": CHITCHAT_WELCOME}
     
     message_lower = message.lower()
     
-    # Chào hỏi
-    if any(greeting in message_lower for greeting in ["xin chào", "hello", "hi", "chào"]):
-        return {"response": "Xin chào! Rất vui được gặp bạn. Tôi là trợ lý ảo của cửa hàng đồ thủ công mỹ nghệ. Tôi có thể giúp bạn tìm sản phẩm, đặt hàng hoặc trả lời thắc mắc. Bạn cần hỗ trợ gì hôm nay?"}
-    
-    # Hỏi về danh tính
-    elif any(identity in message_lower for identity in ["bạn là ai", "giới thiệu", "who are you"]):
-        return {"response": "Tôi là trợ lý ảo thông minh của cửa hàng đồ thủ công mỹ nghệ. Tôi chuyên hỗ trợ khách hàng tìm kiếm sản phẩm trong các danh mục: thời trang, đồ dùng nhà cửa, đồ chơi/trò chơi, và phụ kiện. Tôi có thể giúp bạn đặt hàng, kiểm tra đơn hàng, và trả lời mọi thắc mắc về sản phẩm."}
-    
-    # Hỏi về thời tiết
-    elif any(weather in message_lower for weather in ["thời tiết", "weather", "trời"]):
-        return {"response": "Tôi không thể kiểm tra thời tiết, nhưng tôi có thể giúp bạn tìm những sản phẩm phù hợp với mọi thời tiết! Ví dụ như áo mưa, ô dù, hoặc quần áo mùa hè. Bạn có muốn xem các sản phẩm thời trang không?"}
-    
-    # Cảm ơn
-    elif any(thanks in message_lower for thanks in ["cảm ơn", "thank", "thanks"]):
-        return {"response": "Không có gì! Tôi luôn sẵn sàng hỗ trợ bạn. Nếu cần thêm thông tin về sản phẩm hoặc muốn đặt hàng, đừng ngần ngại hỏi nhé!"}
-    
-    # Tạm biệt
-    elif any(goodbye in message_lower for goodbye in ["tạm biệt", "bye", "goodbye", "chào tạm biệt"]):
-        return {"response": "Tạm biệt và cảm ơn bạn đã ghé thăm! Hẹn gặp lại bạn sớm. Nếu cần hỗ trợ gì, tôi luôn sẵn sàng giúp đỡ!"}
-    
-    # Hỏi về cửa hàng
-    elif any(shop in message_lower for shop in ["cửa hàng", "shop", "store", "bán gì"]):
-        return {"response": "Cửa hàng chúng tôi chuyên bán các đồ thủ công mỹ nghệ chất lượng cao gồm 4 danh mục chính: Thời trang (quần áo, nón, túi xách), Đồ dùng nhà cửa, Đồ chơi/Trò chơi, và Phụ kiện. Bạn muốn xem sản phẩm nào không?"}
-    
-    # Câu trả lời mặc định cho các câu hỏi khác
+    for _, keywords, response in CHITCHAT_INTENTS:
+        if any(keyword in message_lower for keyword in keywords):
+            return {"response": response}
+    return {"response": CHITCHAT_DEFAULT_RESPONSE}
+
+
+CATEGORY_COUNTS_SQL = """
+    SELECT c.category_name, COUNT(*) as count 
+    FROM products p
+    JOIN categories c ON p.id_category = c.id_category
+    WHERE p.quantity > 0 
+    GROUP BY c.category_name
+"""
+
+PRICE_STATS_SQL = """
+    SELECT 
+        MIN(price) as min_price,
+        MAX(price) as max_price,
+        AVG(price) as avg_price
+    FROM products
+    WHERE quantity > 0
+"""
+
+
+def build_product_search_query(
+    query: Optional[str],
+    category: Optional[str],
+    min_price: Optional[float],
+    max_price: Optional[float],
+) -> Tuple[str, List[Any]]:
+    """
+    Build the ranked LIKE query used by search_products.
+
+    Returns:
+        Tuple[str, List[Any]]: SQL text and its parameters.
+    """
+    # Xây dựng query với logic rõ ràng hơn
+    query_parts = ["""
+        SELECT p.*, c.category_name 
+        FROM products p 
+        JOIN categories c ON p.id_category = c.id_category 
+        WHERE p.quantity > 0
+    """]
+    params = []
+
+    # Xử lý điều kiện category trước (ưu tiên cao nhất)
+    if category:
+        query_parts.append("AND LOWER(c.category_name) = %s")
+        params.append(category.lower())
+
+    # Xử lý điều kiện query (tìm kiếm trong tên sản phẩm và mô tả)
+    if query:
+        search_patterns = []
+        search_params = []
+        
+        # 1. Tìm kiếm chính xác trong tên sản phẩm
+        search_patterns.append("LOWER(p.product_name) = %s")
+        search_params.append(query.lower())
+        
+        # 2. Tìm kiếm LIKE trong tên sản phẩm
+        search_patterns.append("LOWER(p.product_name) LIKE %s")
+        search_params.append(f"%{query.lower()}%")
+        
+        # 3. Tìm kiếm từng từ trong tên sản phẩm
+        words = query.split()
+        for word in words:
+            if len(word) > 2:
+                search_patterns.append("LOWER(p.product_name) LIKE %s")
+                search_params.append(f"%{word.lower()}%")
+        
+        # 4. Tìm kiếm trong mô tả
+        search_patterns.append("LOWER(p.description) LIKE %s")
+        search_params.append(f"%{query.lower()}%")
+        
+        # Kết hợp tất cả patterns với OR (chỉ trong phạm vi tìm kiếm query)
+        query_parts.append(f"AND ({' OR '.join(search_patterns)})")
+        params.extend(search_params)
+
+    # Xử lý điều kiện giá
+    if min_price is not None and min_price > 0:
+        query_parts.append("AND p.price >= %s")
+        params.append(min_price)
+
+    if max_price is not None and max_price > 0:
+        query_parts.append("AND p.price <= %s")
+        params.append(max_price)
+
+    # Thêm ORDER BY để ưu tiên kết quả khớp chính xác hơn
+    if query:
+        query_parts.append("""
+            ORDER BY 
+                CASE WHEN LOWER(p.product_name) = %s THEN 1 
+                     WHEN LOWER(p.product_name) LIKE %s THEN 2 
+                     WHEN LOWER(p.description) LIKE %s THEN 3
+                     ELSE 4 END,
+                p.product_name
+        """)
+        params.extend([query.lower(), f"%{query.lower()}%", f"%{query.lower()}%"])
     else:
-        return {"response": "Tôi hiểu bạn muốn trò chuyện! Tôi chuyên hỗ trợ về các sản phẩm đồ thủ công mỹ nghệ. Bạn có muốn tìm hiểu về sản phẩm nào không? Hoặc cần hỗ trợ gì về đặt hàng và dịch vụ?"}
+        query_parts.append("ORDER BY p.product_name")
+
+    query_parts.append("LIMIT 2")
+
+    return " ".join(query_parts), params
+
+
+def build_product_search_fallback_query(
+    query: Optional[str],
+    category: Optional[str],
+    min_price: Optional[float],
+    max_price: Optional[float],
+) -> Tuple[str, List[Any]]:
+    """
+    Build the simpler query search_products retries with when the ranked one fails.
+
+    Returns:
+        Tuple[str, List[Any]]: SQL text and its parameters.
+    """
+    query_parts_fallback = ["""
+        SELECT p.*, c.category_name 
+        FROM products p 
+        JOIN categories c ON p.id_category = c.id_category 
+        WHERE p.quantity > 0
+    """]
+    params_fallback = []
+
+    if category:
+        query_parts_fallback.append("AND LOWER(c.category_name) = %s")
+        params_fallback.append(category.lower())
+
+    if query:
+        query_parts_fallback.append("AND (LOWER(p.product_name) LIKE %s OR LOWER(p.description) LIKE %s)")
+        search_term = f"%{query.lower()}%"
+        params_fallback.extend([search_term, search_term])
+
+    if min_price is not None and min_price > 0:
+        query_parts_fallback.append("AND p.price >= %s")
+        params_fallback.append(min_price)
+
+    if max_price is not None and max_price > 0:
+        query_parts_fallback.append("AND p.price <= %s")
+        params_fallback.append(max_price)
+
+    query_parts_fallback.append("ORDER BY p.product_name LIMIT 2")
+    return " ".join(query_parts_fallback), params_fallback
+
+
+def build_product_fts_query(
+    query: Optional[str],
+    category: Optional[str],
+    min_price: Optional[float],
+    max_price: Optional[float],
+) -> Optional[Tuple[str, List[Any]]]:
+    """
+    Build the full-text variant of the product search.
+
+    Query words are diacritic-folded and prefix-matched ("ao" finds "Áo thun") against
+    products.search_vector, ranked by exact name match and then ts_rank_cd.
+
+    Returns:
+        Optional[Tuple[str, List[Any]]]: SQL text and parameters, or None if the query has no searchable words.
+    """
+    folded_query = fold_diacritics(query or "")
+    words = re.findall(r"\w+", folded_query)
+    if not words:
+        return None
+
+    query_parts = ["""
+        SELECT p.*, c.category_name, ts_rank_cd(p.search_vector, q) AS rank
+        FROM products p
+        JOIN categories c ON p.id_category = c.id_category
+        CROSS JOIN to_tsquery('simple', %s) q
+        WHERE p.quantity > 0 AND p.search_vector @@ q
+    """]
+    params: List[Any] = [" | ".join(f"{word}:*" for word in words)]
+
+    if category:
+        query_parts.append("AND LOWER(c.category_name) = %s")
+        params.append(category.lower())
+
+    if min_price is not None and min_price > 0:
+        query_parts.append("AND p.price >= %s")
+        params.append(min_price)
+
+    if max_price is not None and max_price > 0:
+        query_parts.append("AND p.price <= %s")
+        params.append(max_price)
+
+    query_parts.append("ORDER BY (vn_fold(p.product_name) = %s) DESC, rank DESC, p.product_name LIMIT 2")
+    params.append(" ".join(folded_query.split()))
+
+    return " ".join(query_parts), params
+
+
+def format_search_result(
+    products: List[Dict[str, Any]],
+    categories: List[Dict[str, Any]],
+    price_stats: Dict[str, Any],
+    query: Optional[str],
+) -> Dict[str, Any]:
+    """Shape product rows and catalog metadata into the search_products response."""
+    return {
+        "status": "success",
+        "products": [
+            {
+                "product_id": str(product["product_id"]),
+                "url": product.get("url"),
+                "name": product["product_name"],
+                "category": product["category_name"],
+                "description": product["description"],
+                "price": float(product["price"]),
+                "stock": product["quantity"],
+                "image_url": product.get("image_url"),
+                "usage_instructions": product.get("usage_instructions")
+            }
+            for product in products
+        ],
+        "metadata": {
+            "total_results": len(products),
+            "categories": [
+                {"name": cat["category_name"], "product_count": cat["count"]}
+                for cat in categories
+            ],
+            "price_range": {
+                "min": float(price_stats["min_price"]) if price_stats["min_price"] else 0,
+                "max": float(price_stats["max_price"]) if price_stats["max_price"] else 0,
+                "average": round(float(price_stats["avg_price"]), 2) if price_stats["avg_price"] else 0,
+            },
+            "search_info": {
+                "query": query,
+                "query_repr": repr(query) if query else None,
+                "normalized_query": query if query else None
+            }
+        },
+    }
 
 
 @tool
@@ -88,7 +331,7 @@ def search_products(
     """
     Tìm kiếm thông tin sản phẩm dựa trên các tiêu chí khác nhau.
     Nếu người dùng chỉ hỏi sản phẩm(query) mà không cung cấp thêm thông tin gì về thể loại thì bạn hãy tự chọn category_name.
-    Trả lời chính xác tên, giá, url, url hình ảnh ; không được bịa đặt những thông tin này.
+    Giao diện tự hiển thị thẻ sản phẩm (tên, giá, hình ảnh, link) từ kết quả của tool này; chỉ cần viết 1-2 câu ngắn giới thiệu kết quả, không liệt kê lại sản phẩm, không chèn link hay ảnh.
     Nếu không tìm thấy sản phẩm nào phù hợp với tiêu chí tìm kiếm, hãy trả về một danh sách rỗng.
 
     category_name chỉ gồm bốn loại:
@@ -111,191 +354,83 @@ def search_products(
     """
     
 
-    with db_manager.get_connection() as conn:
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        # Debug: log all products in database first
+    if SALES_AGENT_DIAGNOSTICS:
         debug_products_in_db()
-        
-        # Log để debug
-        if query:
-            logging.info(f"Searching for query: '{query}'")
-            logging.info(f"Query repr: {repr(query)}")
-        
-        # Xây dựng query với logic rõ ràng hơn
-        query_parts = ["""
-            SELECT p.*, c.category_name 
-            FROM products p 
-            JOIN categories c ON p.id_category = c.id_category 
-            WHERE p.quantity > 0
-        """]
-        params = []
-
-        # Xử lý điều kiện category trước (ưu tiên cao nhất)
-        if category:
-            query_parts.append("AND LOWER(c.category_name) = %s")
-            params.append(category.lower())
-
-        # Xử lý điều kiện query (tìm kiếm trong tên sản phẩm và mô tả)
-        if query:
-            search_patterns = []
-            search_params = []
-            
-            # 1. Tìm kiếm chính xác trong tên sản phẩm
-            search_patterns.append("LOWER(p.product_name) = %s")
-            search_params.append(query.lower())
-            
-            # 2. Tìm kiếm LIKE trong tên sản phẩm
-            search_patterns.append("LOWER(p.product_name) LIKE %s")
-            search_params.append(f"%{query.lower()}%")
-            
-            # 3. Tìm kiếm từng từ trong tên sản phẩm
-            words = query.split()
-            for word in words:
-                if len(word) > 2:
-                    search_patterns.append("LOWER(p.product_name) LIKE %s")
-                    search_params.append(f"%{word.lower()}%")
-            
-            # 4. Tìm kiếm trong mô tả
-            search_patterns.append("LOWER(p.description) LIKE %s")
-            search_params.append(f"%{query.lower()}%")
-            
-            # Kết hợp tất cả patterns với OR (chỉ trong phạm vi tìm kiếm query)
-            query_parts.append(f"AND ({' OR '.join(search_patterns)})")
-            params.extend(search_params)
-
-        # Xử lý điều kiện giá
-        if min_price is not None and min_price > 0:
-            query_parts.append("AND p.price >= %s")
-            params.append(min_price)
-
-        if max_price is not None and max_price > 0:
-            query_parts.append("AND p.price <= %s")
-            params.append(max_price)
-
-        # Thêm ORDER BY để ưu tiên kết quả khớp chính xác hơn
-        if query:
-            query_parts.append("""
-                ORDER BY 
-                    CASE WHEN LOWER(p.product_name) = %s THEN 1 
-                         WHEN LOWER(p.product_name) LIKE %s THEN 2 
-                         WHEN LOWER(p.description) LIKE %s THEN 3
-                         ELSE 4 END,
-                    p.product_name
-            """)
-            params.extend([query.lower(), f"%{query.lower()}%", f"%{query.lower()}%"])
-        else:
-            query_parts.append("ORDER BY p.product_name")
 
-        query_parts.append("LIMIT 2")
+    # Log để debug
+    if query:
+        logging.info(f"Searching for query: '{query}'")
+        logging.info(f"Query repr: {repr(query)}")
+
+    products = None
+    if PRODUCT_SEARCH_MODE == "index":
+        products = catalog_index.search(query, category, min_price, max_price, limit=2)
+
+    # Category counts and price range come from a snapshot refreshed on inventory changes
+    stats = catalog_stats.get()
 
-        sql_query = " ".join(query_parts)
+    if products is None or stats is None:
+        with db_manager.get_connection() as conn:
+            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+            if products is None:
+                products = _search_products_in_db(conn, cursor, query, category, min_price, max_price)
+
+            if stats is None:
+                cursor.execute(CATEGORY_COUNTS_SQL)
+                categories = cursor.fetchall()
+                cursor.execute(PRICE_STATS_SQL)
+                stats = catalog_stats.put(categories, cursor.fetchone())
+
+    # Log tên sản phẩm và category tìm được
+    for product in products:
+        logging.info(f"Found product: '{product['product_name']}' in category: '{product['category_name']}'")
+
+    return format_search_result(products, stats["categories"], stats["price_stats"], query)
+
+
+def _search_products_in_db(
+    conn,
+    cursor,
+    query: Optional[str],
+    category: Optional[str],
+    min_price: Optional[float],
+    max_price: Optional[float],
+) -> List[Dict[str, Any]]:
+    """Run the database product search: full-text first (unless disabled), then the LIKE ranking."""
+    products = None
+    fts_query = build_product_fts_query(query, category, min_price, max_price) if PRODUCT_SEARCH_MODE != "like" else None
+    if fts_query:
+        try:
+            cursor.execute(*fts_query)
+            products = cursor.fetchall() or None
+            logging.info(f"Full-text search found {len(products or [])} products")
+        except Exception as e:
+            logging.warning(f"Full-text search unavailable, using LIKE ranking: {str(e)}")
+            conn.rollback()
+
+    if products is None:
+        sql_query, params = build_product_search_query(query, category, min_price, max_price)
         logging.info(f"SQL Query: {sql_query}")
         logging.info(f"Parameters: {params}")
-        
+
         try:
             cursor.execute(sql_query, params)
             products = cursor.fetchall()
             logging.info(f"Found {len(products)} products")
-            
-            # Log tên sản phẩm và category tìm được
-            for product in products:
-                logging.info(f"Found product: '{product['product_name']}' in category: '{product['category_name']}'")
-                
+
         except Exception as e:
             logging.error(f"Database error: {str(e)}")
+            conn.rollback()
             # Fallback query đơn giản hơn
-            query_parts_fallback = ["""
-                SELECT p.*, c.category_name 
-                FROM products p 
-                JOIN categories c ON p.id_category = c.id_category 
-                WHERE p.quantity > 0
-            """]
-            params_fallback = []
-
-            if category:
-                query_parts_fallback.append("AND LOWER(c.category_name) = %s")
-                params_fallback.append(category.lower())
-
-            if query:
-                query_parts_fallback.append("AND (LOWER(p.product_name) LIKE %s OR LOWER(p.description) LIKE %s)")
-                search_term = f"%{query.lower()}%"
-                params_fallback.extend([search_term, search_term])
-
-            if min_price is not None and min_price > 0:
-                query_parts_fallback.append("AND p.price >= %s")
-                params_fallback.append(min_price)
-
-            if max_price is not None and max_price > 0:
-                query_parts_fallback.append("AND p.price <= %s")
-                params_fallback.append(max_price)
-
-            query_parts_fallback.append("ORDER BY p.product_name LIMIT 2")
-            sql_query_fallback = " ".join(query_parts_fallback)
-            
+            sql_query_fallback, params_fallback = build_product_search_fallback_query(
+                query, category, min_price, max_price
+            )
             logging.info(f"Using fallback query: {sql_query_fallback}")
             cursor.execute(sql_query_fallback, params_fallback)
             products = cursor.fetchall()
 
-        # Get available categories for metadata
-        cursor.execute(
-            """
-            SELECT c.category_name, COUNT(*) as count 
-            FROM products p
-            JOIN categories c ON p.id_category = c.id_category
-            WHERE p.quantity > 0 
-            GROUP BY c.category_name
-        """
-        )
-        categories = cursor.fetchall()
-
-        # Get price range for metadata
-        cursor.execute(
-            """
-            SELECT 
-                MIN(price) as min_price,
-                MAX(price) as max_price,
-                AVG(price) as avg_price
-            FROM products
-            WHERE quantity > 0
-        """
-        )
-        price_stats = cursor.fetchone()
-
-        return {
-            "status": "success",
-            "products": [
-                {
-                    "product_id": str(product["product_id"]),
-                    "url": product.get("url"),
-                    "name": product["product_name"],
-                    "category": product["category_name"],
-                    "description": product["description"],
-                    "price": float(product["price"]),
-                    "stock": product["quantity"],
-                    "image_url": product.get("image_url"),
-                    "usage_instructions": product.get("usage_instructions")
-                }
-                for product in products
-            ],
-            "metadata": {
-                "total_results": len(products),
-                "categories": [
-                    {"name": cat["category_name"], "product_count": cat["count"]}
-                    for cat in categories
-                ],
-                "price_range": {
-                    "min": float(price_stats["min_price"]) if price_stats["min_price"] else 0,
-                    "max": float(price_stats["max_price"]) if price_stats["max_price"] else 0,
-                    "average": round(float(price_stats["avg_price"]), 2) if price_stats["avg_price"] else 0,
-                },
-                "search_info": {
-                    "query": query,
-                    "query_repr": repr(query) if query else None,
-                    "normalized_query": query if query else None
-                }
-            },
-        }
+    return products
 
 
 @tool
@@ -313,6 +448,7 @@ def create_order(
 
      Example:
          create_order([{"product_name": "Áo thun", "quantity": 2}, {"product_name": "Quần jean", "quantity": 1}])
+         create_order([{"product_id": "12", "quantity": 1}])
     """
 
     logging.info("=== CREATE ORDER TOOL CALLED ===")
@@ -329,118 +465,206 @@ def create_order(
         logging.error("Customer ID not found in configuration")
         return {"status": "error", "message": "Không tìm thấy ID khách hàng."}
 
-    with db_manager.get_connection() as conn:
-        logging.info("Database connection established")
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        try:
-            cursor.execute("BEGIN")
-            logging.info("DB transaction started")
+    try:
+        # One locked lookup, one conditional stock decrement and one bulk insert for the whole
+        # order; retried as a whole if it loses a serialization conflict
+        order = db_manager.run_transaction(lambda cursor: write_order(cursor, customer_id, products))
+    except Exception as e:
+        logging.error(f"Error creating order: {str(e)}")
+        error_result = {
+            "status": "error",
+            "message": f"Lỗi tạo đơn hàng: {str(e)}",
+            "customer_id": str(customer_id),
+        }
+        logging.error(f"=== CREATE ORDER ERROR: {error_result} ===")
+        return error_result
+
+    logging.info(f"Order {order['order_id']} committed with {len(order['products'])} lines")
+    catalog_index.set_stock(order["stock_levels"])
+
+    result_data = {
+        "order_id": str(order["order_id"]),
+        "status": "success",
+        "message": "Đơn hàng được tạo thành công",
+        "total_amount": float(order["total_amount"]),
+        "products": order["products"],
+        "customer_id": str(customer_id),
+    }
+    logging.info(f"=== CREATE ORDER SUCCESS: {result_data} ===")
+    return result_data
 
-            # Create order
-            cursor.execute(
-                """INSERT INTO orders (customer_id, order_date, status) 
-                   VALUES (%s, %s, %s) RETURNING order_id""",
-                (customer_id, datetime.now(), "Pending"),
-            )
-            result = cursor.fetchone()
-            order_id = result["order_id"]
-            logging.info(f"Created order with ID: {order_id}")
-
-            total_amount = Decimal("0")
-            ordered_products = []
-
-            # Process each product
-            for item in products:
-                # Chỉ lấy product_name, không lấy ProductName
-                product_name = item.get("product_name")
-                if not product_name:
-                    logging.error(f"Missing product_name in item: {item}")
-                    raise ValueError("Thiếu tên sản phẩm (product_name) trong danh sách sản phẩm.")
-                quantity = item.get("quantity") or 0
-
-                # Đảm bảo quantity là số nguyên
-                try:
-                    quantity = int(quantity)
-                except Exception:
-                    logging.error(f"Invalid quantity for {product_name}: {quantity}")
-                    quantity = 0
-
-                logging.info(f"Processing product: {product_name}, quantity: {quantity}")
-                
-                # Get product details
-                cursor.execute(
-                    "SELECT product_id, price, quantity FROM products WHERE LOWER(product_name) = LOWER(%s)",
-                    (product_name,),
-                )
-                product = cursor.fetchone()
 
-                if not product:
-                    logging.error(f"Product not found: {product_name}")
-                    raise ValueError(f"Không tìm thấy sản phẩm: {product_name}")
+# Orders per check_order_status page when the caller does not say; larger requests are capped
+ORDER_HISTORY_PAGE_SIZE = int(os.getenv("ORDER_HISTORY_PAGE_SIZE", "10"))
+ORDER_HISTORY_MAX_PAGE_SIZE = 50
 
-                if product["quantity"] < quantity:
-                    logging.error(f"Insufficient stock for {product_name}: requested {quantity}, available {product['quantity']}")
-                    raise ValueError(f"Không đủ hàng cho sản phẩm {product_name}")
+ORDER_STATUS_SQL = """
+    SELECT order_id, order_date, status, line_summary AS products, total_amount
+    FROM orders
+    WHERE order_id = %s AND customer_id = %s
+"""
 
-                # Add order detail
-                cursor.execute(
-                    """INSERT INTO orders_details (order_id, product_id, quantity, unit_price) 
-                       VALUES (%s, %s, %s, %s)""",
-                    (order_id, product["product_id"], quantity, product["price"]),
-                )
-                logging.info(f"Added order detail for product_id: {product['product_id']}")
 
-                # Update inventory
-                cursor.execute(
-                    "UPDATE products SET quantity = quantity - %s WHERE product_id = %s",
-                    (quantity, product["product_id"]),
-                )
-                logging.info(f"Updated inventory for product_id: {product['product_id']}")
-
-                total_amount += Decimal(str(product["price"])) * Decimal(str(quantity))
-                ordered_products.append(
-                    {
-                        "name": product_name,
-                        "quantity": quantity,
-                        "unit_price": float(product["price"]),
-                    }
-                )
+def encode_order_cursor(order_date: datetime, order_id: int) -> str:
+    """Cursor pointing just after an order in check_order_status' newest-first listing."""
+    return f"{order_date.isoformat()}_{order_id}"
 
-            cursor.execute("COMMIT")
-            logging.info("Order transaction committed successfully")
-            
-            result_data = {
-                "order_id": str(order_id),
-                "status": "success",
-                "message": "Đơn hàng được tạo thành công",
-                "total_amount": float(total_amount),
-                "products": ordered_products,
-                "customer_id": str(customer_id),
-            }
-            logging.info(f"=== CREATE ORDER SUCCESS: {result_data} ===")
-            return result_data
 
-        except Exception as e:
-            cursor.execute("ROLLBACK")
-            logging.error(f"Error creating order: {str(e)}")
-            error_result = {
-                "status": "error",
-                "message": f"Lỗi tạo đơn hàng: {str(e)}",
-                "customer_id": str(customer_id),
+def decode_order_cursor(before: str) -> Tuple[datetime, int]:
+    """
+    Parse a cursor produced by encode_order_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        order_date, order_id = before.rsplit("_", 1)
+        return datetime.fromisoformat(order_date), int(order_id)
+    except (AttributeError, ValueError):
+        raise ValueError(f"Con trỏ phân trang không hợp lệ: {before}")
+
+
+def _parse_order_date(value: str) -> datetime:
+    try:
+        return datetime.strptime(value.strip(), "%Y-%m-%d")
+    except (AttributeError, ValueError):
+        raise ValueError(f"Ngày không hợp lệ (cần YYYY-MM-DD): {value}")
+
+
+def build_order_history_query(
+    customer_id: Any,
+    page_size: int,
+    before: Optional[str],
+    status: Optional[str],
+    date_from: Optional[str],
+    date_to: Optional[str],
+) -> Tuple[str, List[Any]]:
+    """
+    Build one newest-first page of a customer's orders.
+
+    The row comparison on ``(order_date, order_id)`` walks idx_orders_customer_date_id
+    (migration 0007) from the cursor, so every page costs the same however deep it is.
+    One extra row is fetched to tell whether another page follows.
+
+    Returns:
+        Tuple[str, List[Any]]: SQL text and its parameters.
+
+    Raises:
+        ValueError: If the cursor or a date filter is malformed.
+    """
+    query_parts = ["""
+        SELECT order_id, order_date, status, item_count, total_amount
+        FROM orders
+        WHERE customer_id = %s
+    """]
+    params: List[Any] = [customer_id]
+
+    if before:
+        query_parts.append("AND (order_date, order_id) < (%s, %s)")
+        params.extend(decode_order_cursor(before))
+    if status:
+        # Trạng thái lưu dạng 'Pending', 'Shipped', 'Cancelled', 'Completed'
+        query_parts.append("AND status = %s")
+        params.append(status.strip().capitalize())
+    if date_from:
+        query_parts.append("AND order_date >= %s")
+        params.append(_parse_order_date(date_from))
+    if date_to:
+        # date_to tính cả ngày đó
+        query_parts.append("AND order_date < %s::timestamp + INTERVAL '1 day'")
+        params.append(_parse_order_date(date_to))
+
+    query_parts.append("ORDER BY order_date DESC, order_id DESC LIMIT %s")
+    params.append(page_size + 1)
+    return " ".join(query_parts), params
+
+
+def clamp_page_size(page_size: Optional[int]) -> int:
+    """Page size to use for a requested check_order_status page_size."""
+    try:
+        page_size = int(page_size) if page_size else ORDER_HISTORY_PAGE_SIZE
+    except (TypeError, ValueError):
+        page_size = ORDER_HISTORY_PAGE_SIZE
+    return max(1, min(page_size, ORDER_HISTORY_MAX_PAGE_SIZE))
+
+
+def format_order_status(order: Dict[str, Any], customer_id: Any) -> Dict[str, Any]:
+    """Shape a row of ORDER_STATUS_SQL into the check_order_status response."""
+    return {
+        "status": "success",
+        "order_id": str(order["order_id"]),
+        "order_date": order["order_date"].strftime("%Y-%m-%d %H:%M:%S"),
+        "order_status": order["status"],
+        "products": order["products"],
+        "total_amount": float(order["total_amount"]),
+        "customer_id": str(customer_id),
+    }
+
+
+def format_order_history(
+    rows: List[Dict[str, Any]], customer_id: Any, page_size: int, compact: bool
+) -> Dict[str, Any]:
+    """
+    Shape the rows of build_order_history_query into the check_order_status response.
+
+    In compact mode every order is one short line ("#id | date | status | items | total"),
+    which is what the assistant needs to answer "where are my orders" at a fraction
+    of the tokens.
+    """
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if compact:
+        orders: List[Any] = [
+            f"#{row['order_id']} | {row['order_date']:%Y-%m-%d} | {row['status']} | "
+            f"{row['item_count']} sản phẩm | {float(row['total_amount']):,.0f}đ"
+            for row in rows
+        ]
+    else:
+        orders = [
+            {
+                "order_id": str(row["order_id"]),
+                "order_date": row["order_date"].strftime("%Y-%m-%d %H:%M:%S"),
+                "status": row["status"],
+                "item_count": row["item_count"],
+                "total_amount": float(row["total_amount"]),
             }
-            logging.error(f"=== CREATE ORDER ERROR: {error_result} ===")
-            return error_result
+            for row in rows
+        ]
+    return {
+        "status": "success",
+        "customer_id": str(customer_id),
+        "orders": orders,
+        "has_more": has_more,
+        "next_before": encode_order_cursor(rows[-1]["order_date"], rows[-1]["order_id"]) if has_more else None,
+    }
 
 
 @tool
 def check_order_status(
-    order_id: Union[str, None], *, config: RunnableConfig
-) -> Dict[str, Union[str, None]]:
+    order_id: Union[str, None],
+    page_size: Optional[int] = None,
+    before: Optional[str] = None,
+    status: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    compact: bool = True,
+    *,
+    config: RunnableConfig
+) -> Dict[str, Any]:
     """
-    Kiểm tra trạng thái của một đơn hàng cụ thể hoặc tất cả đơn hàng của khách hàng.
+    Kiểm tra trạng thái của một đơn hàng cụ thể hoặc danh sách đơn hàng của khách hàng.
+
+    Danh sách được phân trang từ mới đến cũ. Nếu kết quả có "has_more" là true, gọi lại với
+    before = giá trị "next_before" để lấy trang tiếp theo.
 
     Arguments:
-        order_id (Union[str, None]): ID của đơn hàng cần kiểm tra. Nếu None, sẽ trả về tất cả đơn hàng của khách hàng.
+        order_id (Union[str, None]): ID của đơn hàng cần kiểm tra. Nếu None, trả về danh sách đơn hàng của khách hàng.
+        page_size (Optional[int]): Số đơn hàng mỗi trang (mặc định 10, tối đa 50).
+        before (Optional[str]): Con trỏ "next_before" của trang trước.
+        status (Optional[str]): Lọc theo trạng thái: Pending, Shipped, Cancelled, Completed.
+        date_from (Optional[str]): Chỉ lấy đơn hàng từ ngày này (YYYY-MM-DD).
+        date_to (Optional[str]): Chỉ lấy đơn hàng đến hết ngày này (YYYY-MM-DD).
+        compact (bool): True trả mỗi đơn hàng thành một dòng tóm tắt; False trả đầy đủ các trường.
     """
     configuration = config.get("configurable", {})
     customer_id = configuration.get("customer_id", None)
@@ -452,23 +676,8 @@ def check_order_status(
         cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
 
         if order_id:
-            # Query specific order
-            cursor.execute(
-                """
-                SELECT 
-                    o.order_id,
-                    o.order_date,
-                    o.status,
-                    STRING_AGG(p.product_name || ' (x' || od.quantity || ')', ', ') as products,
-                    SUM(od.quantity * od.unit_price) as total_amount
-                FROM orders o
-                JOIN orders_details od ON o.order_id = od.order_id
-                JOIN products p ON od.product_id = p.product_id
-                WHERE o.order_id = %s AND o.customer_id = %s
-                GROUP BY o.order_id, o.order_date, o.status
-            """,
-                (order_id, customer_id),
-            )
+            # Totals and line summary are maintained on the order row (migration 0006)
+            cursor.execute(ORDER_STATUS_SQL, (order_id, customer_id))
 
             order = cursor.fetchone()
             if not order:
@@ -479,49 +688,16 @@ def check_order_status(
                     "order_id": str(order_id),
                 }
 
-            return {
-                "status": "success",
-                "order_id": str(order["order_id"]),
-                "order_date": order["order_date"].strftime("%Y-%m-%d %H:%M:%S"),
-                "order_status": order["status"],
-                "products": order["products"],
-                "total_amount": float(order["total_amount"]),
-                "customer_id": str(customer_id),
-            }
+            return format_order_status(order, customer_id)
         else:
-            # Query all customer orders
-            cursor.execute(
-                """
-                SELECT 
-                    o.order_id,
-                    o.order_date,
-                    o.status,
-                    COUNT(od.order_detail_id) as item_count,
-                    SUM(od.quantity * od.unit_price) as total_amount
-                FROM orders o
-                JOIN orders_details od ON o.order_id = od.order_id
-                WHERE o.customer_id = %s
-                GROUP BY o.order_id, o.order_date, o.status
-                ORDER BY o.order_date DESC
-            """,
-                (customer_id,),
-            )
+            page_size = clamp_page_size(page_size)
+            try:
+                query, params = build_order_history_query(customer_id, page_size, before, status, date_from, date_to)
+            except ValueError as e:
+                return {"status": "error", "message": str(e), "customer_id": str(customer_id)}
 
-            orders = cursor.fetchall()
-            return {
-                "status": "success",
-                "customer_id": str(customer_id),
-                "orders": [
-                    {
-                        "order_id": str(order["order_id"]),
-                        "order_date": order["order_date"].strftime("%Y-%m-%d %H:%M:%S"),
-                        "status": order["status"],
-                        "item_count": order["item_count"],
-                        "total_amount": float(order["total_amount"]),
-                    }
-                    for order in orders
-                ],
-            }
+            cursor.execute(query, params)
+            return format_order_history(cursor.fetchall(), customer_id, page_size, compact)
 
 @tool
 def update_order(
@@ -549,93 +725,31 @@ def update_order(
     if not customer_id:
         return {"status": "error", "message": "Không tìm thấy ID khách hàng."}
 
-    with db_manager.get_connection() as conn:
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        try:
-            cursor.execute("BEGIN")
-
-            # Restore previous quantities first
-            cursor.execute(
-                """
-                SELECT od.product_id, od.quantity 
-                FROM orders_details od 
-                WHERE od.order_id = %s
-                """,
-                (order_id,)
-            )
-            previous_items = cursor.fetchall()
-            
-            for item in previous_items:
-                cursor.execute(
-                    "UPDATE products SET quantity = quantity + %s WHERE product_id = %s",
-                    (item["quantity"], item["product_id"])
-                )
-
-            # Delete old order details
-            cursor.execute("DELETE FROM orders_details WHERE order_id = %s", (order_id,))
-
-            updated_ordered_products = []
-            total_amount = Decimal("0")
-
-            for item in updated_products:
-                product_name = item.get("product_name")
-                if not product_name:
-                    raise ValueError("Thiếu tên sản phẩm trong danh sách sản phẩm.")
-                quantity = item.get("quantity") or item.get("Quantity") or 0
-
-                cursor.execute(
-                    "SELECT product_id, price, quantity FROM products WHERE LOWER(product_name) = LOWER(%s)",
-                    (product_name,),
-                )
-                product = cursor.fetchone()
-
-                if not product:
-                    raise ValueError(f"Không tìm thấy sản phẩm: {product_name}")
-
-                if product["quantity"] < quantity:
-                    raise ValueError(f"Không đủ hàng cho sản phẩm {product_name}")
-
-                cursor.execute(
-                    """INSERT INTO orders_details (order_id, product_id, quantity, unit_price)
-                       VALUES (%s, %s, %s, %s)""",
-                    (order_id, product["product_id"], quantity, product["price"]),
-                )
-
-                cursor.execute(
-                    "UPDATE products SET quantity = quantity - %s WHERE product_id = %s",
-                    (quantity, product["product_id"]),
-                )
-
-                total_amount += Decimal(str(product["price"])) * Decimal(str(quantity))
-                updated_ordered_products.append({
-                    "name": product_name,
-                    "quantity": quantity,
-                    "unit_price": float(product["price"]),
-                })
+    def _update(cursor) -> Dict[str, Any]:
+        # Only changed lines and the net stock difference per product are written.
+        # The status stays as it is: "Updated" is not an allowed orders.status value.
+        order = update_order_lines(cursor, order_id, customer_id, updated_products)
+        cursor.execute("UPDATE orders SET order_date = %s WHERE order_id = %s", (datetime.now(), order_id))
+        return order
 
-            cursor.execute(
-                "UPDATE orders SET status = %s, order_date = %s WHERE order_id = %s",
-                ("Updated", datetime.now(), order_id)
-            )
-
-            cursor.execute("COMMIT")
-
-            return {
-                "order_id": str(order_id),
-                "status": "success",
-                "message": "Đơn hàng được cập nhật thành công",
-                "total_amount": float(total_amount),
-                "products": updated_ordered_products,
-                "customer_id": str(customer_id),
-            }
+    try:
+        order = db_manager.run_transaction(_update)
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Lỗi cập nhật đơn hàng: {str(e)}",
+            "customer_id": str(customer_id),
+        }
 
-        except Exception as e:
-            cursor.execute("ROLLBACK")
-            return {
-                "status": "error",
-                "message": f"Lỗi cập nhật đơn hàng: {str(e)}",
-                "customer_id": str(customer_id),
-            }
+    catalog_index.set_stock(order["stock_levels"])
+    return {
+        "order_id": str(order_id),
+        "status": "success",
+        "message": "Đơn hàng được cập nhật thành công",
+        "total_amount": float(order["total_amount"]),
+        "products": order["products"],
+        "customer_id": str(customer_id),
+    }
 
 @tool
 def delete_order(
@@ -668,12 +782,14 @@ def delete_order(
                 (order_id,)
             )
             order_items = cursor.fetchall()
+            stock_levels = {}
             
             for item in order_items:
                 cursor.execute(
-                    "UPDATE products SET quantity = quantity + %s WHERE product_id = %s",
+                    "UPDATE products SET quantity = quantity + %s WHERE product_id = %s RETURNING quantity",
                     (item["quantity"], item["product_id"])
                 )
+                stock_levels[item["product_id"]] = cursor.fetchone()["quantity"]
 
             # Check if the order exists and belongs to the customer
             cursor.execute(
@@ -692,6 +808,7 @@ def delete_order(
             cursor.execute("DELETE FROM orders_details WHERE order_id = %s", (order_id,))
             cursor.execute("DELETE FROM orders WHERE order_id = %s", (order_id,))
             cursor.execute("COMMIT")
+            catalog_index.set_stock(stock_levels)
 
             return {
                 "status": "success",
@@ -777,6 +894,7 @@ def register_customer(
             result = cursor.fetchone()
             customer_id = result["customer_id"]
             cursor.execute("COMMIT")
+            customer_profiles.put(customer_id, {"name": username, "phone": phone, "address": address, "email": email})
 
             return {
                 "status": "success",
@@ -902,6 +1020,7 @@ def update_customer_info(
             query = f"UPDATE customers SET {', '.join(fields)} WHERE customer_id = %s"
             cursor.execute(query, tuple(values))
             cursor.execute("COMMIT")
+            customer_profiles.update(customer_id, {"name": full_name, "address": address, "phone": phone})
 
             return {
                 "status": "success",
@@ -969,6 +1088,7 @@ def cancel_order(
                 "UPDATE orders SET status = %s WHERE order_id = %s",
                 ("Cancelled", order_id),
             )
+            refresh_order_summary(cursor, order_id)
 
             # Restore product quantities
             cursor.execute(
@@ -979,6 +1099,7 @@ def cancel_order(
                 (order_id,),
             )
             order_items = cursor.fetchall()
+            stock_levels = {}
 
             for item in order_items:
                 cursor.execute(
@@ -986,11 +1107,14 @@ def cancel_order(
                     UPDATE products
                     SET quantity = quantity + %s
                     WHERE product_id = %s
+                    RETURNING quantity
                     """,
                     (item["quantity"], item["product_id"]),
                 )
+                stock_levels[item["product_id"]] = cursor.fetchone()["quantity"]
 
             cursor.execute("COMMIT")
+            catalog_index.set_stock(stock_levels)
             print(f"=== CANCEL ORDER SUCCESS ===: ", order_id, customer_id)
 
             return {
@@ -1009,23 +1133,59 @@ def cancel_order(
                 "customer_id": str(customer_id),
             }
 
+# Upper bound on order_ids per get_order_details call, to keep the tool result small
+ORDER_DETAILS_MAX_ORDERS = 20
+
+
+def format_order_details(order: Dict[str, Any], customer_id: Any) -> Dict[str, Any]:
+    """Shape an order from read_orders into the get_order_details response."""
+    return {
+        "status": "success",
+        "order_id": str(order["order_id"]),
+        "order_date": order["order_date"],
+        "order_status": order["status"],
+        "products": [
+            {key: product[key] for key in ("product_name", "quantity", "unit_price", "subtotal")}
+            for product in order["products"]
+        ],
+        "total_amount": order["total_amount"],
+        "customer_id": str(customer_id),
+    }
+
+
+def format_orders_details(
+    order_ids: List[str], orders: List[Dict[str, Any]], customer_id: Any
+) -> Dict[str, Any]:
+    """Shape several orders from read_orders into the get_order_details response for order_ids."""
+    found = {str(order["order_id"]) for order in orders}
+    return {
+        "status": "success",
+        "orders": [format_order_details(order, customer_id) for order in orders],
+        "not_found": [str(order_id) for order_id in order_ids if str(order_id) not in found],
+        "customer_id": str(customer_id),
+    }
+
+
 @tool
 def get_order_details(
-    order_id: str,
+    order_id: Optional[str] = None,
+    order_ids: Optional[List[str]] = None,
     *,
     config: RunnableConfig
 ) -> Dict[str, Any]:
     """
-    Retrieves full details of a specific order including product list, quantity, price, and status.
+    Retrieves full details of one or several orders including product list, quantity, price, and status.
 
     Arguments:
-        order_id (str): The ID of the order to retrieve.
+        order_id (Optional[str]): The ID of the order to retrieve.
+        order_ids (Optional[List[str]]): IDs of several orders to retrieve at once (up to 20) instead of order_id.
 
     Returns:
-        Dict[str, Any]: Order details or error message.
+        Dict[str, Any]: Order details, or for order_ids a list of orders plus the IDs not found, or an error message.
 
     Example:
         get_order_details(order_id="123")
+        get_order_details(order_ids=["123", "124"])
     """
     configuration = config.get("configurable", {})
     customer_id = configuration.get("customer_id", None)
@@ -1033,67 +1193,27 @@ def get_order_details(
     if not customer_id:
         return {"status": "error", "message": "No customer ID configured."}
 
-    with db_manager.get_connection() as conn:
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        try:
-            # Fetch order info
-            cursor.execute(
-                """
-                SELECT order_id, order_date, status
-                FROM orders
-                WHERE order_id = %s AND customer_id = %s
-                """,
-                (order_id, customer_id),
-            )
-            order = cursor.fetchone()
-
-            if not order:
-                return {
-                    "status": "error",
-                    "message": "Order not found.",
-                    "order_id": order_id,
-                }
-
-            # Fetch order items
-            cursor.execute(
-                """
-                SELECT p.product_name, od.quantity, od.unit_price
-                FROM orders_details od
-                JOIN products p ON od.product_id = p.product_id
-                WHERE od.order_id = %s
-                """,
-                (order_id,),
-            )
-            items = cursor.fetchall()
-
-            product_list = []
-            total_amount = 0
-            for item in items:
-                subtotal = float(item["quantity"]) * float(item["unit_price"])
-                product_list.append({
-                    "product_name": item["product_name"],
-                    "quantity": item["quantity"],
-                    "unit_price": float(item["unit_price"]),
-                    "subtotal": subtotal,
-                })
-                total_amount += subtotal
-
-            return {
-                "status": "success",
-                "order_id": str(order["order_id"]),
-                "order_date": order["order_date"],
-                "order_status": order["status"],
-                "products": product_list,
-                "total_amount": total_amount,
-                "customer_id": str(customer_id),
-            }
+    requested = list(order_ids or [])[:ORDER_DETAILS_MAX_ORDERS] or [order_id]
+    try:
+        with db_manager.get_connection() as conn:
+            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            orders = read_orders(cursor, requested, customer_id)
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": str(e),
+            "order_id": order_id,
+        }
 
-        except Exception as e:
-            return {
-                "status": "error",
-                "message": str(e),
-                "order_id": order_id,
-            }
+    if order_ids:
+        return format_orders_details(requested, orders, customer_id)
+    if not orders:
+        return {
+            "status": "error",
+            "message": "Order not found.",
+            "order_id": order_id,
+        }
+    return format_order_details(orders[0], customer_id)
 
 @tool
 def get_customer_info(customer_id: str) -> Dict[str, Any]:
@@ -1106,30 +1226,28 @@ def get_customer_info(customer_id: str) -> Dict[str, Any]:
     Returns:
         A dictionary containing customer information: name, phone, address, etc.
     """
+    cached = customer_profiles.get(customer_id)
+    if cached is not None:
+        return cached
+
     try:
-        # Connect to the database
-        conn = db_manager.get_connection()
-        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-        
-        # Query to get customer information - use actual column names from your database
-        cursor.execute("""
-            SELECT username as name, phone, address, email 
-            FROM customers 
-            WHERE customer_id = %s
-        """, (customer_id,))
-        
-        customer = cursor.fetchone()
+        with db_manager.get_connection() as conn:
+            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+
+            # Query to get customer information - use actual column names from your database
+            cursor.execute("""
+                SELECT username as name, phone, address, email 
+                FROM customers 
+                WHERE customer_id = %s
+            """, (customer_id,))
+
+            customer = cursor.fetchone()
         
         if not customer:
             return {"error": "Customer not found"}
         
         # Return customer information
-        return {
-            "name": customer["name"],
-            "phone": customer["phone"],
-            "address": customer["address"],
-            "email": customer["email"]
-        }
+        return customer_profiles.put(customer_id, customer)
         
     except Exception as e:
         logging.error(f"Error getting customer info: {e}")
@@ -1154,76 +1272,18 @@ def save_message_history(
     Returns:
         Dict[str, Any]: Status of the save operation
     """
-    try:
-        configuration = config.get("configurable", {})
-        customer_id = configuration.get("customer_id", None)
-        
-        if not customer_id or customer_id == "123456789":
-            # Skip saving for anonymous users or default customer ID
-            return {"status": "skipped", "message": "No customer ID or using default ID"}
-        
-        # First check if the table exists, if not create it
-        with db_manager.get_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Check if the table exists
-            cursor.execute("""
-                SELECT EXISTS (
-                    SELECT FROM information_schema.tables 
-                    WHERE table_name = 'conversation_history'
-                )
-            """)
-            table_exists = cursor.fetchone()[0]
-            
-            # Create the table if it doesn't exist
-            if not table_exists:
-                logging.info("Creating conversation_history table")
-                cursor.execute("""
-                    CREATE TABLE conversation_history (
-                        id SERIAL PRIMARY KEY,
-                        customer_id VARCHAR(50),
-                        user_message TEXT,
-                        bot_response TEXT,
-                        tool_calls JSON,
-                        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
-                conn.commit()
-                logging.info("conversation_history table created successfully")
-            
-            timestamp = datetime.now()
-            
-            # Convert tool_calls to JSON string if present
-            tool_calls_json = None
-            if tool_calls:
-                try:
-                    tool_calls_json = json.dumps(tool_calls)
-                except Exception as e:
-                    logging.error(f"Error serializing tool calls: {e}")
-            
-            # Save to conversation_history table
-            cursor.execute(
-                """
-                INSERT INTO conversation_history 
-                (customer_id, user_message, bot_response, tool_calls, timestamp)
-                VALUES (%s, %s, %s, %s, %s)
-                """,
-                (customer_id, user_message, bot_response, tool_calls_json, timestamp)
-            )
-            conn.commit()
-            
-            return {
-                "status": "success",
-                "message": "Conversation saved successfully",
-                "timestamp": timestamp.isoformat()
-            }
-            
-    except Exception as e:
-        logging.error(f"Error saving conversation history: {str(e)}")
-        return {
-            "status": "error",
-            "message": f"Failed to save conversation: {str(e)}"
-        }
+    configuration = config.get("configurable", {})
+    customer_id = configuration.get("customer_id", None)
+
+    if not customer_id or customer_id == "123456789":
+        # Skip saving for anonymous users or default customer ID
+        return {"status": "skipped", "message": "No customer ID or using default ID"}
+
+    # Written in the background by history_writer; the caller never waits for the database
+    history_writer.start()
+    if not history_writer.enqueue(customer_id, user_message, bot_response, tool_calls):
+        return {"status": "error", "message": "Conversation history queue is full"}
+    return {"status": "success", "message": "Conversation queued for saving"}
 
 @tool
 def search_products_by_image(
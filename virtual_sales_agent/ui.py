@@ -2,12 +2,16 @@ import streamlit as st
 import json
 import logging
 import time
+import uuid
 import psycopg2.extras  # Add this import at the top level
 
 from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.messages.tool import ToolMessage
 
-from virtual_sales_agent.graph import graph
+from virtual_sales_agent.graph import graph, safe_tool_node, safe_tools, sensitive_tool_names
+from virtual_sales_agent.catalog_index import catalog_index
+from virtual_sales_agent.order_service import hold_order_lines, read_orders
+from virtual_sales_agent.reservations import release_customer_holds
 from virtual_sales_agent.tools import create_order, update_customer_info, get_customer_info, cancel_order
 
 from setupDatabase.postgresql_manager import PostgreSQLManager
@@ -53,10 +57,178 @@ def parse_json_args(args):
     # If we get here, all parsing attempts failed
     return {}
 
+# Name of the AIMessage carrying raw image-search results into the graph; not shown in the chat
+IMAGE_RESULTS_MESSAGE_NAME = "image_search_results"
+
+
+def is_chat_message(message):
+    """Whether a message from the graph state belongs in the visible chat history"""
+    if isinstance(message, HumanMessage):
+        return True
+    return (
+        isinstance(message, AIMessage)
+        and isinstance(message.content, str)
+        and bool(message.content.strip())
+        and message.name != IMAGE_RESULTS_MESSAGE_NAME
+    )
+
+
+def is_message_shown(message):
+    """Whether a message with this id is already in st.session_state.messages"""
+    return message.id is not None and any(shown.id == message.id for shown in st.session_state.messages)
+
+
+def sync_chat_history(config):
+    """
+    Append the messages of the thread's checkpoint that the chat does not show yet.
+
+    The graph's checkpointer holds the conversation, so the chat only sends new
+    messages into the graph and rebuilds what it displays from there. Messages that
+    exist only in the UI (order confirmations) stay where they are.
+
+    Returns the newly appended messages, in conversation order.
+    """
+    try:
+        state = graph.get_state(config)
+    except Exception as e:
+        logging.error(f"Error loading conversation state: {str(e)}")
+        return []
+
+    shown = {message.id for message in st.session_state.messages if message.id is not None}
+    cards = st.session_state.setdefault("product_cards", {})
+    added = []
+    found_products = None
+    for message in state.values.get("messages", []):
+        # Products found in a turn belong to the assistant reply that follows them
+        if isinstance(message, HumanMessage):
+            found_products = None
+        elif isinstance(message, ToolMessage) and message.name == "search_products" and isinstance(message.artifact, dict):
+            found_products = message.artifact.get("products") or found_products
+        elif found_products and is_chat_message(message):
+            cards.setdefault(message.id, found_products)
+            found_products = None
+
+        if message.id in shown or not is_chat_message(message):
+            continue
+        st.session_state.messages.append(message)
+        added.append(message)
+    return added
+
+
+# Số thẻ sản phẩm trên một hàng
+PRODUCT_CARD_COLUMNS = 3
+
+
+def render_product_cards(products):
+    """
+    Render products as cards straight from the tool result.
+
+    The assistant only writes a short sentence about the results; names, prices,
+    links and images come from here, so they are never retyped or mangled by the LLM.
+    Accepts both search_products and search_products_by_image products.
+    """
+    if not products:
+        return
+    columns = st.columns(min(len(products), PRODUCT_CARD_COLUMNS))
+    for index, product in enumerate(products):
+        name = product.get("name") or product.get("product_name") or "Sản phẩm"
+        url = product.get("url") or product.get("link_url")
+        with columns[index % len(columns)]:
+            with st.container(border=True):
+                if product.get("image_url"):
+                    st.image(product["image_url"], use_container_width=True)
+                st.markdown(f"**{name}**")
+                price_line = f"💰 {float(product.get('price') or 0):,.0f}đ"
+                if product.get("stock") is not None:
+                    price_line += f" · Còn {product['stock']} sản phẩm"
+                st.markdown(price_line)
+                if product.get("description"):
+                    description = product["description"]
+                    st.caption(description if len(description) <= 150 else description[:150].rsplit(" ", 1)[0] + "…")
+                if url:
+                    st.link_button("Xem sản phẩm", url, use_container_width=True)
+
+
+def render_message_cards(message):
+    """Render the product cards attached to an assistant reply, if it has any"""
+    products = st.session_state.get("product_cards", {}).get(message.id)
+    if products:
+        render_product_cards(products)
+
+
+# Nhãn hiển thị khi trợ lý đang gọi tool trong lúc stream câu trả lời
+TOOL_PROGRESS_LABELS = {
+    "search_products": "Đang tìm sản phẩm",
+    "check_order_status": "Đang kiểm tra đơn hàng",
+    "get_order_details": "Đang lấy chi tiết đơn hàng",
+    "get_customer_info": "Đang lấy thông tin khách hàng",
+    "chitchat": "Đang soạn câu trả lời",
+    "create_order": "Đang chuẩn bị đơn hàng",
+    "update_order": "Đang chuẩn bị cập nhật đơn hàng",
+    "cancel_order": "Đang chuẩn bị hủy đơn hàng",
+    "update_customer_info": "Đang chuẩn bị cập nhật thông tin",
+}
+
+
+def stream_chat_turn(inputs, config):
+    """
+    Run one chat turn and render the assistant's reply as it is generated.
+
+    Consumes graph.stream with stream_mode ["messages", "values"]: LLM tokens from the
+    assistant node are written into a placeholder as they arrive, tool calls show a
+    progress indicator, and the "values" snapshots are kept so the caller can still
+    detect a turn that stopped before a sensitive tool for approval.
+
+    Args:
+        inputs (dict): Graph input, normally {"messages": [new HumanMessage]}.
+        config (dict): Graph config with thread_id and customer_id.
+
+    Returns:
+        tuple: (last state snapshot or None, set of ids of the AI messages already rendered)
+    """
+    snapshot = None
+    streamed_ids = set()
+    replies = {}  # message id -> text so far, in arrival order
+    bubble = progress = placeholder = None
+
+    for mode, chunk in graph.stream(inputs, config, stream_mode=["messages", "values"]):
+        if mode == "values":
+            snapshot = chunk
+            continue
+
+        message, metadata = chunk
+        if isinstance(message, ToolMessage):
+            if progress is not None:
+                progress.caption(f"✅ {TOOL_PROGRESS_LABELS.get(message.name, message.name)} xong")
+            continue
+        if not isinstance(message, AIMessage) or metadata.get("langgraph_node") != "assistant":
+            continue
+
+        if bubble is None:
+            bubble = st.chat_message("assistant")
+            progress = bubble.empty()
+            placeholder = bubble.empty()
+
+        for tool_chunk in getattr(message, "tool_call_chunks", None) or []:
+            if tool_chunk.get("name"):
+                progress.caption(f"🔧 {TOOL_PROGRESS_LABELS.get(tool_chunk['name'], tool_chunk['name'])}...")
+
+        if isinstance(message.content, str) and message.content:
+            replies[message.id] = replies.get(message.id, "") + message.content
+            streamed_ids.add(message.id)
+            placeholder.markdown("\n\n".join(replies.values()) + "▌")
+
+    if placeholder is not None:
+        progress.empty()
+        if replies:
+            placeholder.markdown("\n\n".join(replies.values()))
+        else:
+            placeholder.empty()
+    return snapshot, streamed_ids
+
+
 def process_events(event):
     """Process events from the graph and extract messages."""
-    seen_ids = set()
-
     try:
         if isinstance(event, dict):
             if "configurable" in event.get("config", {}):
@@ -67,14 +239,13 @@ def process_events(event):
                 last_message = messages[-1] if messages else None
 
                 if isinstance(last_message, AIMessage):
-                    if last_message.id not in seen_ids and last_message.content:
-                        seen_ids.add(last_message.id)
+                    if last_message.content and not is_message_shown(last_message):
                         st.session_state.messages.append(last_message)
                         with st.chat_message("assistant"):
                             st.write(last_message.content)
 
                     if hasattr(last_message, "tool_calls") and last_message.tool_calls:
-                        tool_call = last_message.tool_calls[0]
+                        tool_call = approval_tool_call(last_message)
                         logging.info(f"Tool call detected: {tool_call['name']}")
                         
                         # Parse args if needed
@@ -91,52 +262,75 @@ def process_events(event):
     return None
 
 
-def get_order_by_id(order_id):
-    """Get order details by ID"""
+def get_orders_by_ids(order_ids):
+    """Get several orders with their products in one query, keyed by order_id"""
     try:
         with db_manager.get_connection() as conn:
             cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-            cursor.execute("""
-                SELECT 
-                    o.order_id,
-                    o.customer_id,
-                    o.order_date,
-                    o.status,
-                    p.product_name,
-                    od.quantity,
-                    od.unit_price
-                FROM orders o
-                LEFT JOIN orders_details od ON o.order_id = od.order_id
-                LEFT JOIN products p ON od.product_id = p.product_id
-                WHERE o.order_id = %s
-            """, (order_id,))
-            
-            rows = cursor.fetchall()
-        
-        if not rows:
-            return None
-
-        return {
-            "order_id": rows[0]["order_id"],
-            "customer_id": rows[0]["customer_id"],
-            "order_date": rows[0]["order_date"],
-            "status": rows[0]["status"],
-            "products": [
-                {
-                    "product_name": row["product_name"],
-                    "quantity": row["quantity"],
-                    "unit_price": float(row["unit_price"]) if row["unit_price"] else 0
-                }
-                for row in rows if row["product_name"] is not None
-            ]
-        }
+            orders = read_orders(cursor, order_ids)
+        return {order["order_id"]: order for order in orders}
     except Exception as e:
-        logging.error(f"Error fetching order {order_id}: {str(e)}")
+        logging.error(f"Error fetching orders {order_ids}: {str(e)}")
+        return {}
+
+
+def get_order_by_id(order_id):
+    """Get order details by ID"""
+    try:
+        return get_orders_by_ids([order_id]).get(int(order_id))
+    except (TypeError, ValueError):
+        logging.error(f"Invalid order id: {order_id}")
         return None
 
 
+def approval_tool_call(message):
+    """The tool call of an AI message that needs the user's approval: the first sensitive one, else the first"""
+    tool_calls = getattr(message, "tool_calls", None) or []
+    for tool_call in tool_calls:
+        if isinstance(tool_call, dict) and tool_call.get("name") in sensitive_tool_names:
+            return tool_call
+    return tool_calls[0] if tool_calls else None
+
+
+def sibling_tool_messages(tool_call_id, config):
+    """
+    ToolMessages for the other calls of the AI message that requested tool_call_id.
+
+    The approval screens answer one call themselves, but the model rejects a history in
+    which any call of a message has no ToolMessage. Read-only calls go through the graph's
+    safe_tools node, so they run concurrently and their results are projected like any
+    other turn's; other sensitive calls are reported as not executed so the assistant asks again.
+    """
+    messages = graph.get_state(config).values.get("messages", [])
+    answered = {message.tool_call_id for message in messages if isinstance(message, ToolMessage)}
+    requester = next(
+        (
+            message for message in reversed(messages)
+            if isinstance(message, AIMessage) and any(call["id"] == tool_call_id for call in message.tool_calls)
+        ),
+        None,
+    )
+    if requester is None:
+        return []
+
+    safe_tool_names = {tool.name for tool in safe_tools}
+    pending = [call for call in requester.tool_calls if call["id"] != tool_call_id and call["id"] not in answered]
+    safe_calls = [call for call in pending if call["name"] in safe_tool_names]
+
+    responses = []
+    if safe_calls:
+        responses = safe_tool_node.invoke({"messages": [AIMessage(content="", tool_calls=safe_calls)]}, config)["messages"]
+    skipped = json.dumps(
+        {"status": "skipped", "message": "Thao tác này chưa được thực hiện, vui lòng xác nhận lại."}, ensure_ascii=False
+    )
+    for call in pending:
+        if call["name"] not in safe_tool_names:
+            responses.append(ToolMessage(tool_call_id=call["id"], content=skipped, name=call["name"]))
+    return responses
+
+
 def send_tool_response(tool_call_id, content, config):
-    """Send a response for a tool call"""
+    """Send a response for a tool call, answering the other calls of the same turn as well"""
     try:
         if isinstance(content, dict):
             content = json.dumps(content)
@@ -147,7 +341,8 @@ def send_tool_response(tool_call_id, content, config):
                     ToolMessage(
                         tool_call_id=tool_call_id,
                         content=content,
-                    )
+                    ),
+                    *sibling_tool_messages(tool_call_id, config),
                 ]
             },
             config,
@@ -158,6 +353,83 @@ def send_tool_response(tool_call_id, content, config):
         raise e
 
 
+def record_tool_outcome(tool_call_id, content, reply, config):
+    """
+    Write the result of a tool call the UI ran itself into the thread.
+
+    The approval screens for create_order and for cancelling from the order editor
+    call the tools directly instead of resuming the graph. The ToolMessage answers
+    the pending call in the checkpoint, and ``reply`` is the message the customer
+    saw, so on the next turn the assistant knows the order was placed or cancelled.
+    The other calls of the same turn are answered as in send_tool_response.
+
+    Args:
+        tool_call_id (str): The tool call being answered.
+        content: Tool result; dicts are serialized to JSON.
+        reply (AIMessage): Confirmation shown in the chat; give it an id so the chat
+            does not show it twice when syncing from the checkpoint.
+        config (dict): Config of the thread.
+    """
+    if isinstance(content, dict):
+        content = json.dumps(content, ensure_ascii=False, default=str)
+    # Written as the assistant's own update: its reply has no tool calls, so the thread ends the turn
+    graph.update_state(
+        config,
+        {
+            "messages": [
+                ToolMessage(tool_call_id=tool_call_id, content=content),
+                *sibling_tool_messages(tool_call_id, config),
+                reply,
+            ]
+        },
+        as_node="assistant",
+    )
+
+
+def hold_order_stock(tool_call, products):
+    """
+    Hold the proposed quantities while the approval screen is open.
+
+    The hold is taken once per tool call and kept in st.session_state.order_holds,
+    since Streamlit reruns this screen on every widget change.
+
+    Returns:
+        dict: product_ids and expires_at of the hold, or error when it could not be taken.
+    """
+    if "order_holds" not in st.session_state:
+        st.session_state.order_holds = {}
+    if tool_call["id"] in st.session_state.order_holds:
+        return st.session_state.order_holds[tool_call["id"]]
+
+    customer_id = st.session_state.config["configurable"].get("customer_id")
+    if not customer_id or customer_id == "123456789":
+        order_hold = {"product_ids": [], "expires_at": None}
+    else:
+        try:
+            order_hold = db_manager.run_transaction(lambda cursor: hold_order_lines(cursor, customer_id, products))
+            catalog_index.set_stock(order_hold.pop("stock_levels"))
+            logging.info(f"Held stock of {order_hold['product_ids']} for tool call {tool_call['id']}")
+        except ValueError as e:
+            order_hold = {"product_ids": [], "expires_at": None, "error": str(e)}
+        except Exception as e:
+            logging.warning(f"Could not hold stock for tool call {tool_call['id']}: {str(e)}")
+            order_hold = {"product_ids": [], "expires_at": None}
+    st.session_state.order_holds[tool_call["id"]] = order_hold
+    return order_hold
+
+
+def release_order_stock(tool_call):
+    """Give back the stock held for a create_order proposal the customer cancelled"""
+    order_hold = st.session_state.get("order_holds", {}).pop(tool_call["id"], None)
+    if not order_hold or not order_hold["product_ids"]:
+        return
+    try:
+        release_customer_holds(st.session_state.config["configurable"]["customer_id"], order_hold["product_ids"])
+    except Exception as e:
+        # The sweeper returns the stock once the hold expires
+        logging.error(f"Error releasing stock held for tool call {tool_call['id']}: {str(e)}")
+
+
 #---------- UI Components ----------#
 
 def customer_profile_form():
@@ -292,6 +564,9 @@ def create_order_ui(last_message, tool_call):
     # Update products in args
     parsed_args["products"] = processed_products
 
+    # Giữ hàng trong lúc khách xem và xác nhận đơn để phiên khác không lấy mất
+    order_hold = hold_order_stock(tool_call, processed_products)
+
     # Rest of the function remains the same but use parsed_args instead of args
     with st.container():
         # Use tabs to organize the order flow
@@ -361,6 +636,10 @@ def create_order_ui(last_message, tool_call):
                 
                 st.markdown("---")
                 st.markdown(f"### Tổng cộng: **{adjusted_total:,.0f}đ**")
+                if order_hold.get("error"):
+                    st.warning(f"⚠️ {order_hold['error']}")
+                elif order_hold.get("expires_at"):
+                    st.caption(f"⏳ Đã giữ hàng cho bạn đến {order_hold['expires_at']:%H:%M}.")
                 st.info("👉 Nhấn vào tab 'Thông tin giao hàng' để tiếp tục.")
                 
             except Exception as e:
@@ -538,10 +817,12 @@ def create_order_ui(last_message, tool_call):
                                 Chúng tôi sẽ liên hệ với bạn trong thời gian sớm nhất để xác nhận đơn hàng.
                                 Cảm ơn bạn đã mua sắm tại cửa hàng của chúng tôi!
                                 """
-                                success_ai_message = AIMessage(content=success_message)
+                                success_ai_message = AIMessage(content=success_message, id=str(uuid.uuid4()))
+                                record_tool_outcome(tool_call["id"], order_result, success_ai_message, st.session_state.config)
                                 st.session_state.messages.append(success_ai_message)
                                 
-                                # Clean up session state
+                                # Clean up session state; create_order has consumed the hold
+                                st.session_state.get("order_holds", {}).pop(tool_call["id"], None)
                                 st.session_state.adjusted_quantities = {}
                                 st.session_state.customer_info_edited = False
                                 st.session_state.shipping_info = {}
@@ -556,8 +837,15 @@ def create_order_ui(last_message, tool_call):
             with col2:
                 if st.button("❌ Hủy đơn hàng", key="cancel_order", use_container_width=True):
                     try:
+                        release_order_stock(tool_call)
                         cancel_message = "Tôi đã hủy đơn hàng theo yêu cầu của bạn. Bạn có thể tiếp tục mua sắm hoặc hỏi tôi về các sản phẩm khác."
-                        cancel_ai_message = AIMessage(content=cancel_message)
+                        cancel_ai_message = AIMessage(content=cancel_message, id=str(uuid.uuid4()))
+                        record_tool_outcome(
+                            tool_call["id"],
+                            {"status": "cancelled", "message": "Khách hàng đã hủy đơn hàng trước khi xác nhận."},
+                            cancel_ai_message,
+                            st.session_state.config,
+                        )
                         st.session_state.messages.append(cancel_ai_message)
                         st.info("🛑 Đã hủy đơn hàng")
                         st.session_state.pending_approval = None
@@ -855,7 +1143,9 @@ def update_order_ui(last_message, tool_call):
                         
                         Các sản phẩm đã được trả lại kho. Bạn có thể đặt đơn hàng mới bất cứ lúc nào.
                         """
-                        success_ai_message = AIMessage(content=success_message)
+                        success_ai_message = AIMessage(content=success_message, id=str(uuid.uuid4()))
+                        # The pending update_order call is answered with the cancellation
+                        record_tool_outcome(tool_call["id"], cancel_result, success_ai_message, st.session_state.config)
                         st.session_state.messages.append(success_ai_message)
                         
                         # Clean up session state
@@ -925,14 +1215,16 @@ def cancel_order_ui(last_message, tool_call):
         with col1:
             if st.button("✅ Xác nhận hủy", key=f"confirm_cancel_{order_id}", use_container_width=True):
                 try:
-                    # Gửi ToolMessage để agent thực thi cancel_order
-                    result = send_tool_response(
-                        tool_call["id"],
+                    # Hủy đơn rồi gửi kết quả thật vào luồng hội thoại để agent trả lời khách
+                    cancel_result = cancel_order.invoke(
                         {"order_id": str(order_id)},
-                        st.session_state.config
+                        config=st.session_state.config
                     )
-                    print(result)
-                    st.success(f"✅ Đơn hàng #{order_id} đã được hủy thành công.")
+                    result = send_tool_response(tool_call["id"], cancel_result, st.session_state.config)
+                    if cancel_result.get("status") == "success":
+                        st.success(f"✅ Đơn hàng #{order_id} đã được hủy thành công.")
+                    else:
+                        st.error(f"❌ Lỗi khi hủy đơn hàng: {cancel_result.get('message', 'Unknown error')}")
                     process_events(result)
                     st.session_state.pending_approval = None
                     st.rerun()
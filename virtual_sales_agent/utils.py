@@ -1,7 +1,11 @@
+import unicodedata
+
 from langchain_core.messages import ToolMessage
 from langchain_core.runnables import RunnableLambda
 from langgraph.prebuilt import ToolNode
 
+from virtual_sales_agent.tool_projection import project_tool_messages
+
 
 def handle_tool_error(state) -> dict:
     error = state.get("error")
@@ -18,7 +22,8 @@ def handle_tool_error(state) -> dict:
 
 
 def create_tool_node_with_fallback(tools: list) -> dict:
-    return ToolNode(tools).with_fallbacks(
+    # Tool results are compacted before they enter the LLM context
+    return (ToolNode(tools) | RunnableLambda(project_tool_messages)).with_fallbacks(
         [RunnableLambda(handle_tool_error)], exception_key="error"
     )
 
@@ -37,3 +42,10 @@ def _print_event(event: dict, _printed: set, max_length=1500):
                 msg_repr = msg_repr[:max_length] + " ... (truncated)"
             print(msg_repr)
             _printed.add(message.id)
+
+
+def fold_diacritics(text: str) -> str:
+    """Lowercase text and strip Vietnamese diacritics, e.g. "Áo Thun Đỏ" -> "ao thun do"."""
+    text = text.replace("đ", "d").replace("Đ", "D")
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn").lower()